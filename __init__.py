@@ -1,61 +1,402 @@
-import pathlib
-from datetime import datetime, date
+from __future__ import annotations
+
+from contextlib import ExitStack, contextmanager, nullcontext
+from datetime import datetime, date, time as clock_time
 import logging
+from typing import TYPE_CHECKING
+from urllib.parse import urlparse
 
-import numpy
-import pandas
 import requests
 
+from scraper.cache import CachingAdapter, ResponseCache, is_file_response
+from scraper.context import request_context
+from scraper.frames import FrameAccumulator, ResultWriter
+from scraper.instrumentation import MetricsRecorder
+from scraper.schema import GAS_DAY_COLUMNS
+from scraper.sinks import CsvSink, SQLiteSink
+from scraper.transport import DEFAULT_TIMEOUT, HostRateLimiter, RetryPolicy, TransportAdapter
+from scraper.watermarks import WatermarkStore
+
+if TYPE_CHECKING:
+    import pandas
+
 
 LOCAL_DATA_FOLDER = './DATA'
 logger = logging.getLogger(__name__)
 
+_default_response_cache = None
+_default_database = None
+_default_watermarks = None
+_default_rate_limiter = HostRateLimiter()
+_default_metrics = None
+
+
+def get_default_response_cache():
+    """
+    Response cache under LOCAL_DATA_FOLDER shared by all scrapers of the process.
+    """
+    global _default_response_cache
+    if _default_response_cache is None:
+        _default_response_cache = ResponseCache(f'{LOCAL_DATA_FOLDER}/http_cache')
+    return _default_response_cache
+
+
+def get_default_database():
+    """
+    Local SQLite stand-in under LOCAL_DATA_FOLDER used for `db_table_name` when no database is configured.
+    """
+    global _default_database
+    if _default_database is None:
+        _default_database = SQLiteSink(f'{LOCAL_DATA_FOLDER}/scraper.db')
+    return _default_database
+
+
+def get_default_rate_limiter() -> HostRateLimiter:
+    """
+    Per-host rate limits shared by all scrapers of the process.
+    """
+    return _default_rate_limiter
+
+
+def get_default_metrics() -> MetricsRecorder:
+    """
+    Metrics of all scrapers of the process, written as JSON lines under LOCAL_DATA_FOLDER.
+    """
+    global _default_metrics
+    if _default_metrics is None:
+        _default_metrics = MetricsRecorder(f'{LOCAL_DATA_FOLDER}/metrics/scraper_metrics.jsonl')
+    return _default_metrics
+
+
+def get_default_watermarks():
+    """
+    Watermark store under LOCAL_DATA_FOLDER shared by all scrapers of the process.
+    """
+    global _default_watermarks
+    if _default_watermarks is None:
+        _default_watermarks = WatermarkStore(f'{LOCAL_DATA_FOLDER}/watermarks.db')
+    return _default_watermarks
+
 
 class PipelineScraper:
+    # created by the CSV sink on the first write
     _output_folder = f'{LOCAL_DATA_FOLDER}/scraper_output'
-    pathlib.Path(_output_folder).mkdir(parents=True, exist_ok=True)
+
+    use_response_cache = True
+    # transport: retries of failed requests, (connect, read) timeout of requests, connections kept per host, and
+    # requests per second allowed to the scraper's host (None for no limit) with bursts of `rate_limit_burst` requests
+    retry_policy = RetryPolicy()
+    request_timeout = DEFAULT_TIMEOUT
+    pool_maxsize = 10
+    rate_limit = None
+    rate_limit_burst = 1
+    # skip postings already recorded in the watermark store
+    incremental = True
+    # collected frames of a result are written out in chunks once they take more memory than this
+    result_max_bytes = 256 * 1024 * 1024
+    # postings of gas days at least this many days old do not change any more
+    immutable_after_days = 2
+    # names of the gas day column in the sources' reports, used to split results of date range requests
+    gas_day_columns = GAS_DAY_COLUMNS
+    # results are saved in the shared capacity schema (see `schema.normalize`), with these source specific column
+    # names mapped to the shared ones
+    normalize_schema = True
+    column_aliases = {}
+    # sources without cycles post their report once a day, the day before the gas day, at this Central Clock Time
+    # (with the timely cycle) and are polled then by the cycle scheduler, None polls them at every NAESB cycle
+    daily_posting_time = clock_time(17, 0)
 
     def __init__(self, job_id, web_url, source, **kwargs):
+        """
+        :param job_id:
+        :param web_url:
+        :param source:
+        :param kwargs: `response_cache` - ResponseCache to use instead of the shared default one, or False to
+            disable caching; `output_sinks` - list of OutputSink receiving the results, CSV files by default;
+            `database` - DatabaseSink loading results saved with a `db_table_name`, the local SQLite file by default;
+            `watermarks` - WatermarkStore of the ingested postings; `incremental` - False downloads every posting again;
+            `retry_policy` - RetryPolicy of the transport, False for no retries; `rate_limiter` - HostRateLimiter to
+            use instead of the shared default one; `metrics` - MetricsRecorder of the request, parse and save events,
+            False to record none; `normalize_schema` - False saves the columns as the source reports them
+        """
         self.job_id = job_id
         self.web_url = web_url
         self.source = source
+        self.rows_saved = 0
+        # errors the scraper logged and went on after (an extension or posting failing), the runners report a run
+        # with errors as failed even when the other extensions saved rows
+        self.errors = []
+        # postings `new_postings` skipped as already ingested, a run saving no rows is then up to date, not empty
+        self.postings_skipped = 0
         self.session = requests.Session()
         self.session.headers.update({
             'user-agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/104.0.0.0 Safari/537.36'
         }),
 
+        response_cache = kwargs.get('response_cache')
+        if response_cache is None and self.use_response_cache:
+            response_cache = get_default_response_cache()
+        self.response_cache = response_cache or None
+
+        retry_policy = kwargs.get('retry_policy')
+        self.retry_policy = (retry_policy if retry_policy is not None else self.retry_policy) or None
+        self.rate_limiter = kwargs.get('rate_limiter') or get_default_rate_limiter()
+        metrics = kwargs.get('metrics')
+        self.metrics = (metrics if metrics is not None else get_default_metrics()) or None
+        if self.rate_limit:
+            # an explicit rate configured on the shared limiter wins over the scraper's default
+            self.rate_limiter.configure(urlparse(self.web_url).netloc, self.rate_limit, self.rate_limit_burst,
+                                        replace=False)
+        self.mount_adapters()
+
+        self.output_sinks = kwargs.get('output_sinks') or [CsvSink(self._output_folder)]
+        self._database = kwargs.get('database')
+        self._watermarks = kwargs.get('watermarks')
+        self.incremental = kwargs.get('incremental', self.incremental)
+        self.normalize_schema = kwargs.get('normalize_schema', self.normalize_schema)
+
+    @property
+    def database(self):
+        if self._database is None:
+            self._database = get_default_database()
+        return self._database
+
+    @property
+    def watermarks(self):
+        if self._watermarks is None:
+            self._watermarks = get_default_watermarks()
+        return self._watermarks
+
+    def new_postings(self, posting_ids, gas_day: date, cycle=None, extension: str = None, end_day: date = None):
+        """
+        The posting ids not ingested yet for the gas day (or gas days up to `end_day`) and cycle, in their order.
+        All of them when the scraper is not incremental.
+        """
+        posting_ids = list(posting_ids)
+        if not self.incremental:
+            return posting_ids
+        ingested = self.watermarks.ingested(self.source, extension, gas_day, cycle, end_day=end_day)
+        new_ids = [posting_id for posting_id in posting_ids if str(posting_id) not in ingested]
+        if len(new_ids) < len(posting_ids):
+            self.postings_skipped += len(posting_ids) - len(new_ids)
+            logger.info('Skipping %s postings of %s/%s already ingested for %s cycle %s',
+                        len(posting_ids) - len(new_ids), self.source, extension or '', gas_day, cycle)
+        return new_ids
+
+    def mark_ingested(self, posting_ids, gas_day: date, cycle=None, extension: str = None):
+        """
+        Record postings in the watermark store, call it once their rows are saved.
+        """
+        if self.incremental:
+            self.watermarks.record(self.source, extension, gas_day, cycle, posting_ids)
+
+    def mount_adapters(self, pool_maxsize: int = None, pool_manager=None):
+        """
+        Mount the transport adapter stack on the session for http and https: the response cache in front of the
+        transport (retries and rate limits), so cached responses are served without using up the rate limit.
+
+        :param pool_manager: connection pools shared with other scrapers, the session's own pools by default
+        """
+        adapter = TransportAdapter(retry=self.retry_policy, rate_limiter=self.rate_limiter, metrics=self.metrics,
+                                   source=self.source, timeout=self.request_timeout, pool_manager=pool_manager,
+                                   pool_maxsize=pool_maxsize or self.pool_maxsize)
+        if self.response_cache is not None:
+            adapter = CachingAdapter(self.response_cache, adapter=adapter, validate=self.is_cacheable_response)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def is_cacheable_response(self, response) -> bool:
+        """
+        Whether the response cache may store a response: report files but not HTML pages by default. Scrapers whose
+        reports are HTML, or whose sites answer errors with a file, check the content themselves.
+        """
+        return is_file_response(response)
+
+    def is_historical(self, post_date: date) -> bool:
+        if post_date is None:
+            return False
+        if isinstance(post_date, datetime):
+            post_date = post_date.date()
+        return (date.today() - post_date).days >= self.immutable_after_days
+
+    def immutable_scope(self, post_date: date):
+        """
+        Requests inside this block are served from the response cache without a network call when `post_date` is a
+        historical gas day. Use it only around requests whose response depends on the gas day.
+        """
+        return request_context(immutable=self.is_historical(post_date))
+
+    def idempotent(self):
+        """
+        Requests inside this block are retried after a failure whatever their method. Use it only around POSTs that
+        query a report (ASP.NET form postbacks), never around ones changing state on the server.
+        """
+        return request_context(idempotent=True)
+
+    def tags(self, **values):
+        """
+        Tag the metrics of the requests, parsing and saving done inside the block, e.g. with the extension, post
+        date and cycle being scraped. The tags follow asyncio tasks but not plain threads, see `request_context`.
+        """
+        return request_context(source=self.source, **values)
+
+    def measure(self, event: str, **fields):
+        """
+        Time the block as a metrics event, e.g. `parse`, the block can add fields (`rows`) to the yielded dict.
+        Without metrics the block is not timed.
+        """
+        if self.metrics is None:
+            return nullcontext(fields)
+        return self.metrics.timer(event, source=self.source, **fields)
+
     def scraper_info(self):
         logger.info('Scraper: %s, web url: %s, job_id: %s', self.source, self.web_url, self.job_id)
 
-    def _get_local_output_file_path(self, post_date: date):
+    def normalize_result(self, df: pandas.DataFrame, cycle=None) -> pandas.DataFrame:
+        """
+        The frame in the shared capacity schema, unchanged when the scraper does not normalize its results.
+        """
+        if not self.normalize_schema or df is None:
+            return df
+        from scraper.schema import normalize
+
+        return normalize(df, cycle=self.cycle_name(cycle), aliases=self.column_aliases)
 
-        if post_date is None:
-            post_date = date.today()
-        _file_name = f'{self._output_folder}/{self.source}_data_{post_date}_{datetime.now().timestamp()}.csv'
-        return _file_name
+    def cycle_name(self, cycle):
+        """
+        NAESB name of a cycle argument of the scraper ('Timely', 'Intraday 1'), from its `naesb_cycles` attribute.
+        None for scrapers without cycles and arguments that are not one of their cycles.
+        """
+        for name, value in (getattr(self, 'naesb_cycles', None) or {}).items():
+            if cycle is not None and str(value) == str(cycle):
+                return name.title()
+        return None
 
     def save_result(self, df_result: pandas.DataFrame, post_date: date, db_table_name: str = None,
-                    local_file: bool = False):
+                    local_file: bool = False, cycle=None):
         """
 
         :param df_result:
         :param post_date:
-        :param db_table_name:
-        :param local_file:
+        :param db_table_name: upsert the result into this database table
+        :param local_file: write the result to the output sinks (CSV files by default)
+        :param cycle: cycle of the result, used to partition sink output
         :return:
         """
         logger.info('Saving data for the source: %s', self.source)
+        df_result = self.normalize_result(df_result, cycle)
 
-        df_result.replace({numpy.nan: None}, inplace=True)
-        logger.info('\n%s', df_result.count())
+        # missing values keep the column dtypes, every sink writes them its own way (empty CSV fields, nulls)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('Non-null values per column:\n%s', df_result.count())
+        self.rows_saved += len(df_result.index)
         if local_file:
-            _file_path = self._get_local_output_file_path(post_date)
-            logger.info('Saving data to file: %s', _file_path)
-            df_result.to_csv(_file_path, index=False)
-            logger.info('Scraping data saved to file: %s', _file_path)
+            for sink in self.output_sinks:
+                with self.measure('save', sink=type(sink).__name__, rows=len(df_result.index)):
+                    _output = sink.write(df_result, source=self.source, post_date=post_date, cycle=cycle)
+                logger.info('Scraping data saved to: %s', _output)
 
         if db_table_name:
             logger.info('Saving data to database table: %s', db_table_name)
+            with self.measure('save', sink=type(self.database).__name__, rows=len(df_result.index)):
+                _output = self.database.write(df_result, source=self.source, post_date=post_date, cycle=cycle,
+                                              table=db_table_name)
+            logger.info('Scraping data saved to: %s', _output)
+
+    def find_gas_day_column(self, df: pandas.DataFrame):
+        columns = {str(column).strip().lower(): column for column in df.columns}
+        for name in self.gas_day_columns:
+            if name.lower() in columns:
+                return columns[name.lower()]
+        return None
+
+    def split_by_gas_day(self, df: pandas.DataFrame, default_date: date):
+        """
+        Split a frame holding several gas days into `(gas_day, frame)` pairs. Rows without a readable gas day are
+        returned under `default_date`.
+
+        :raise ValueError: the frame has no gas day column, or no readable gas day in it. The rows of a date range
+            cannot be told apart then, saving them all under one gas day would mix the days.
+        """
+        default_date = default_date if default_date is not None else date.today()
+        column = self.find_gas_day_column(df)
+        if column is None:
+            raise ValueError(f'No gas day column in the result of {self.source}, expected one of: '
+                             f'{", ".join(self.gas_day_columns)}')
+
+        import pandas
+
+        gas_days = pandas.to_datetime(df[column], errors='coerce').dt.date
+        if len(df.index) and not gas_days.notna().any():
+            raise ValueError(f'No readable gas day in column {column} of the result of {self.source}')
+        if not gas_days.notna().all():
+            logger.warning('%s rows of %s without a readable gas day, kept under %s', int(gas_days.isna().sum()),
+                           self.source, default_date)
+        gas_days = gas_days.where(gas_days.notna(), default_date)
+        return [(gas_day, part) for gas_day, part in df.groupby(gas_days, sort=True)]
+
+    def save_result_chunks(self, chunks, post_date: date, local_file: bool = False, split_gas_days: bool = False,
+                           cycle=None, db_table_name: str = None):
+        """
+        Save an iterable of frames as a single result without holding more than one of them in memory, see
+        `ResultWriter` for frames with different columns.
+
+        :param chunks:
+        :param post_date:
+        :param local_file:
+        :param split_gas_days: save the rows of every gas day as a result of its own (range requests)
+        :param cycle:
+        :param db_table_name: upsert the rows into this database table, in one transaction
+        :return:
+        """
+        logger.info('Saving data in chunks for the source: %s', self.source)
+
+        with self.result_writer(post_date, local_file=local_file, split_gas_days=split_gas_days, cycle=cycle,
+                                db_table_name=db_table_name) as result:
+            for chunk in chunks:
+                result.write(chunk)
+
+    def result_writer(self, post_date: date, local_file: bool = False, split_gas_days: bool = False, cycle=None,
+                      db_table_name: str = None) -> ResultWriter:
+        """
+        Writer saving the frames written to it as a single result, see `save_result_chunks`.
+        """
+        return ResultWriter(self, post_date, local_file=local_file, split_gas_days=split_gas_days, cycle=cycle,
+                            db_table_name=db_table_name)
+
+    @contextmanager
+    def collect_result(self, post_date: date, local_file: bool = False, cycle=None, db_table_name: str = None,
+                       max_bytes: int = None):
+        """
+        Collect the frames of one result in a FrameAccumulator and save them at the end of the block, with a single
+        `save_result` call. When the collected frames grow over `max_bytes` (default `result_max_bytes`) they are
+        written out in chunks instead, as with `save_result_chunks`. Nothing is saved when no frame was collected.
+
+            with self.collect_result(post_date, local_file=True) as frames:
+                for extension in self.source_extensions:
+                    frames.append(self.scrape_extension(extension, post_date))
+        """
+        with ExitStack() as stack:
+            result = None
+
+            def flush(df):
+                nonlocal result
+                if result is None:
+                    result = stack.enter_context(self.result_writer(post_date, local_file=local_file, cycle=cycle,
+                                                                    db_table_name=db_table_name))
+                result.write(df)
+
+            frames = FrameAccumulator(max_bytes=max_bytes if max_bytes is not None else self.result_max_bytes,
+                                      flush=flush)
+            yield frames
+
+            if result is not None:
+                frames.flush()
+            elif len(frames):
+                self.save_result(frames.concat(), post_date, db_table_name=db_table_name, local_file=local_file,
+                                 cycle=cycle)
+            else:
+                logger.info('No data collected for the source: %s', self.source)
 
     def start_scraping(self, post_date: date = None):
         pass
@@ -0,0 +1,134 @@
+import asyncio
+import contextvars
+import copy
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from urllib.parse import urlparse
+
+import requests
+
+from scraper import PipelineScraper
+from scraper.transport import RetryPolicy, TransportAdapter
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncHttpClient:
+    """
+    Awaitable HTTP client for the async scrapers.
+
+    Requests go through a `requests.Session` whose adapters keep one keep-alive pool per host, and are driven from
+    the event loop by a dedicated thread pool. One client can be shared by many scrapers so that all pipelines
+    running in the same loop reuse the same thread pool and connection pools, while `per_host_limit` keeps every
+    host from being hit by more concurrent requests than its pool holds. Every scraper sends its requests with its
+    own session (headers, response cache, rate limit, metrics tags) through `for_session`.
+    """
+
+    def __init__(self, session: requests.Session = None, per_host_limit: int = 8, max_workers: int = 32,
+                 metrics=None):
+        """
+        :param session: session to send the requests with, its adapters should hold `per_host_limit` connections
+            per host. A new session with plain adapters is created by default.
+        :param per_host_limit: maximum concurrent requests per host
+        :param max_workers: size of the thread pool
+        :param metrics: MetricsRecorder for the requests of the new session, tagged with the source of the
+            scraper sending them
+        """
+        if session is None:
+            session = requests.Session()
+            adapter = TransportAdapter(retry=RetryPolicy(), metrics=metrics, pool_connections=16,
+                                       pool_maxsize=per_host_limit)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+        self.session = session
+        self.per_host_limit = per_host_limit
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='scraper-http')
+        self._semaphores = {}
+
+    @property
+    def pool_manager(self):
+        """
+        Connection pools of the client's session, None when its adapter has none.
+        """
+        adapter = self.session.get_adapter('https://')
+        # under the response cache of a scraper's adapter stack
+        adapter = getattr(adapter, 'adapter', adapter)
+        return getattr(adapter, 'poolmanager', None)
+
+    def for_session(self, session: requests.Session) -> 'AsyncHttpClient':
+        """
+        Client sending its requests with `session` over the thread pool and per-host limits of this client. Close
+        only the client it was made from.
+        """
+        client = copy.copy(self)
+        client.session = session
+        return client
+
+    def _host_semaphore(self, url: str) -> asyncio.Semaphore:
+        host = urlparse(url).netloc
+        if host not in self._semaphores:
+            self._semaphores[host] = asyncio.Semaphore(self.per_host_limit)
+        return self._semaphores[host]
+
+    async def run(self, func, *args, **kwargs):
+        """
+        Run a blocking callable (parsing, saving) on the client's thread pool.
+        """
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(self._executor, functools.partial(context.run, func, *args, **kwargs))
+
+    async def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        async with self._host_semaphore(url):
+            return await self.run(self.session.request, method, url, **kwargs)
+
+    async def get(self, url: str, **kwargs) -> requests.Response:
+        return await self.request('GET', url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> requests.Response:
+        return await self.request('POST', url, **kwargs)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self.session.close()
+
+
+class AsyncPipelineScraper(PipelineScraper):
+    """
+    PipelineScraper whose `start_scraping` is a coroutine. Pass the same `client` to several scrapers to run them
+    in one event loop over shared connection pools.
+    """
+
+    def __init__(self, job_id, web_url, source, client: AsyncHttpClient = None, **kwargs):
+        PipelineScraper.__init__(self, job_id, web_url, source, **kwargs)
+        if client is None:
+            client = AsyncHttpClient(self.session)
+            self.mount_adapters(pool_maxsize=client.per_host_limit)
+        else:
+            # the scraper keeps its own session and adapters, over the connection pools of the shared client
+            self.mount_adapters(pool_maxsize=client.per_host_limit, pool_manager=client.pool_manager)
+            client = client.for_session(self.session)
+        self.client = client
+
+    async def save_result_async(self, df_result, post_date: date, db_table_name: str = None,
+                                local_file: bool = False):
+        return await self.client.run(self.save_result, df_result, post_date=post_date, db_table_name=db_table_name,
+                                     local_file=local_file)
+
+    async def start_scraping(self, post_date: date = None):
+        pass
+
+
+async def gather_scraping(scrapers, **kwargs):
+    """
+    Run `start_scraping(**kwargs)` of several async scrapers concurrently. Exceptions are logged and returned in
+    place of the scraper's result.
+    """
+    results = await asyncio.gather(*(scraper.start_scraping(**kwargs) for scraper in scrapers),
+                                   return_exceptions=True)
+    for scraper, result in zip(scrapers, results):
+        if isinstance(result, BaseException):
+            logger.error('Async scraping failed for %s', scraper.source, exc_info=result)
+    return results
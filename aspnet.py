@@ -0,0 +1,112 @@
+import html
+import logging
+import re
+import threading
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+ASPNET_STATE_FIELDS = ('__VIEWSTATE', '__VIEWSTATEGENERATOR', '__EVENTVALIDATION', '__EVENTTARGET', '__EVENTARGUMENT')
+
+_INPUT_TAG = re.compile(rb'<input\b[^>]*>', re.IGNORECASE)
+_PARTIAL_INPUT_TAG = re.compile(rb'<input\b[^>]*\Z', re.IGNORECASE)
+_ATTRIBUTE = re.compile(rb'([\w:.-]+)\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s"\'>]+))')
+
+
+def _input_attributes(tag: bytes) -> dict:
+    attributes = {}
+    for match in _ATTRIBUTE.finditer(tag):
+        value = match.group(2) if match.group(2) is not None else match.group(3)
+        if value is None:
+            value = match.group(4)
+        attributes[match.group(1).lower().decode('ascii')] = value
+    return attributes
+
+
+def _scan_inputs(data, wanted: set, found: dict, encoding: str) -> int:
+    """
+    Add the wanted inputs of `data` to `found`, return the offset after the last complete input tag.
+    """
+    position = 0
+    for match in _INPUT_TAG.finditer(data):
+        position = match.end()
+        attributes = _input_attributes(match.group(0))
+        name = attributes.get('id', attributes.get('name'))
+        if name is None:
+            continue
+        name = name.decode(encoding)
+        if name in wanted and name not in found:
+            found[name] = html.unescape(attributes.get('value', b'').decode(encoding))
+            if len(found) == len(wanted):
+                break
+    return position
+
+
+def extract_hidden_fields(content, names, encoding: str = 'utf-8') -> dict:
+    """
+    Values of the named `<input>` fields (matched by id or name) of an html page, found in a single pass over the
+    raw bytes without building a DOM.
+
+    :param content: page as bytes or str, or an iterable of byte chunks such as `response.iter_content()`. Chunks
+        are only read until every requested field is found.
+    :param names: ids / names of the inputs
+    :param encoding: encoding of the page
+    :return: dict of name to value for the fields found
+    """
+    wanted = set(names)
+    found = {}
+    if isinstance(content, str):
+        content = content.encode(encoding)
+    if isinstance(content, (bytes, bytearray)):
+        _scan_inputs(content, wanted, found, encoding)
+        return found
+
+    buffer = bytearray()
+    for chunk in content:
+        buffer += chunk
+        position = _scan_inputs(buffer, wanted, found, encoding)
+        if len(found) == len(wanted):
+            break
+
+        # keep an input tag cut by the chunk boundary, or the start of one
+        partial = _PARTIAL_INPUT_TAG.search(buffer, position)
+        del buffer[:partial.start() if partial else max(position, len(buffer) - len(b'<input'))]
+    return found
+
+
+class FormStateCache:
+    """
+    Hidden state fields of ASP.NET pages (__VIEWSTATE, __EVENTVALIDATION, ...), fetched once per session and url
+    and reused for every postback until the server rejects them. Call `invalidate` when a postback comes back
+    with a stale-viewstate error, the next `get` loads the page again.
+    """
+
+    def __init__(self, session: requests.Session, fields=ASPNET_STATE_FIELDS):
+        self.session = session
+        self.fields = tuple(fields)
+        self._lock = threading.Lock()
+        self._states = {}
+
+    def fetch(self, url: str, **kwargs) -> dict:
+        with self.session.get(url, stream=True, **kwargs) as response:
+            response.raise_for_status()
+            fields = extract_hidden_fields(response.iter_content(chunk_size=64 * 1024), self.fields,
+                                           encoding=response.encoding or 'utf-8')
+
+        state = {field: fields.get(field, '') for field in self.fields}
+        logger.info('Loaded form state of %s', url)
+        return state
+
+    def get(self, url: str, **kwargs) -> dict:
+        """
+        Cached state fields of the page at `url`. Returns a copy, callers can add it to their payload freely.
+        """
+        with self._lock:
+            if url not in self._states:
+                self._states[url] = self.fetch(url, **kwargs)
+            return dict(self._states[url])
+
+    def invalidate(self, url: str):
+        with self._lock:
+            self._states.pop(url, None)
@@ -0,0 +1,190 @@
+import logging
+import threading
+import time
+import uuid
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, timedelta
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+WorkUnit = namedtuple('WorkUnit', ['scraper_cls', 'post_date', 'extension', 'cycle', 'end_date'],
+                      defaults=(None,))
+UnitOutcome = namedtuple('UnitOutcome', ['unit', 'status', 'rows', 'elapsed', 'error'])
+
+
+def scrape_unit(scraper, unit, post_date: date, cycle=None, end_date: date = None) -> UnitOutcome:
+    """
+    Run `start_scraping` of a scraper for one unit and return its outcome: failed when it raised or logged errors it
+    went on after (the last one is the outcome's error), ingested when it saved nothing because all of its postings
+    were ingested before, ok or empty otherwise.
+    """
+    kwargs = {'post_date': post_date}
+    if cycle is not None:
+        kwargs['cycle'] = cycle
+    if end_date is not None:
+        kwargs['end_date'] = end_date
+
+    rows_before = scraper.rows_saved
+    scraper.errors.clear()
+    scraper.postings_skipped = 0
+    started = time.perf_counter()
+    try:
+        scraper.start_scraping(**kwargs)
+    except Exception as ex:
+        logger.error('Unit failed: %s %s', scraper.source, unit, exc_info=True)
+        return UnitOutcome(unit, 'failed', scraper.rows_saved - rows_before, time.perf_counter() - started, ex)
+
+    rows = scraper.rows_saved - rows_before
+    if scraper.errors:
+        # the scraper logged the errors and went on with its other extensions or postings
+        return UnitOutcome(unit, 'failed', rows, time.perf_counter() - started, scraper.errors[-1])
+    if not rows and scraper.postings_skipped:
+        # every posting was already ingested by an earlier run
+        return UnitOutcome(unit, 'ingested', rows, time.perf_counter() - started, None)
+    return UnitOutcome(unit, 'ok' if rows else 'empty', rows, time.perf_counter() - started, None)
+
+
+def backfill_dates(days: int = 90, end_date: date = None):
+    """
+    Dates from `days` days before `end_date` (default today) up to and including `end_date`, oldest first.
+    """
+    end_date = end_date if end_date is not None else date.today()
+    return [end_date - timedelta(days=i) for i in range(days, -1, -1)]
+
+
+def date_windows(start_date: date, end_date: date, window_days: int):
+    """
+    Split the dates from `start_date` to `end_date` (inclusive) into consecutive `(first, last)` windows of at most
+    `window_days` days, for sources that accept a date range per request.
+    """
+    windows = []
+    while start_date <= end_date:
+        last = min(start_date + timedelta(days=window_days - 1), end_date)
+        windows.append((start_date, last))
+        start_date = last + timedelta(days=1)
+    return windows
+
+
+class HostLimiter:
+    """
+    Caps the number of work units talking to the same host at once. Share one instance between engines
+    to keep the limit when several pipelines hosted on the same site are backfilled together.
+    """
+
+    def __init__(self, per_host_limit: int = 4):
+        self.per_host_limit = per_host_limit
+        self._lock = threading.Lock()
+        self._semaphores = {}
+
+    def for_host(self, host: str) -> threading.BoundedSemaphore:
+        with self._lock:
+            if host not in self._semaphores:
+                self._semaphores[host] = threading.BoundedSemaphore(self.per_host_limit)
+            return self._semaphores[host]
+
+
+class BackfillEngine:
+    """
+    Runs date x extension x cycle work units of one or more PipelineScraper subclasses over a bounded thread pool.
+
+    Every worker thread keeps its own scraper instance per scraper class, so scrapers keep their session
+    (and its keep-alive connections) across units without sharing mutable state between threads.
+    """
+
+    def __init__(self, max_workers: int = 8, per_host_limit: int = 4, host_limiter: HostLimiter = None,
+                 job_id: str = None, progress=None, scraper_kwargs: dict = None):
+        """
+        :param max_workers: size of the worker pool
+        :param per_host_limit: maximum concurrent units per host, ignored when `host_limiter` is given
+        :param host_limiter: limiter shared with other engines
+        :param job_id: job id handed to the scrapers, a new uuid by default
+        :param progress: optional callable(done, total, outcome) invoked after every unit
+        :param scraper_kwargs: extra keyword arguments for the scrapers, e.g. `output_sinks`
+        """
+        self.max_workers = max_workers
+        self.host_limiter = host_limiter if host_limiter is not None else HostLimiter(per_host_limit)
+        self.job_id = job_id if job_id is not None else str(uuid.uuid4())
+        self.progress = progress
+        self.scraper_kwargs = scraper_kwargs or {}
+        self._local = threading.local()
+        # metrics recorders of the scrapers created, for the summary at the end of a run
+        self._metrics = []
+        self._metrics_lock = threading.Lock()
+
+    @staticmethod
+    def plan(scraper_cls, post_dates, extensions=None, cycles=None, split_extensions: bool = True,
+             window_days: int = None):
+        """
+        Build the work units for a scraper class.
+
+        :param scraper_cls: PipelineScraper subclass
+        :param post_dates: iterable of dates
+        :param extensions: extensions to scrape, defaults to the class `source_extensions` when splitting
+        :param cycles: cycles to scrape, None uses the scraper's default cycle
+        :param split_extensions: one unit per extension instead of one unit for all of them
+        :param window_days: for scrapers whose start_scraping accepts an `end_date`, cover the dates with one unit
+            per window of this many days instead of one unit per date
+        :return: list of WorkUnit
+        """
+        if extensions is None and split_extensions:
+            extensions = getattr(scraper_cls, 'source_extensions', None)
+        extensions = extensions or [None]
+        cycles = cycles or [None]
+        post_dates = list(post_dates)
+        if window_days:
+            ranges = date_windows(min(post_dates), max(post_dates), window_days)
+        else:
+            ranges = [(post_date, None) for post_date in post_dates]
+        return [WorkUnit(scraper_cls, post_date, extension, cycle, end_date)
+                for post_date, end_date in ranges for extension in extensions for cycle in cycles]
+
+    def get_scraper(self, scraper_cls):
+        scrapers = getattr(self._local, 'scrapers', None)
+        if scrapers is None:
+            scrapers = self._local.scrapers = {}
+        if scraper_cls not in scrapers:
+            scrapers[scraper_cls] = scraper_cls(job_id=self.job_id, **self.scraper_kwargs)
+            metrics = scrapers[scraper_cls].metrics
+            with self._metrics_lock:
+                if metrics is not None and all(metrics is not known for known in self._metrics):
+                    self._metrics.append(metrics)
+        return scrapers[scraper_cls]
+
+    def run_unit(self, unit: WorkUnit) -> UnitOutcome:
+        scraper = self.get_scraper(unit.scraper_cls)
+        if unit.extension is not None:
+            scraper.source_extensions = [unit.extension]
+        with self.host_limiter.for_host(urlparse(scraper.web_url).netloc):
+            return scrape_unit(scraper, unit, unit.post_date, unit.cycle, unit.end_date)
+
+    def run(self, units):
+        """
+        Run all units and return their outcomes in completion order.
+        """
+        units = list(units)
+        total = len(units)
+        outcomes = []
+        started = time.perf_counter()
+        logger.info('Backfill started: %s units, %s workers', total, self.max_workers)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [executor.submit(self.run_unit, unit) for unit in units]
+            for future in as_completed(futures):
+                outcome = future.result()
+                outcomes.append(outcome)
+                logger.info('Backfill progress %s/%s: %s %s %s -> %s (%s rows, %.1fs)', len(outcomes), total,
+                            outcome.unit.scraper_cls.source, outcome.unit.post_date, outcome.unit.extension or '',
+                            outcome.status, outcome.rows, outcome.elapsed)
+                if self.progress is not None:
+                    self.progress(len(outcomes), total, outcome)
+
+        statuses = [outcome.status for outcome in outcomes]
+        logger.info('Backfill finished in %.1fs: %s ok, %s already ingested, %s empty, %s failed',
+                    time.perf_counter() - started, statuses.count('ok'), statuses.count('ingested'),
+                    statuses.count('empty'), statuses.count('failed'))
+        for metrics in self._metrics:
+            metrics.flush()
+            metrics.log_summary()
+        return outcomes
@@ -0,0 +1,7 @@
+"""
+Micro-benchmarks of the scrapers' hot paths. Every module is runnable on its own, e.g.
+
+    python -m scraper.benchmarks.hidden_fields
+
+`scrapers` runs all scrapers end to end against a local server replaying the fixtures of `fixtures`.
+"""
@@ -0,0 +1,54 @@
+import re
+from datetime import date, timedelta
+
+from bs4 import BeautifulSoup
+
+from scraper.benchmarks.common import measure, report
+from scraper.berkshire_hathaway_energy import BerkshireHathawayEnergy, PostingIndex
+
+CYCLES = BerkshireHathawayEnergy.cycle_options
+
+
+def build_page(days: int = 91, end_date: date = date(2022, 8, 26)) -> bytes:
+    """
+    InfoPostServlet headers page listing a posting per cycle for each of the last `days` gas days, newest first.
+    """
+    links = ''.join(
+        f'<tr><td><a href="javascript:showPosting(\'{100000 + day * 10 + cycle}\')">Operationally Available '
+        f'{(end_date - timedelta(days=day)).strftime("%m/%d/%Y")} {name}</a></td><td>Posted</td></tr>'
+        for day in range(days) for cycle, name in CYCLES.items())
+    return f'<html><body><table>{links}</table></body></html>'.encode('utf-8')
+
+
+def find_seq_no_scan(content: bytes, post_date: date, cycle: int) -> str:
+    # the lookup before the posting index: parse the page and match every link, for each date and cycle
+    soup = BeautifulSoup(content, 'lxml')
+    pattern = r'.*?{}.*?{}'.format(post_date.strftime('%m/%d/%Y'), CYCLES[cycle])
+    for element in soup.find_all('a'):
+        if re.match(pattern, element.text):
+            return re.search(r'(\d+)', element['href']).group(1)
+    return ''
+
+
+def main(days: int = 91, end_date: date = date(2022, 8, 26)):
+    content = build_page(days, end_date)
+    lookups = [(end_date - timedelta(days=day), cycle) for day in range(days) for cycle in CYCLES]
+
+    def scan_all():
+        return [find_seq_no_scan(content, post_date, cycle) for post_date, cycle in lookups]
+
+    def index_all():
+        index = PostingIndex(content, CYCLES)
+        return [index.get(post_date, cycle) for post_date, cycle in lookups]
+
+    assert scan_all() == index_all()
+    results = {
+        'page parse + scan per lookup': measure(scan_all, repeat=1),
+        'one PostingIndex': measure(index_all),
+    }
+    report(f'BHE seq numbers of {len(lookups)} gas days and cycles, {len(content) / 1024:.0f} KiB page '
+           f'(the scan also fetched the page once per lookup)', results)
+
+
+if __name__ == '__main__':
+    main()
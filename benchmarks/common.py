@@ -0,0 +1,37 @@
+import gc
+import time
+import tracemalloc
+
+
+def measure(func, repeat: int = 5):
+    """
+    Best wall-clock time of `repeat` calls of `func` and the peak memory traced by tracemalloc during one more call.
+    Memory allocated by C libraries outside the Python allocator (e.g. libxml2) is not included in the peak.
+    """
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return min(timings), peak
+
+
+def report(title: str, results: dict):
+    """
+    Print `name -> (seconds, peak bytes)` results as a table, relative to the first entry.
+    """
+    baseline_time, baseline_peak = next(iter(results.values()))
+    print(title)
+    print(f'{"":<32}{"time ms":>12}{"peak KiB":>12}{"speedup":>10}{"memory":>10}')
+    for name, (seconds, peak) in results.items():
+        print(f'{name:<32}{seconds * 1000:>12.2f}{peak / 1024:>12.0f}'
+              f'{baseline_time / seconds:>9.1f}x{baseline_peak / max(peak, 1):>9.1f}x')
@@ -0,0 +1,178 @@
+import io
+import json
+import pathlib
+import re
+import zipfile
+from datetime import date, timedelta
+
+import numpy
+
+from scraper import LOCAL_DATA_FOLDER
+
+# gas day of all fixtures, the BHE index lists postings of this day and the days before it
+POST_DATE = date(2022, 8, 26)
+FIXTURES_FOLDER = f'{LOCAL_DATA_FOLDER}/benchmark_fixtures'
+
+CAPACITY_COLUMNS = ['Loc', 'Loc Name', 'Loc Purp Desc', 'Loc/QTI', 'Flow Ind', 'Loc Zn', 'Design Capacity',
+                    'Operating Capacity', 'Total Scheduled Quantity', 'Operationally Available Capacity', 'IT',
+                    'Qty Reason']
+
+
+def capacity_rows(rows: int, seed: int = 0):
+    """
+    `rows` operationally available capacity rows as lists of strings, in the order of CAPACITY_COLUMNS.
+    """
+    rng = numpy.random.default_rng(seed)
+    capacities = rng.integers(0, 900000, rows)
+    scheduled = rng.integers(0, 900000, rows)
+    return [[str(40000 + i), f'Location {i}', 'Receipt' if i % 2 else 'Delivery', 'Meter', 'R', f'Zone {i % 4}',
+             str(capacities[i]), str(capacities[i]), str(scheduled[i]), str(capacities[i] - scheduled[i]), 'Y', '']
+            for i in range(rows)]
+
+
+def delimited(rows, sep: str, columns=CAPACITY_COLUMNS, gas_day: date = None) -> bytes:
+    header = list(columns) + (['Eff Gas Day'] if gas_day is not None else [])
+    suffix = [gas_day.strftime('%m/%d/%Y')] if gas_day is not None else []
+    lines = [sep.join(header)] + [sep.join(row + suffix) for row in rows]
+    return ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def build_gasnom(rows: int = 5000) -> bytes:
+    """
+    OAC.cfm download: tab separated capacity rows.
+    """
+    return delimited(capacity_rows(rows), '\t')
+
+
+def build_bhe_index(post_date: date = POST_DATE, days: int = 7,
+                    cycles=('Timely', 'Evening', 'Intraday 1', 'Intraday 2', 'Intraday 3')) -> bytes:
+    """
+    InfoPostServlet `headers` page: one link per posting of the last `days` gas days, named after its post date
+    and cycle, newest first.
+    """
+    links = ''.join(f'<tr><td><a href="javascript:showPosting(\'{7000 + day * 10 + i}\')">Operationally Available '
+                    f'{(post_date - timedelta(days=day)).strftime("%m/%d/%Y")} {cycle}</a></td></tr>'
+                    for day in range(days) for i, cycle in enumerate(cycles))
+    return f'<html><body><table>{links}</table></body></html>'.encode('utf-8')
+
+
+def build_bhe_csv(rows: int = 20000) -> bytes:
+    """
+    InfoPostServlet `downloadText` posting, with the trailing empty column of the source.
+    """
+    return delimited([row + [''] for row in capacity_rows(rows)], ',', CAPACITY_COLUMNS + [''])
+
+
+def build_big_sandy_zip(files: int = 2, rows: int = 50000, post_date: date = POST_DATE) -> bytes:
+    """
+    FileHandler.ashx download: a zip archive of `files` csv files of `rows` rows each.
+    """
+    content = io.BytesIO()
+    with zipfile.ZipFile(content, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for i in range(files):
+            archive.writestr(f'BSP_OA_MLC_{i}.csv', delimited(capacity_rows(rows, seed=i), ',', gas_day=post_date))
+    return content.getvalue()
+
+
+def build_kindermorgan_page() -> bytes:
+    from scraper.benchmarks.hidden_fields import build_page
+    return build_page(view_state_bytes=100 * 1024, table_rows=500)
+
+
+def build_kindermorgan_workbook(rows: int = 20000) -> bytes:
+    from scraper.benchmarks.kindermorgan_format import build_workbook
+    return build_workbook(rows)
+
+
+def build_oneok_page() -> bytes:
+    from scraper.benchmarks.hidden_fields import build_page
+    return build_page(view_state_bytes=100 * 1024, table_rows=0)
+
+
+def build_oneok_grid(rows: int = 3000) -> bytes:
+    from scraper.benchmarks.radgrid import build_page
+    return build_page(rows)
+
+
+def build_tallgrass_postings(postings: int = 4) -> bytes:
+    """
+    getInfoPostRpts.do listing of the postings of the gas day.
+    """
+    return json.dumps({'rows': [{'id': 900 + i} for i in range(postings)]}).encode('utf-8')
+
+
+def build_tallgrass_report(rows: int = 10000) -> bytes:
+    """
+    getInfoPostRptTxtFile.do posting: column names, the rows as xml and the posting information.
+    """
+    from scraper.benchmarks.tallgrass_xml import build_report
+    data_json = build_report(rows)
+    data_json['dictionaryKvpairs'] = [
+        {'name': name, 'content': content} for name, content in (
+            ('TSP Name', 'Rockies Express Pipeline LLC'), ('TSP', '000000000'),
+            ('Posting Date/Time', '08/25/2022 16:00'), ('Eff Gas Day', '08/26/2022 09:00'),
+            ('Meas Basis Desc', 'MMBtu'))]
+    return json.dumps(data_json).encode('utf-8')
+
+
+# fixture file -> builder
+FIXTURES = {
+    'gasnom.tsv': build_gasnom,
+    'bhe_index.html': build_bhe_index,
+    'bhe_posting.csv': build_bhe_csv,
+    'big_sandy.zip': build_big_sandy_zip,
+    'kindermorgan_page.html': build_kindermorgan_page,
+    'kindermorgan.xlsx': build_kindermorgan_workbook,
+    'oneok_page.html': build_oneok_page,
+    'oneok_grid.html': build_oneok_grid,
+    'tallgrass_postings.json': build_tallgrass_postings,
+    'tallgrass_report.json': build_tallgrass_report,
+}
+
+# (method, path pattern, query pattern, fixture file) of the replay server, the first matching route answers. The
+# path is matched with repeated slashes collapsed, the query pattern is searched for, None matches any query.
+ROUTES = [
+    ('POST', r'/ip/[^/]+/OAC\.cfm', None, 'gasnom.tsv'),
+    ('GET', r'/servlet/InfoPostServlet', r'method=headers', 'bhe_index.html'),
+    ('GET', r'/servlet/InfoPostServlet', r'method=downloadText', 'bhe_posting.csv'),
+    ('POST', r'/InformationalPosting/Download\.aspx/StartFile', None, {'d': 'BSP_OA_MLC'}),
+    ('POST', r'/InformationalPosting/Download\.aspx/(AddToFile|ZipFile)', None, {'d': None}),
+    ('POST', r'/InformationalPosting/HttpHandlers/FileHandler\.ashx', None, 'big_sandy.zip'),
+    ('GET', r'/Capacity/OpAvailPoint\.aspx', None, 'kindermorgan_page.html'),
+    ('POST', r'/Capacity/OpAvailPoint\.aspx', None, 'kindermorgan.xlsx'),
+    ('GET', r'/[^/]+/informational-postings/capacity/operationally-available', None, 'oneok_page.html'),
+    ('POST', r'/[^/]+/informational-postings/capacity/operationally-available', None, 'oneok_grid.html'),
+    ('POST', r'/ptms/public/infopost/getInfoPostRpts\.do', None, 'tallgrass_postings.json'),
+    ('POST', r'/ptms/public/infopost/getInfoPostRptTxtFile\.do', None, 'tallgrass_report.json'),
+]
+
+CONTENT_TYPES = {
+    '.tsv': 'text/plain', '.csv': 'text/csv', '.html': 'text/html; charset=utf-8', '.json': 'application/json',
+    '.zip': 'application/zip', '.xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+def load_fixtures(folder: str = FIXTURES_FOLDER, rebuild: bool = False) -> dict:
+    """
+    Contents of all fixtures by file name. Missing fixtures are built and written to `folder` first, files
+    already there are used as they are, so responses recorded from the live sites can be dropped in under the
+    same names to replay them instead.
+    """
+    path = pathlib.Path(folder)
+    path.mkdir(parents=True, exist_ok=True)
+    contents = {}
+    for name, build in FIXTURES.items():
+        file = path / name
+        if rebuild or not file.exists():
+            file.write_bytes(build())
+        contents[name] = file.read_bytes()
+    return contents
+
+
+def find_route(method: str, path: str, query: str):
+    path = re.sub('/{2,}', '/', path)
+    for route_method, path_pattern, query_pattern, fixture in ROUTES:
+        if route_method == method and re.fullmatch(path_pattern, path) and \
+                (query_pattern is None or re.search(query_pattern, query)):
+            return fixture
+    return None
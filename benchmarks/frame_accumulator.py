@@ -0,0 +1,51 @@
+import numpy
+import pandas
+
+from scraper.benchmarks.common import measure, report
+from scraper.frames import FrameAccumulator
+
+
+def build_parts(count: int, rows: int = 2000):
+    """
+    `count` report frames shaped like an operationally available capacity posting.
+    """
+    rng = numpy.random.default_rng(0)
+    return [pandas.DataFrame({
+        'TSP': '006958581',
+        'TSP Name': 'Pipeline Company',
+        'Eff Gas Day': '08/26/2022',
+        'Loc': rng.integers(10000, 99999, rows).astype(str),
+        'Loc Name': [f'Location {i}' for i in range(rows)],
+        'Design Capacity': rng.integers(0, 500000, rows),
+        'Operating Capacity': rng.integers(0, 500000, rows),
+        'Total Scheduled Quantity': rng.random(rows) * 100000,
+    }) for _ in range(count)]
+
+
+def repeated_concat(parts):
+    main_df = pandas.DataFrame()
+    for part in parts:
+        main_df = pandas.concat([main_df, part])
+    return main_df
+
+
+def accumulate(parts):
+    frames = FrameAccumulator()
+    for part in parts:
+        frames.append(part)
+    return frames.concat()
+
+
+def main():
+    for title, count in (('40 extensions', 40), ('365 day backfill', 365)):
+        parts = build_parts(count)
+        assert repeated_concat(parts).equals(accumulate(parts))
+        results = {
+            'pd.concat in the loop': measure(lambda: repeated_concat(parts), repeat=3),
+            'FrameAccumulator': measure(lambda: accumulate(parts), repeat=3),
+        }
+        report(f'Collecting {count} frames of {len(parts[0].index)} rows ({title})', results)
+
+
+if __name__ == '__main__':
+    main()
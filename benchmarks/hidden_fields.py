@@ -0,0 +1,56 @@
+import base64
+import os
+
+from bs4 import BeautifulSoup
+
+from scraper.aspnet import ASPNET_STATE_FIELDS, extract_hidden_fields
+from scraper.benchmarks.common import measure, report
+
+
+def build_page(view_state_bytes: int = 300 * 1024, table_rows: int = 3000) -> bytes:
+    """
+    ASP.NET-like page: hidden state fields at the top, a large grid, __EVENTVALIDATION at the end of the form.
+    """
+    view_state = base64.b64encode(os.urandom(view_state_bytes)).decode('ascii')
+    event_validation = base64.b64encode(os.urandom(4 * 1024)).decode('ascii')
+    rows = ''.join(f'<tr><td>{i}</td><td>Location {i}</td><td><input type="text" name="qty{i}" value="{i * 10}">'
+                   f'</td></tr>' for i in range(table_rows))
+    page = f'''<!DOCTYPE html><html><head><title>Operationally Available</title></head><body>
+<form method="post" action="./OpAvailPoint.aspx" id="form1">
+<input type="hidden" name="__EVENTTARGET" id="__EVENTTARGET" value="" />
+<input type="hidden" name="__EVENTARGUMENT" id="__EVENTARGUMENT" value="" />
+<input type="hidden" name="__VIEWSTATE" id="__VIEWSTATE" value="{view_state}" />
+<input type="hidden" name="__VIEWSTATEGENERATOR" id="__VIEWSTATEGENERATOR" value="A1B2C3D4" />
+<table class="grid">{rows}</table>
+<input type="hidden" name="__EVENTVALIDATION" id="__EVENTVALIDATION" value="{event_validation}" />
+</form></body></html>'''
+    return page.encode('utf-8')
+
+
+def parse_with_beautifulsoup(content: bytes, names):
+    soup = BeautifulSoup(content, 'lxml')
+    return {name: soup.find('input', {'id': name}).get('value') for name in names}
+
+
+def iter_chunks(content: bytes, chunk_size: int = 64 * 1024):
+    for start in range(0, len(content), chunk_size):
+        yield content[start:start + chunk_size]
+
+
+def main():
+    content = build_page()
+    assert parse_with_beautifulsoup(content, ASPNET_STATE_FIELDS) == extract_hidden_fields(content, ASPNET_STATE_FIELDS)
+
+    results = {
+        'BeautifulSoup lxml': measure(lambda: parse_with_beautifulsoup(content, ASPNET_STATE_FIELDS)),
+        'extract_hidden_fields': measure(lambda: extract_hidden_fields(content, ASPNET_STATE_FIELDS)),
+        'extract_hidden_fields chunked': measure(
+            lambda: extract_hidden_fields(iter_chunks(content), ASPNET_STATE_FIELDS)),
+        'extract __VIEWSTATE only': measure(
+            lambda: extract_hidden_fields(iter_chunks(content), ('__VIEWSTATE',))),
+    }
+    report(f'Hidden field extraction, {len(content) / 1024:.0f} KiB page', results)
+
+
+if __name__ == '__main__':
+    main()
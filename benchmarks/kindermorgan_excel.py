@@ -0,0 +1,62 @@
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from scraper.benchmarks.kindermorgan_format import build_workbook
+from scraper.kindermorgan import Kindermorgan
+
+ENGINES = ('openpyxl', 'openpyxl-read-only', 'calamine')
+
+
+def run_engine(engine: str, path: str, repeat: int = 3):
+    """
+    Parse and reshape the workbook at `path` with a single engine, in this process. Prints the best time and the
+    peak RSS as json.
+    """
+    with open(path, 'rb') as file:
+        content = file.read()
+    scraper = Kindermorgan.__new__(Kindermorgan)
+    scraper.excel_engines = (engine,)
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        df = scraper.format_columns(scraper.read_workbook(content))
+        timings.append(time.perf_counter() - started)
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in KiB on Linux
+    print(json.dumps({'seconds': min(timings), 'rows': len(df.index), 'peak_rss': rss_after,
+                      'rss_growth': rss_after - rss_before}))
+
+
+def main(rows: int = 50000):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'OpAvailPoint.xlsx')
+        with open(path, 'wb') as file:
+            file.write(build_workbook(rows))
+        print(f'Kindermorgan workbook, {rows} rows, {os.path.getsize(path) / 1024:.0f} KiB, one process per engine')
+        print(f'{"":<24}{"time ms":>12}{"peak RSS MiB":>14}{"RSS growth MiB":>16}{"speedup":>10}')
+
+        baseline = None
+        for engine in ENGINES:
+            completed = subprocess.run([sys.executable, '-m', 'scraper.benchmarks.kindermorgan_excel', engine, path],
+                                       capture_output=True, text=True)
+            if completed.returncode != 0:
+                print(f'{engine:<24}failed: {completed.stderr.strip().splitlines()[-1]}')
+                continue
+            result = json.loads(completed.stdout.strip().splitlines()[-1])
+            baseline = baseline or result['seconds']
+            print(f'{engine:<24}{result["seconds"] * 1000:>12.1f}{result["peak_rss"] / 1024:>14.1f}'
+                  f'{result["rss_growth"] / 1024:>16.1f}{baseline / result["seconds"]:>9.1f}x')
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 3:
+        run_engine(sys.argv[1], sys.argv[2])
+    else:
+        main()
@@ -0,0 +1,77 @@
+import io
+
+import numpy
+import pandas
+from openpyxl import Workbook
+
+from scraper.benchmarks.common import measure, report
+from scraper.kindermorgan import Kindermorgan
+
+INFO_COLUMNS = ['TSP', 'TSP Name', 'Post Date/Time', 'Eff Gas Day/Time', 'Cycle', 'Meas Basis Desc',
+                'All Cap Avail Ind']
+DETAIL_COLUMNS = ['Loc', 'Loc Name', 'Loc Purp Desc', 'Loc/QTI', 'Flow Ind', 'Loc Zn', 'Design Capacity',
+                  'Operating Capacity', 'Total Scheduled Quantity', 'Operationally Available Capacity', 'IT',
+                  'Qty Reason']
+
+
+def build_workbook(rows: int = 20000) -> bytes:
+    """
+    OpAvailPoint-like workbook: general info columns in rows 1-2, detail header in row 4, `rows` detail rows and
+    4 footer rows.
+    """
+    rng = numpy.random.default_rng(0)
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(INFO_COLUMNS)
+    sheet.append(['006958581', 'Ruby Pipeline, L.L.C.', '08/25/2022 4:02 PM', '08/26/2022 9:00 AM', 'Timely',
+                  'Million BTU\'s', 'Y'])
+    sheet.append([])
+    sheet.append(DETAIL_COLUMNS)
+    for i, (capacity, scheduled) in enumerate(zip(rng.integers(0, 900000, rows), rng.integers(0, 900000, rows))):
+        sheet.append([f'{40000 + i}', f'Location {i}', 'Receipt', 'Meter', 'R', 'Zone 1', int(capacity),
+                      int(capacity), int(scheduled), int(capacity - scheduled), 'Y', ''])
+    for _ in range(4):
+        sheet.append(['Footer note'])
+
+    content = io.BytesIO()
+    workbook.save(content)
+    return content.getvalue()
+
+
+def format_columns_lists(df):
+    """
+    Previous implementation: detail rows through python lists, info columns copied once per row.
+    """
+    detail_columns = df.iloc[3].to_list()
+    detail_data = df.iloc[4:-4]
+    detail_data = detail_data.values.tolist()
+    detail_df = pandas.DataFrame(detail_data, columns=detail_columns)
+
+    info_columns = df.iloc[0].to_list()
+    info_data = df.iloc[1].to_list()
+    dict_list = [{info_columns[i]: info_data[i] for i in range(len(info_columns)) if pandas.isnull(info_columns[i]) == False}]
+    info_df = pandas.DataFrame(dict_list)
+    info_df = pandas.concat([info_df] * len(detail_df.index), ignore_index=True)
+
+    return pandas.concat([info_df, detail_df], axis=1)
+
+
+def main():
+    sheet = pandas.read_excel(io.BytesIO(build_workbook()), engine='openpyxl', header=None)
+    scraper = Kindermorgan.__new__(Kindermorgan)
+
+    expected = format_columns_lists(sheet)
+    formatted = scraper.format_columns(sheet)
+    assert formatted.astype(object).equals(expected.astype(object))
+
+    results = {
+        'lists + concat per row': measure(lambda: format_columns_lists(sheet)),
+        'vectorized format_columns': measure(lambda: scraper.format_columns(sheet)),
+    }
+    report(f'Kindermorgan.format_columns, {len(expected.index)} rows', results)
+    print(f'result frame: {expected.memory_usage(deep=True).sum() / 1024:.0f} KiB -> '
+          f'{formatted.memory_usage(deep=True).sum() / 1024:.0f} KiB')
+
+
+if __name__ == '__main__':
+    main()
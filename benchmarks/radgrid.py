@@ -0,0 +1,68 @@
+from io import StringIO
+
+import numpy
+import pandas
+from bs4 import BeautifulSoup
+
+from scraper.benchmarks.common import measure, report
+from scraper.radgrid import read_radgrid
+
+COLUMNS = ['Loc', 'Loc Name', 'Loc Purp Desc', 'Loc/QTI', 'Flow Ind', 'Design Capacity', 'Operating Capacity',
+           'Total Scheduled Quantity', 'Operationally Available Capacity', 'IT', 'Qty Reason']
+
+
+def build_page(rows: int = 3000) -> bytes:
+    """
+    OneOK-like operationally available page: company labels, a RadGrid with static headers and `rows` data rows.
+    """
+    rng = numpy.random.default_rng(0)
+    capacities = rng.integers(0, 900000, rows)
+    scheduled = rng.integers(0, 900000, rows)
+    header = ''.join(f'<th scope="col" class="rgHeader"><a title="Click here to sort" href="javascript:__doPostBack('
+                     f'\'ctl00$content_1$grid\',\'\')">{column}</a></th>' for column in COLUMNS)
+    body = ''.join(
+        f'<tr class="{"rgAltRow" if i % 2 else "rgRow"}" id="grid_ctl00__{i}"><td>{40000 + i}</td>'
+        f'<td>Location {i} &amp; Co</td><td>M2</td><td>Meter</td><td>R</td><td>{capacities[i]:,}</td>'
+        f'<td>{capacities[i]:,}</td><td>{scheduled[i]:,}</td><td>{capacities[i] - scheduled[i]:,}</td>'
+        f'<td>Y</td><td>&nbsp;</td></tr>'
+        for i in range(rows))
+    page = f'''<!DOCTYPE html><html><head><title>Operationally Available</title></head><body>
+<form method="post" id="form1"><div id="content">
+<span id="content_1_CompanyName">Viking Gas Transmission Company</span>
+<span id="content_1_CompanyDUNS">006958581</span>
+<div id="content_1_grid" class="RadGrid RadGrid_Default">
+<div class="rgHeaderWrapper"><div class="rgHeaderDiv"><table class="rgMasterTable"><thead><tr>{header}</tr></thead>
+</table></div></div>
+<div class="rgDataDiv"><table class="rgMasterTable" id="content_1_grid_ctl00"><tbody>{body}</tbody></table></div>
+</div></div></form></body></html>'''
+    return page.encode('utf-8')
+
+
+def parse_with_read_html(content: bytes):
+    soup = BeautifulSoup(content, 'lxml')
+    headers = [th.find_next('a').text for th in soup.find_all('th', {'class': 'rgHeader'})]
+    df_result = pandas.read_html(StringIO(str(soup.select_one('.rgDataDiv > .rgMasterTable'))), na_values='')[0]
+    df_result.columns = headers
+    return df_result, soup.select_one('#content_1_CompanyDUNS').text, soup.select_one('#content_1_CompanyName').text
+
+
+def parse_with_radgrid(content: bytes):
+    df_result, texts = read_radgrid(content, element_ids=('content_1_CompanyDUNS', 'content_1_CompanyName'))
+    return df_result, texts['content_1_CompanyDUNS'], texts['content_1_CompanyName']
+
+
+def main():
+    content = build_page()
+    expected, radgrid = parse_with_read_html(content), parse_with_radgrid(content)
+    assert expected[1:] == radgrid[1:]
+    assert expected[0].astype(object).equals(radgrid[0].astype(object))
+
+    results = {
+        'BeautifulSoup + read_html': measure(lambda: parse_with_read_html(content)),
+        'read_radgrid': measure(lambda: parse_with_radgrid(content)),
+    }
+    report(f'OneOK RadGrid page, {len(expected[0].index)} rows, {len(content) / 1024:.0f} KiB', results)
+
+
+if __name__ == '__main__':
+    main()
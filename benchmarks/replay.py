@@ -0,0 +1,81 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+from scraper.benchmarks.fixtures import CONTENT_TYPES, find_route, load_fixtures
+
+
+class _ReplayHandler(BaseHTTPRequestHandler):
+    # keep-alive connections, as the live sites
+    protocol_version = 'HTTP/1.1'
+
+    def _reply(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+
+        url = urlsplit(self.path)
+        fixture = find_route(self.command, url.path, url.query)
+        if fixture is None:
+            status, body, content_type = 404, b'No fixture for this request', 'text/plain'
+        elif isinstance(fixture, dict):
+            status, body, content_type = 200, json.dumps(fixture).encode('utf-8'), 'application/json'
+        else:
+            status, body = 200, self.server.fixtures[fixture]
+            content_type = CONTENT_TYPES[fixture[fixture.rindex('.'):]]
+        self.server.requests += 1
+
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = _reply
+    do_POST = _reply
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ReplayServer:
+    """
+    Local HTTP server answering the requests of the scrapers with the benchmark fixtures, see `fixtures.ROUTES`.
+    Use it as a context manager, `url` is the base url to point the scrapers at.
+    """
+
+    def __init__(self, fixtures: dict = None, host: str = '127.0.0.1', port: int = 0):
+        """
+        :param fixtures: fixture contents by file name, `load_fixtures()` by default
+        :param port: port to listen on, a free one by default
+        """
+        self.server = ThreadingHTTPServer((host, port), _ReplayHandler)
+        self.server.daemon_threads = True
+        self.server.fixtures = fixtures if fixtures is not None else load_fixtures()
+        self.server.requests = 0
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def requests(self) -> int:
+        return self.server.requests
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name='replay-server', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
@@ -0,0 +1,29 @@
+"""
+The registered scrapers pointed at the replay server whose url is in the SCRAPER_REPLAY_URL environment variable,
+as attributes named after their source, so runner processes can load them as e.g. `scraper.benchmarks.replayed:gasnom`.
+"""
+import os
+import re
+
+from scraper.runner import SCRAPERS, load_scraper
+
+REPLAY_URL_VARIABLE = 'SCRAPER_REPLAY_URL'
+
+_HOST = re.compile(r'^https?://[^/]+')
+
+
+def retarget(scraper_cls, base_url: str):
+    """
+    Subclass of `scraper_cls` with the scheme and host of all its url attributes replaced by `base_url`.
+    """
+    urls = {name: _HOST.sub(base_url, getattr(scraper_cls, name)) for name in dir(scraper_cls)
+            if not name.startswith('__') and isinstance(getattr(scraper_cls, name), str)
+            and _HOST.match(getattr(scraper_cls, name))}
+    return type(scraper_cls.__name__, (scraper_cls,), urls)
+
+
+def __getattr__(name):
+    if name not in SCRAPERS:
+        raise AttributeError(name)
+    scraper_cls = globals()[name] = retarget(load_scraper(name), os.environ[REPLAY_URL_VARIABLE])
+    return scraper_cls
@@ -0,0 +1,64 @@
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import timedelta
+
+from scraper import runner
+from scraper.benchmarks.fixtures import POST_DATE
+from scraper.benchmarks.replay import ReplayServer
+from scraper.benchmarks.replayed import REPLAY_URL_VARIABLE
+from scraper.sinks import CsvSink
+
+
+def cold_start(statement: str, repeat: int = 5) -> float:
+    """
+    Best wall-clock time of a new interpreter running `statement`.
+    """
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, '-c', statement], check=True, capture_output=True)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def sweep(workers: int, days: int, folder: str):
+    post_dates = [POST_DATE - timedelta(days=i) for i in range(days)]
+    units = runner.plan([f'scraper.benchmarks.replayed:{name}' for name in runner.SCRAPERS], post_dates,
+                        cycles=['timely'])
+    scraper_kwargs = {'response_cache': False, 'output_sinks': [CsvSink(folder)], 'incremental': False,
+                      'retry_policy': False, 'metrics': False}
+    started = time.perf_counter()
+    outcomes = runner.run(units, max_workers=workers, scraper_kwargs=scraper_kwargs)
+    elapsed = time.perf_counter() - started
+    failed = [outcome for outcome in outcomes if outcome.status == 'failed']
+    assert not failed, failed
+    return elapsed, len(units), sum(outcome.rows for outcome in outcomes)
+
+
+def main(days: int = 3):
+    print('Cold start, new interpreter')
+    baseline = cold_start('pass')
+    for statement in ('import pandas', 'import scraper', 'import scraper.runner',
+                      'import scraper.tallgrass_energy'):
+        seconds = cold_start(statement)
+        print(f'  {statement:<36}{seconds * 1000:>8.0f} ms{(seconds - baseline) * 1000:>8.0f} ms over the bare '
+              f'interpreter')
+
+    cores = os.cpu_count() or 1
+    print(f'Sweep of all {len(runner.SCRAPERS)} sources over {days} gas days against the replay server, '
+          f'{cores} cores')
+    with ReplayServer() as server, tempfile.TemporaryDirectory() as folder:
+        os.environ[REPLAY_URL_VARIABLE] = server.url
+        for workers in sorted({1, cores}):
+            elapsed, units, rows = sweep(workers, days, folder)
+            print(f'  {workers:>3} processes {units:>4} units {rows:>9} rows {elapsed:>8.2f} s '
+                  f'{rows / elapsed:>10.0f} rows/s')
+
+
+if __name__ == '__main__':
+    logging.basicConfig(format='%(asctime)s - %(message)s', level=logging.WARNING)
+    main()
@@ -0,0 +1,115 @@
+"""
+Size of the results of all scrapers as one multi-pipeline dataset, as the sources report them and in the shared
+capacity schema: memory of the frame, CSV and Parquet files, and memory of the Parquet file read back.
+
+    python -m scraper.benchmarks.schema
+"""
+import logging
+import os
+import tempfile
+import time
+
+import pandas
+
+from scraper import schema
+from scraper.benchmarks.common import measure
+from scraper.benchmarks.fixtures import POST_DATE
+from scraper.benchmarks.replay import ReplayServer
+from scraper.benchmarks.replayed import retarget
+from scraper.benchmarks.scrapers import SCRAPERS
+from scraper.runner import load_scraper
+from scraper.sinks import CsvSinkWriter, OutputSink, SinkWriter, infer_types
+
+
+class _FrameWriter(SinkWriter):
+
+    def __init__(self, frames: list):
+        self.frames = frames
+
+    def write(self, df: pandas.DataFrame):
+        self.frames.append(df)
+
+
+class FrameSink(OutputSink):
+    """
+    Keeps the frames written to it in memory.
+    """
+
+    def __init__(self):
+        self.frames = []
+
+    def writer(self, source: str, post_date, cycle=None) -> SinkWriter:
+        return _FrameWriter(self.frames)
+
+
+def scrape_all(base_url: str, normalize_schema: bool):
+    """
+    Frames saved by every scraper for the benchmark gas day and the seconds taken.
+    """
+    sink = FrameSink()
+    started = time.perf_counter()
+    for name, kwargs in SCRAPERS.items():
+        scraper = retarget(load_scraper(name), base_url)(job_id='benchmark', response_cache=False,
+                                                         output_sinks=[sink], incremental=False,
+                                                         retry_policy=False, metrics=False,
+                                                         normalize_schema=normalize_schema)
+        scraper.start_scraping(post_date=POST_DATE, **kwargs)
+    return sink.frames, time.perf_counter() - started
+
+
+def write_csv(df: pandas.DataFrame, path: str):
+    with CsvSinkWriter(path) as writer:
+        writer.write(df)
+
+
+def write_parquet(df: pandas.DataFrame, path: str):
+    # as ParquetSinkWriter writes a frame
+    import pyarrow
+    import pyarrow.parquet
+
+    pyarrow.parquet.write_table(pyarrow.Table.from_pandas(infer_types(df), preserve_index=False), path,
+                                compression='zstd')
+
+
+def sizes(df: pandas.DataFrame, folder: str, name: str):
+    """
+    Bytes of the frame in memory, as CSV and Parquet files and read back from Parquet, and the best seconds of
+    writing each file.
+    """
+    csv_path, parquet_path = os.path.join(folder, f'{name}.csv'), os.path.join(folder, f'{name}.parquet')
+    csv_seconds, _ = measure(lambda: write_csv(df, csv_path), repeat=2)
+    parquet_seconds, _ = measure(lambda: write_parquet(df, parquet_path), repeat=2)
+    return {
+        'memory': int(df.memory_usage(index=True, deep=True).sum()),
+        'csv': os.path.getsize(csv_path),
+        'parquet': os.path.getsize(parquet_path),
+        'parquet read': int(pandas.read_parquet(parquet_path).memory_usage(index=True, deep=True).sum()),
+    }, {'csv write': csv_seconds, 'parquet write': parquet_seconds}
+
+
+def main():
+    with ReplayServer() as server, tempfile.TemporaryDirectory() as folder:
+        raw_frames, raw_seconds = scrape_all(server.url, normalize_schema=False)
+        frames, seconds = scrape_all(server.url, normalize_schema=True)
+        raw = pandas.concat(raw_frames)
+        dataset = schema.concat(frames)
+        results = {'as reported': sizes(raw, folder, 'raw'), 'shared schema': sizes(dataset, folder, 'schema')}
+
+    print(f'All {len(SCRAPERS)} scrapers as one dataset, {len(dataset.index)} rows, {len(raw.columns)} columns as '
+          f'reported, {len(dataset.columns)} in the shared schema')
+    size_keys, time_keys = (list(part) for part in results['as reported'])
+    print(f'{"":<16}' + ''.join(f'{f"{key} MiB":>18}' for key in size_keys)
+          + ''.join(f'{f"{key} ms":>18}' for key in ['scrape'] + time_keys))
+    for (name, (size, timing)), elapsed in zip(results.items(), (raw_seconds, seconds)):
+        print(f'{name:<16}' + ''.join(f'{value / 1024 ** 2:>18.2f}' for value in size.values())
+              + ''.join(f'{value * 1000:>18.0f}' for value in [elapsed] + list(timing.values())))
+    (base_size, base_timing), (size, timing) = results.values()
+    # > 1 is smaller / faster in the shared schema
+    print(f'{"ratio":<16}' + ''.join(f'{base_size[key] / size[key]:>17.1f}x' for key in size_keys)
+          + f'{raw_seconds / seconds:>17.2f}x' + ''.join(f'{base_timing[key] / timing[key]:>17.2f}x'
+                                                      for key in time_keys))
+
+
+if __name__ == '__main__':
+    logging.basicConfig(format='%(asctime)s - %(message)s', level=logging.WARNING)
+    main()
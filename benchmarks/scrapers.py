@@ -0,0 +1,140 @@
+"""
+End-to-end benchmark of every scraper against the replay server: throughput, CPU time per stage (request, parse,
+save) and peak memory. Every scraper runs in its own process so its peak RSS is its own.
+
+    python -m scraper.benchmarks.scrapers                         all scrapers
+    python -m scraper.benchmarks.scrapers gasnom tallgrass        some of them
+    python -m scraper.benchmarks.scrapers --save before.json      keep the results ...
+    python -m scraper.benchmarks.scrapers --compare before.json   ... and compare another commit with them
+"""
+import argparse
+import json
+import logging
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from scraper.benchmarks.fixtures import FIXTURES_FOLDER, POST_DATE, load_fixtures
+from scraper.benchmarks.replay import ReplayServer
+from scraper.benchmarks.replayed import retarget
+from scraper.runner import load_scraper
+
+# registered source -> start_scraping arguments besides the post date
+SCRAPERS = {
+    'gasnom': {},
+    'bhe': {'cycle': 1},
+    'big_sandy': {},
+    'kindermorgan': {'cycle': 1},
+    'oneok': {},
+    'tallgrass': {'cycle': 10301},
+}
+
+
+def stage_totals(summary: dict) -> dict:
+    """
+    Seconds, CPU seconds and counts of the request, parse and save events of a MetricsRecorder summary.
+    """
+    stages = {}
+    for (_, event), totals in summary.items():
+        stage = stages.setdefault(event, {'count': 0, 'seconds': 0.0, 'cpu': 0.0, 'bytes': 0, 'rows': 0})
+        stage['count'] += totals.get('count', 0)
+        stage['seconds'] += totals.get('seconds', totals.get('ttfb', 0.0) + totals.get('transfer', 0.0))
+        stage['cpu'] += totals.get('cpu', 0.0)
+        stage['bytes'] += totals.get('bytes', 0)
+        stage['rows'] += totals.get('rows', 0)
+    return stages
+
+
+def run_scraper(name: str, base_url: str, repeat: int = 3):
+    """
+    Run one scraper `repeat` times against the replay server at `base_url`, in this process. Prints the best run
+    and the peak RSS of the process as json.
+    """
+    from scraper.instrumentation import MetricsRecorder
+    from scraper.sinks import CsvSink
+
+    logging.disable(logging.WARNING)
+    kwargs = SCRAPERS[name]
+    scraper_cls = retarget(load_scraper(name), base_url)
+
+    best = None
+    with tempfile.TemporaryDirectory() as folder:
+        for _ in range(repeat):
+            metrics = MetricsRecorder()
+            scraper = scraper_cls(job_id='benchmark', response_cache=False, output_sinks=[CsvSink(folder)],
+                                  incremental=False, retry_policy=False, metrics=metrics)
+            started, cpu_started = time.perf_counter(), time.process_time()
+            scraper.start_scraping(post_date=POST_DATE, **kwargs)
+            result = {'seconds': time.perf_counter() - started, 'cpu': time.process_time() - cpu_started,
+                      'rows': scraper.rows_saved, 'stages': stage_totals(metrics.summary())}
+            if not scraper.rows_saved:
+                raise RuntimeError(f'{name} saved no rows, see the errors logged above')
+            if best is None or result['seconds'] < best['seconds']:
+                best = result
+    # ru_maxrss is in KiB on Linux
+    best['peak_rss'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps(best))
+
+
+def print_results(results: dict, baseline: dict = None):
+    print(f'{"":<14}{"rows":>8}{"wall ms":>10}{"cpu ms":>10}{"rows/s":>10}{"MiB/s":>8}{"request ms":>12}'
+          f'{"parse cpu":>11}{"save cpu":>10}{"RSS MiB":>9}' + (f'{"wall":>8}{"RSS":>7}' if baseline else ''))
+    for name, result in results.items():
+        stages = result['stages']
+        request, parse, save = (stages.get(stage, {}) for stage in ('request', 'parse', 'save'))
+        line = (f'{name:<14}{result["rows"]:>8}{result["seconds"] * 1000:>10.1f}{result["cpu"] * 1000:>10.1f}'
+                f'{result["rows"] / result["seconds"]:>10.0f}'
+                f'{request.get("bytes", 0) / 1024 ** 2 / result["seconds"]:>8.1f}'
+                f'{request.get("seconds", 0) * 1000:>12.1f}{parse.get("cpu", 0) * 1000:>11.1f}'
+                f'{save.get("cpu", 0) * 1000:>10.1f}{result["peak_rss"] / 1024:>9.1f}')
+        if baseline and name in baseline:
+            # > 1 is faster / smaller than the baseline
+            line += (f'{baseline[name]["seconds"] / result["seconds"]:>7.2f}x'
+                     f'{baseline[name]["peak_rss"] / result["peak_rss"]:>6.2f}x')
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='End-to-end scraper benchmark against recorded fixtures')
+    parser.add_argument('scrapers', nargs='*', help=f'scrapers to run, all by default: {", ".join(SCRAPERS)}')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per scraper, the best one is reported')
+    parser.add_argument('--fixtures', default=FIXTURES_FOLDER, help='folder of the fixtures')
+    parser.add_argument('--rebuild', action='store_true', help='build the fixtures again')
+    parser.add_argument('--save', help='write the results to this json file')
+    parser.add_argument('--compare', help='json file of earlier results to compare with')
+    args = parser.parse_args(argv)
+    unknown = set(args.scrapers) - set(SCRAPERS)
+    if unknown:
+        parser.error(f'unknown scrapers: {", ".join(sorted(unknown))}')
+
+    fixtures = load_fixtures(args.fixtures, rebuild=args.rebuild)
+    results = {}
+    with ReplayServer(fixtures) as server:
+        size = sum(map(len, fixtures.values())) / 1024 ** 2
+        print(f'Scrapers against the replay server, {len(fixtures)} fixtures, {size:.1f} MiB, best of {args.repeat} '
+              f'runs, one process per scraper')
+        for name in args.scrapers or SCRAPERS:
+            completed = subprocess.run([sys.executable, '-m', 'scraper.benchmarks.scrapers', '--child', name,
+                                        server.url, str(args.repeat)], capture_output=True, text=True)
+            if completed.returncode != 0:
+                print(f'{name:<14}failed: {(completed.stderr.strip().splitlines() or ["?"])[-1]}')
+                continue
+            results[name] = json.loads(completed.stdout.strip().splitlines()[-1])
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+    print_results(results, baseline)
+    if args.save:
+        with open(args.save, 'w') as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 5 and sys.argv[1] == '--child':
+        run_scraper(sys.argv[2], sys.argv[3], int(sys.argv[4]))
+    else:
+        main()
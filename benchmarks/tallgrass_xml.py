@@ -0,0 +1,58 @@
+from xml.sax.saxutils import escape
+
+import numpy
+import pandas
+import xmltodict
+
+from scraper.benchmarks.common import measure, report
+from scraper.tallgrass_energy import parse_rows_xml
+
+COLUMNS = ['Loc', 'Loc Name', 'Loc Purp Desc', 'Loc/QTI', 'Flow Ind', 'Loc Zn', 'Design Capacity',
+           'Operating Capacity', 'Total Scheduled Quantity', 'Operationally Available Capacity', 'IT',
+           'All Qty Avail', 'Qty Reason']
+
+
+def build_report(rows: int = 10000) -> dict:
+    """
+    getInfoPostRptTxtFile.do-like response of a Trellis report with `rows` rows.
+    """
+    rng = numpy.random.default_rng(0)
+    capacities = rng.integers(0, 900000, rows)
+    scheduled = rng.integers(0, 900000, rows)
+    xml_rows = ''.join(
+        f'<row id="{i}"><cell>{10000 + i}</cell><cell>{escape(f"Location {i} & Sons")}</cell><cell>M2</cell>'
+        f'<cell>Meter</cell><cell>R</cell><cell>Zone {i % 4}</cell><cell>{capacities[i]}</cell>'
+        f'<cell>{capacities[i]}</cell><cell>{scheduled[i]}</cell><cell>{capacities[i] - scheduled[i]}</cell>'
+        f'<cell>Y</cell><cell>N</cell><cell/></row>'
+        for i in range(rows))
+    return {
+        'columnNames': [{'content': column} for column in COLUMNS],
+        'xmlData': f'<?xml version="1.0" encoding="UTF-8"?><rows>{xml_rows}</rows>',
+    }
+
+
+def parse_with_xmltodict(data_json: dict) -> pandas.DataFrame:
+    columns = [column['content'] for column in data_json['columnNames']]
+    xml_json = xmltodict.parse(data_json['xmlData'])
+    df_data = [cell['cell'] for cell in xml_json['rows']['row']]
+    return pandas.DataFrame(data=df_data, columns=columns)
+
+
+def parse_streaming(data_json: dict) -> pandas.DataFrame:
+    columns = [column['content'] for column in data_json['columnNames']]
+    return parse_rows_xml(data_json['xmlData'], columns)
+
+
+def main():
+    data_json = build_report()
+    assert parse_with_xmltodict(data_json).equals(parse_streaming(data_json))
+
+    results = {
+        'xmltodict + row lists': measure(lambda: parse_with_xmltodict(data_json)),
+        'parse_rows_xml': measure(lambda: parse_streaming(data_json)),
+    }
+    report(f'Tallgrass report, 10000 rows, {len(data_json["xmlData"]) / 1024:.0f} KiB of xml', results)
+
+
+if __name__ == '__main__':
+    main()
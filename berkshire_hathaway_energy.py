@@ -1,17 +1,63 @@
 import uuid
 import logging
 import re
+import threading
+import time
 import pandas as pd
-from datetime import date, timedelta
+from datetime import date, datetime
 from io import StringIO
-from bs4 import BeautifulSoup
+from lxml import html
 
 from scraper import PipelineScraper
+from scraper.backfill import BackfillEngine, backfill_dates
 
 logging.basicConfig(format='%(asctime)s - %(message)s', level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+_POSTING_DATE = re.compile(r'\d{2}/\d{2}/\d{4}')
+_SEQ_NO = re.compile(r'(\d+)')
+
+
+class PostingIndex:
+    """
+    Sequence numbers of the postings listed on a company's InfoPostServlet headers page by `(gas day, cycle)`.
+    A link is indexed under every date in its text and every cycle named after that date, the first link listed
+    for a gas day and cycle wins.
+    """
+
+    def __init__(self, content, cycle_options: dict):
+        """
+        :param content: headers page as bytes or str
+        :param cycle_options: cycle number -> cycle name as written in the link texts
+        """
+        self.built = time.monotonic()
+        self._seq_nos = {}
+        cycles = [(cycle, re.compile(re.escape(name))) for cycle, name in cycle_options.items()]
+        for element in html.fromstring(content).iter('a'):
+            seq_no = _SEQ_NO.search(element.get('href') or '')
+            if seq_no is None:
+                continue
+            text = element.text_content()
+            for posting_date in _POSTING_DATE.finditer(text):
+                try:
+                    gas_day = datetime.strptime(posting_date.group(), '%m/%d/%Y').date()
+                except ValueError:
+                    continue
+                for cycle, pattern in cycles:
+                    if pattern.search(text, posting_date.end()):
+                        self._seq_nos.setdefault((gas_day, cycle), seq_no.group(1))
+
+    def __len__(self):
+        return len(self._seq_nos)
+
+    def get(self, gas_day: date, cycle: int) -> str:
+        """
+        Sequence number of the posting, '' when it is not listed.
+        """
+        return self._seq_nos.get((gas_day, cycle), '')
+
+
 class BerkshireHathawayEnergy(PipelineScraper):
     source = 'dekaflow.bhegts'
     source_extensions = ['cpl', 'egts']
@@ -43,26 +89,47 @@ class BerkshireHathawayEnergy(PipelineScraper):
         5: 'Intraday 3'
     }
 
-    def __init__(self, job_id):
-        PipelineScraper.__init__(self, job_id, web_url=self.api_url, source=self.source)
+    # cycle argument for each NAESB cycle, used by the cycle scheduler
+    naesb_cycles = {'timely': 1, 'evening': 2, 'intraday 1': 3, 'intraday 2': 4, 'intraday 3': 5}
 
-    def get_download_url(self, source_ext, cycle: int = None, post_date: date = None):
-        response = self.session.get(self.get_url.format(source_ext), headers=self.get_headers)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'lxml')
+    # seconds a posting index is used before a posting missing from it makes the headers page load again
+    posting_index_max_age = 60
 
-        pattern = r'.*?{}.*?{}'.format(post_date.strftime('%m/%d/%Y'), self.cycle_options[cycle])
-        seq_no = ''
+    def __init__(self, job_id, **kwargs):
+        PipelineScraper.__init__(self, job_id, web_url=self.api_url, source=self.source, **kwargs)
+        # company -> PostingIndex of its headers page, shared by all dates and cycles scraped with this instance
+        self.posting_indexes = {}
+        self._index_lock = threading.Lock()
 
-        # Find a match based on post date and cycle, then extract seq no from url
-        for element in soup.find_all('a'):
-            match_text = re.match(pattern, element.text)
-            if match_text:
-                seq_no_url = element['href']
-                seq_no_search = re.search('(\d+)', seq_no_url)
-                seq_no += seq_no_search.group(1)
-                break
+    def load_posting_index(self, source_ext) -> PostingIndex:
+        response = self.session.get(self.get_url.format(source_ext), headers=self.get_headers)
+        response.raise_for_status()
+        index = PostingIndex(response.content, self.cycle_options)
+        logger.info('Indexed %s postings of %s/%s', len(index), self.source, source_ext)
+        return index
+
+    def posting_index(self, source_ext, refresh: bool = False) -> PostingIndex:
+        with self._index_lock:
+            if refresh or source_ext not in self.posting_indexes:
+                self.posting_indexes[source_ext] = self.load_posting_index(source_ext)
+            return self.posting_indexes[source_ext]
+
+    def find_seq_no(self, source_ext, cycle: int = None, post_date: date = None) -> str:
+        """
+        Sequence number of the posting for the post date and cycle, '' when it is not posted (yet). Looked up in the
+        posting index of the company, which is loaded again when the posting is missing from an index older than
+        `posting_index_max_age`, so postings published since are found.
+        """
+        if isinstance(post_date, datetime):
+            post_date = post_date.date()
+        index = self.posting_index(source_ext)
+        seq_no = index.get(post_date, cycle)
+        if not seq_no and time.monotonic() - index.built >= self.posting_index_max_age:
+            seq_no = self.posting_index(source_ext, refresh=True).get(post_date, cycle)
+        return seq_no
 
+    def get_download_url(self, source_ext, cycle: int = None, post_date: date = None):
+        seq_no = self.find_seq_no(source_ext, cycle, post_date)
         final_download_url = self.download_url.format(source_ext, seq_no, seq_no)
 
         return final_download_url
@@ -71,36 +138,48 @@ class BerkshireHathawayEnergy(PipelineScraper):
         post_date = post_date if post_date is not None else date.today()
         cycle = cycle if cycle is not None else 1
 
-        main_df = pd.DataFrame()
-        for extension in self.source_extensions:
-            try:
-                logger.info('Scraping %s/%s pipeline gas for post date: %s', self.source, extension, post_date)
-                csv_url = self.get_download_url(extension, cycle, post_date)
-                response = self.session.get(csv_url, headers=self.get_headers)
-                response.raise_for_status()
-
-                html_text = response.text
-                csv_data = StringIO(html_text)
-
-                df_result = pd.read_csv(csv_data)
-                main_df = pd.concat([main_df, df_result])
-                logger.info('Dataframe created. End of scraping: %s', extension)
-            except Exception as ex:
-                logger.error(ex, exc_info=True)
-
-        # Remove 'Unnamed' column/s
-        main_df = main_df.loc[:, ~main_df.columns.str.startswith('Unnamed')]
-        self.save_result(main_df, post_date=post_date, local_file=True)
+        downloaded = []
+        with self.tags(post_date=post_date, cycle=cycle), \
+                self.collect_result(post_date, local_file=True, cycle=cycle) as frames:
+            for extension in self.source_extensions:
+                try:
+                    logger.info('Scraping %s/%s pipeline gas for post date: %s', self.source, extension, post_date)
+                    with self.tags(extension=extension, post_date=post_date, cycle=cycle):
+                        seq_no = self.find_seq_no(extension, cycle, post_date)
+                        if not seq_no:
+                            logger.warning('No posting of %s/%s for post date: %s, cycle: %s', self.source,
+                                           extension, post_date, cycle)
+                            continue
+                        if not self.new_postings([seq_no], post_date, cycle, extension=extension):
+                            continue
+
+                        csv_url = self.download_url.format(extension, seq_no, seq_no)
+                        with self.immutable_scope(post_date):
+                            response = self.session.get(csv_url, headers=self.get_headers)
+                        response.raise_for_status()
+
+                        with self.measure('parse') as timing:
+                            df_result = pd.read_csv(StringIO(response.text))
+                            timing['rows'] = len(df_result.index)
+                    # Remove 'Unnamed' column/s
+                    frames.append(df_result.loc[:, ~df_result.columns.str.startswith('Unnamed')])
+                    downloaded.append((extension, seq_no))
+                    logger.info('Dataframe created. End of scraping: %s', extension)
+                except Exception as ex:
+                    logger.error(ex, exc_info=True)
+                    self.errors.append(ex)
+
+        if not downloaded:
+            logger.info('No new postings of %s for post date: %s, cycle: %s', self.source, post_date, cycle)
+        for extension, seq_no in downloaded:
+            self.mark_ingested([seq_no], post_date, cycle, extension=extension)
 
         return None
 
 
 def back_fill_pipeline_date():
-    scraper = BerkshireHathawayEnergy(job_id=str(uuid.uuid4()))
-    for i in range(90, -1, -1):
-        post_date = (date.today() - timedelta(days=i))
-        print(post_date)
-        scraper.start_scraping(post_date)
+    engine = BackfillEngine()
+    engine.run(engine.plan(BerkshireHathawayEnergy, backfill_dates(90)))
 
 
 def main():
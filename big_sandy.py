@@ -1,12 +1,14 @@
+import tempfile
+import time
 import uuid
 import zipfile
 import logging
 
 import pandas as pd
-from datetime import date, datetime, timedelta
+from datetime import date, datetime
 from requests import HTTPError
-from io import BytesIO
 from scraper import PipelineScraper
+from scraper.backfill import BackfillEngine, backfill_dates, date_windows
 
 logging.basicConfig(format='%(asctime)s - %(message)s', level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -62,72 +64,112 @@ class BigSandy(PipelineScraper):
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/104.0.0.0 Safari/537.36'
     }
 
-    def __init__(self, job_id):
-        PipelineScraper.__init__(self, job_id, web_url=self.api_url, source=self.source)
+    # bytes per read of the zip download and rows per parsed csv batch, bound the memory used per run
+    download_chunk_size = 1024 * 1024
+    csv_chunk_rows = 50000
+    # gas days requested per call in range mode
+    range_window_days = 30
 
-    def set_request_params_date(self, post_date: date):
+    def __init__(self, job_id, **kwargs):
+        PipelineScraper.__init__(self, job_id, web_url=self.api_url, source=self.source, **kwargs)
+        # per instance copies, the request params are updated on every call
+        self.init_request_params = dict(self.init_request_params)
+        self.file_handle_params = dict(self.file_handle_params)
+
+    def set_request_params_date(self, post_date: date, end_date: date = None):
+        end_date = end_date if end_date is not None else post_date
         self.init_request_params['currentDate'] = post_date.strftime("%m/%d/%Y")
         self.init_request_params['startGasDate'] = post_date.strftime("%m/%d/%Y")
-        self.init_request_params['endGasDate'] = post_date.strftime("%m/%d/%Y")
+        self.init_request_params['endGasDate'] = end_date.strftime("%m/%d/%Y")
 
-    def set_file_handle_params_date(self, post_date: date):
+    def set_file_handle_params_date(self, post_date: date, end_date: date = None):
+        end_date = end_date if end_date is not None else post_date
         self.file_handle_params['startGasDate'] = post_date.strftime("%m/%d/%Y")
-        self.file_handle_params['endGasDate'] = post_date.strftime("%m/%d/%Y")
-
-    def start_scraping(self, post_date: date = None):
+        self.file_handle_params['endGasDate'] = end_date.strftime("%m/%d/%Y")
+
+    def iter_report_chunks(self, zip_ref: zipfile.ZipFile):
+        """
+        Read all csv inside the zip file in batches of `csv_chunk_rows` rows. The time spent reading each file, not
+        the time spent saving its batches, is recorded as one `parse` event.
+        """
+        for name in zip_ref.namelist():
+            with zip_ref.open(name) as file_contents:
+                seconds, cpu, rows = 0.0, 0.0, 0
+                started, cpu_started = time.perf_counter(), time.thread_time()
+                for chunk in pd.read_csv(file_contents, chunksize=self.csv_chunk_rows):
+                    seconds += time.perf_counter() - started
+                    cpu += time.thread_time() - cpu_started
+                    rows += len(chunk.index)
+                    yield chunk
+                    started, cpu_started = time.perf_counter(), time.thread_time()
+                seconds += time.perf_counter() - started
+                cpu += time.thread_time() - cpu_started
+            if self.metrics is not None:
+                self.metrics.record('parse', source=self.source, file=name, rows=rows, seconds=round(seconds, 6),
+                                    cpu=round(cpu, 6))
+
+    def start_scraping(self, post_date: date = None, end_date: date = None):
+        """
+        :param post_date: gas day, or first gas day of a range
+        :param end_date: last gas day of a range, the rows are then saved per gas day
+        :return:
+        """
         post_date = post_date if post_date is not None else date.today()
-        try:
-            logger.info('Scraping %s pipeline gas for post date: %s', self.source, post_date)
-            self.set_request_params_date(post_date=post_date)
-
-            # Start the request for preparation of zip file
-            response = self.session.post(self.start_file_url, json=self.init_request_params)
-            response.raise_for_status()
-            file_name = response.json()['d']
-
-            self.init_request_params.update({'fileName': file_name})
-
-            # add files and prepare zip
-            response = self.session.post(self.add_to_file_url, json=self.init_request_params)
-            # print(response.json())
-
-            # prepare server for zip request for file
-            response = self.session.post(self.zip_file_url, json={'fileName': file_name})
-            # print(response.content)
-
-            local_filename = f"./DATA/scraper_output/{file_name}.zip"
-            self.file_handle_params.update({'fileName': file_name})
-
-            # set param for filehandler.ashx call
-            self.set_file_handle_params_date(post_date=post_date)
-
-            # this call gets the data as zip file from server
-            with self.session.post(self.file_handler_url, data=self.file_handle_params,
-                                   headers=self.get_page_headers, stream=True) as r:
-                r.raise_for_status()
-                zip_ref = zipfile.ZipFile(BytesIO(r.content))
-
-                df_list = []
-
-                # read all csv inside the zip file
-                for name in zip_ref.namelist():
-                    with zip_ref.open(name) as file_contents:
-                        df = pd.read_csv(file_contents)
-                        df_list.append(df)
-
-                final_report = pd.concat(df_list)
-                self.save_result(final_report, post_date=post_date, local_file=True)
-        except HTTPError as ex:
-            logger.error(ex, exc_info=True)
+        is_range = end_date is not None and end_date != post_date
+        with self.tags(post_date=post_date, end_date=end_date):
+            try:
+                logger.info('Scraping %s pipeline gas for post date: %s - %s', self.source, post_date,
+                            end_date or post_date)
+                self.set_request_params_date(post_date=post_date, end_date=end_date)
+
+                # Start the request for preparation of zip file
+                response = self.session.post(self.start_file_url, json=self.init_request_params)
+                response.raise_for_status()
+                file_name = response.json()['d']
+
+                self.init_request_params.update({'fileName': file_name})
+
+                # add files and prepare zip
+                response = self.session.post(self.add_to_file_url, json=self.init_request_params)
+                response.raise_for_status()
+
+                # prepare server for zip request for file
+                response = self.session.post(self.zip_file_url, json={'fileName': file_name})
+                response.raise_for_status()
+
+                self.file_handle_params.update({'fileName': file_name})
+
+                # set param for filehandler.ashx call
+                self.set_file_handle_params_date(post_date=post_date, end_date=end_date)
+
+                # this call gets the data as zip file from server, spooled to disk so it is never held in memory
+                with self.session.post(self.file_handler_url, data=self.file_handle_params,
+                                       headers=self.get_page_headers, stream=True) as r, \
+                        tempfile.TemporaryFile() as spool:
+                    r.raise_for_status()
+                    for chunk in r.iter_content(chunk_size=self.download_chunk_size):
+                        spool.write(chunk)
+                    spool.seek(0)
+
+                    with zipfile.ZipFile(spool) as zip_ref:
+                        self.save_result_chunks(self.iter_report_chunks(zip_ref), post_date=post_date, local_file=True,
+                                                split_gas_days=is_range)
+            except HTTPError as ex:
+                logger.error(ex, exc_info=True)
+                self.errors.append(ex)
         return None
 
+    def scrape_date_range(self, start_date: date, end_date: date, window_days: int = None):
+        """
+        Scrape every gas day from `start_date` to `end_date` with one request per window of `window_days` days.
+        """
+        for first, last in date_windows(start_date, end_date, window_days or self.range_window_days):
+            self.start_scraping(post_date=first, end_date=last)
+
 
 def back_fill_pipeline_date():
-    scraper = BigSandy(job_id=str(uuid.uuid4()))
-    for i in range(90, -1, -1):
-        post_date = (date.today() - timedelta(days=i))
-        print(post_date)
-        scraper.start_scraping(post_date)
+    engine = BackfillEngine()
+    engine.run(engine.plan(BigSandy, backfill_dates(90), window_days=BigSandy.range_window_days))
 
 
 def main():
@@ -0,0 +1,266 @@
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import tempfile
+import threading
+import time
+from urllib.parse import parse_qsl, urlencode
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from scraper.context import current_context
+
+logger = logging.getLogger(__name__)
+
+# ASP.NET form state changes with every page load but does not change what the form returns
+VOLATILE_FORM_FIELDS = ('__VIEWSTATE', '__VIEWSTATEGENERATOR', '__EVENTVALIDATION', '__EVENTTARGET',
+                        '__EVENTARGUMENT')
+
+# headers describing the transfer of the original body, the cache stores the decoded body
+_TRANSFER_HEADERS = ('content-encoding', 'transfer-encoding', 'content-length')
+
+
+def is_file_response(response) -> bool:
+    """
+    Whether a response holds a report file worth caching: a 200 with a body that is not an HTML page. The sites
+    answer errors and queries without data with a 200 HTML page (ASP.NET error pages, "no data found").
+    """
+    content_type = response.headers.get('Content-Type', '').split(';')[0].strip().lower()
+    return response.status_code == 200 and bool(response.content) and content_type not in ('text/html',
+                                                                                            'application/xhtml+xml')
+
+
+class ResponseCache:
+    """
+    Disk-backed HTTP response cache.
+
+    Entries are keyed by method, url and a hash of the request body (without volatile form fields) and stored
+    as a `<key>.json` metadata file next to a `<key>.body` file. Entries older than `ttl` seconds are dropped,
+    and the least recently used entries are evicted once the cache grows over `max_bytes`.
+    """
+
+    def __init__(self, directory: str, ttl: int = 30 * 24 * 3600, max_bytes: int = 512 * 1024 * 1024,
+                 volatile_fields=VOLATILE_FORM_FIELDS):
+        self.directory = pathlib.Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.volatile_fields = set(volatile_fields)
+        self._lock = threading.Lock()
+        self._size = sum(path.stat().st_size for path in self.directory.glob('*.body'))
+
+    def _normalize_body(self, request: requests.PreparedRequest) -> bytes:
+        body = request.body or b''
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        if not isinstance(body, bytes):
+            # file-like or generator bodies cannot be hashed without consuming them
+            return b''
+        content_type = request.headers.get('Content-Type', '')
+        if content_type.startswith('application/x-www-form-urlencoded') and self.volatile_fields:
+            fields = [(name, value) for name, value in parse_qsl(body.decode('utf-8'), keep_blank_values=True)
+                      if name not in self.volatile_fields]
+            body = urlencode(sorted(fields)).encode('utf-8')
+        return body
+
+    def key(self, request: requests.PreparedRequest) -> str:
+        digest = hashlib.sha256()
+        digest.update(request.method.encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(request.url.encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(hashlib.sha256(self._normalize_body(request)).digest())
+        return digest.hexdigest()
+
+    def _paths(self, key: str):
+        return self.directory / f'{key}.json', self.directory / f'{key}.body'
+
+    def get(self, key: str):
+        """
+        Return `(meta, body)` for a stored entry, or None when missing or expired.
+        """
+        meta_path, body_path = self._paths(key)
+        try:
+            meta = json.loads(meta_path.read_text())
+            body = body_path.read_bytes()
+        except (OSError, ValueError):
+            return None
+
+        if self.ttl is not None and time.time() - meta['stored_at'] > self.ttl:
+            self.delete(key)
+            return None
+
+        self.touch(key)
+        return meta, body
+
+    def touch(self, key: str):
+        try:
+            os.utime(self._paths(key)[1])
+        except OSError:
+            pass
+
+    def put(self, key: str, response: requests.Response):
+        headers = {name: value for name, value in response.headers.items()
+                   if name.lower() not in _TRANSFER_HEADERS}
+        meta = {
+            'url': response.url,
+            'status_code': response.status_code,
+            'reason': response.reason,
+            'encoding': response.encoding,
+            'headers': headers,
+            'stored_at': time.time(),
+        }
+        body = response.content
+        meta_path, body_path = self._paths(key)
+        with self._lock:
+            previous_size = body_path.stat().st_size if body_path.exists() else 0
+            self._write_atomic(body_path, body)
+            self._write_atomic(meta_path, json.dumps(meta).encode('utf-8'))
+            self._size += len(body) - previous_size
+        if self.max_bytes is not None and self._size > self.max_bytes:
+            self.evict()
+
+    def _write_atomic(self, path: pathlib.Path, data: bytes):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as tmp_file:
+            tmp_file.write(data)
+        os.replace(tmp_path, path)
+
+    def refresh(self, key: str, response: requests.Response):
+        """
+        Update the stored metadata after a 304 Not Modified revalidation.
+        """
+        meta_path, _ = self._paths(key)
+        try:
+            meta = json.loads(meta_path.read_text())
+        except (OSError, ValueError):
+            return
+        for name in ('ETag', 'Last-Modified', 'Cache-Control', 'Expires', 'Date'):
+            if name in response.headers:
+                meta['headers'][name] = response.headers[name]
+        meta['stored_at'] = time.time()
+        with self._lock:
+            self._write_atomic(meta_path, json.dumps(meta).encode('utf-8'))
+
+    def delete(self, key: str):
+        with self._lock:
+            for path in self._paths(key):
+                try:
+                    if path.suffix == '.body':
+                        self._size -= path.stat().st_size
+                    path.unlink()
+                except OSError:
+                    pass
+
+    def evict(self):
+        """
+        Delete least recently used entries until the cache is back under `max_bytes`.
+        """
+        bodies = []
+        for path in self.directory.glob('*.body'):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            bodies.append((stat.st_mtime, stat.st_size, path.stem))
+
+        bodies.sort()
+        total = sum(size for _, size, _ in bodies)
+        with self._lock:
+            self._size = total
+        for _, size, key in bodies:
+            if total <= self.max_bytes:
+                break
+            self.delete(key)
+            total -= size
+        logger.info('Response cache evicted down to %s bytes', total)
+
+
+class CachingAdapter(BaseAdapter):
+    """
+    Transport adapter that answers requests from a ResponseCache and delegates misses to `adapter`.
+
+    Requests made inside `request_context(immutable=True)` (historical gas days) are served from the cache with
+    no network call. Other cached requests are revalidated with If-None-Match / If-Modified-Since when the stored
+    response has validators, and fetched again otherwise. Streamed requests bypass the cache.
+
+    Only the responses accepted by `validate` are stored, report files by default (see `is_file_response`), so an
+    error page is never served again in place of the report. POSTs are cached only inside a request context setting
+    `immutable` (`PipelineScraper.immutable_scope`, the report queries of a gas day), the others may change state on
+    the server.
+    """
+
+    cacheable_methods = ('GET', 'POST')
+    # methods cached only inside `request_context(immutable=...)`
+    scoped_methods = ('POST',)
+
+    def __init__(self, cache: ResponseCache, adapter: BaseAdapter = None, validate=is_file_response):
+        """
+        :param validate: callable(response) -> bool, whether to store a response
+        """
+        super().__init__()
+        self.cache = cache
+        self.adapter = adapter if adapter is not None else HTTPAdapter()
+        self.validate = validate
+
+    def is_cacheable_request(self, request) -> bool:
+        if request.method not in self.cacheable_methods:
+            return False
+        return request.method not in self.scoped_methods or 'immutable' in current_context()
+
+    def send(self, request, stream=False, **kwargs):
+        if stream or not self.is_cacheable_request(request):
+            return self.adapter.send(request, stream=stream, **kwargs)
+
+        key = self.cache.key(request)
+        entry = self.cache.get(key)
+        if entry is not None:
+            meta, body = entry
+            if current_context().get('immutable'):
+                return self.build_response(request, meta, body)
+            request = self.add_validators(request, meta)
+
+        response = self.adapter.send(request, stream=stream, **kwargs)
+        if response.status_code == 304 and entry is not None:
+            self.cache.refresh(key, response)
+            response.close()
+            return self.build_response(request, *entry)
+        if response.status_code == 200 and self.validate(response):
+            self.cache.put(key, response)
+        elif response.status_code == 200:
+            logger.debug('Not caching %s %s, not a valid response', request.method, request.url)
+        return response
+
+    @staticmethod
+    def add_validators(request, meta):
+        headers = CaseInsensitiveDict(meta['headers'])
+        if 'ETag' not in headers and 'Last-Modified' not in headers:
+            return request
+        request = request.copy()
+        if 'ETag' in headers:
+            request.headers['If-None-Match'] = headers['ETag']
+        if 'Last-Modified' in headers:
+            request.headers['If-Modified-Since'] = headers['Last-Modified']
+        return request
+
+    def build_response(self, request, meta, body):
+        response = requests.Response()
+        response.status_code = meta['status_code']
+        response.reason = meta.get('reason')
+        response.headers = CaseInsensitiveDict(meta['headers'])
+        response.encoding = meta.get('encoding') or get_encoding_from_headers(response.headers)
+        response.url = meta['url']
+        response._content = body
+        response._content_consumed = True
+        response.request = request
+        response.connection = self
+        response.from_cache = True
+        return response
+
+    def close(self):
+        self.adapter.close()
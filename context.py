@@ -0,0 +1,22 @@
+import contextvars
+from contextlib import contextmanager
+
+_request_context = contextvars.ContextVar('scraper_request_context', default={})
+
+
+@contextmanager
+def request_context(**values):
+    """
+    Attach values to every HTTP request made inside the block, e.g. `immutable=True` for the response cache.
+    Nested blocks add to (and override) the outer values. The values follow asyncio tasks and are copied into
+    the thread pool of AsyncHttpClient.
+    """
+    token = _request_context.set({**_request_context.get(), **values})
+    try:
+        yield
+    finally:
+        _request_context.reset(token)
+
+
+def current_context() -> dict:
+    return _request_context.get()
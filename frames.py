@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+import logging
+import time
+from contextlib import ExitStack
+from datetime import date
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import pandas
+
+logger = logging.getLogger(__name__)
+
+
+class ResultWriter:
+    """
+    Writes the frames of one result to the output sinks and database of a scraper as they come, without holding
+    them in memory. Frames missing columns of earlier frames get them without values. A frame with new columns
+    starts new files in the output sinks, the files written so far keep their header. Closing commits the result,
+    leaving the `with` block with an exception aborts it.
+    """
+
+    def __init__(self, scraper, post_date: date, local_file: bool = False, split_gas_days: bool = False,
+                 cycle=None, db_table_name: str = None):
+        self.scraper = scraper
+        self.post_date = post_date
+        self.local_file = local_file
+        self.split_gas_days = split_gas_days
+        self.cycle = cycle
+        self.db_table_name = db_table_name
+        self.columns = None
+        self.rows = 0
+        # column -> dtype of its first frame, for the columns missing from later frames
+        self._dtypes = {}
+        # gas day -> open writers of the output sinks, and the database writer
+        self._files = {}
+        self._database = None
+        self._stack = ExitStack()
+        # writer -> [seconds, cpu seconds, rows] written, for the save metrics
+        self._timings = {}
+
+    def _open(self, writer):
+        self._timings[writer] = [0.0, 0.0, 0]
+        return self._stack.enter_context(writer)
+
+    def _align(self, chunk: pandas.DataFrame) -> pandas.DataFrame:
+        """
+        The chunk with the columns of the result so far, then its new columns.
+        """
+        import numpy
+        import pandas
+
+        for column, dtype in chunk.dtypes.items():
+            self._dtypes.setdefault(column, dtype)
+        if self.columns is None:
+            self.columns = chunk.columns
+            return chunk
+        if chunk.columns.equals(self.columns):
+            return chunk
+
+        new = chunk.columns.difference(self.columns, sort=False)
+        if len(new):
+            logger.warning('Chunk has new columns %s, writing the rest of the result to new files', list(new))
+            self.columns = self.columns.append(new)
+            self._files.clear()
+        missing = {}
+        for column in self.columns.difference(chunk.columns, sort=False):
+            dtype = self._dtypes[column]
+            # numpy integers and booleans cannot hold missing values
+            if isinstance(dtype, numpy.dtype) and dtype.kind in 'iub':
+                dtype = 'boolean' if dtype.kind == 'b' else 'Int64'
+            missing[column] = pandas.Series(index=chunk.index, dtype=dtype)
+        if missing:
+            chunk = pandas.concat([chunk, pandas.DataFrame(missing, index=chunk.index)], axis=1)
+        return chunk[self.columns]
+
+    def _write(self, writer, df: pandas.DataFrame):
+        started, cpu_started = time.perf_counter(), time.thread_time()
+        writer.write(df)
+        timing = self._timings[writer]
+        timing[0] += time.perf_counter() - started
+        timing[1] += time.thread_time() - cpu_started
+        timing[2] += len(df.index)
+
+    def write(self, chunk: pandas.DataFrame):
+        scraper = self.scraper
+        chunk = self._align(scraper.normalize_result(chunk, self.cycle))
+
+        if self.local_file:
+            parts = scraper.split_by_gas_day(chunk, self.post_date) if self.split_gas_days \
+                else [(self.post_date, chunk)]
+            for gas_day, part in parts:
+                if gas_day not in self._files:
+                    self._files[gas_day] = [self._open(sink.writer(scraper.source, gas_day, self.cycle))
+                                            for sink in scraper.output_sinks]
+                for writer in self._files[gas_day]:
+                    self._write(writer, part)
+        if self.db_table_name:
+            # a single writer and transaction for the whole result, the gas day is part of the row key. It adds new
+            # columns to the table itself.
+            if self._database is None:
+                self._database = self._open(scraper.database.writer(scraper.source, self.post_date, self.cycle,
+                                                                    table=self.db_table_name))
+            self._write(self._database, chunk)
+        self.rows += len(chunk.index)
+
+    def close(self):
+        self._stack.close()
+        self.scraper.rows_saved += self.rows
+        metrics = self.scraper.metrics
+        for writer, (seconds, cpu, rows) in self._timings.items():
+            if metrics is not None:
+                metrics.record('save', source=self.scraper.source, sink=type(writer).__name__, rows=rows,
+                               seconds=round(seconds, 6), cpu=round(cpu, 6))
+        for writer in self._timings:
+            logger.info('Scraping data saved to: %s', writer)
+        logger.info('Saved %s rows for the source: %s', self.rows, self.scraper.source)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self._stack.__exit__(exc_type, exc_value, traceback)
+
+
+class FrameAccumulator:
+    """
+    Collects the frames of one result and concatenates them a single time, instead of growing a frame with
+    `pd.concat([main_df, df])` in a loop which copies all rows collected so far on every step.
+
+    With `max_bytes` and a `flush` callable, the collected frames are concatenated and handed to `flush` every
+    time they grow over `max_bytes`, so a long result never holds more than about `max_bytes` of rows.
+    """
+
+    def __init__(self, max_bytes: int = None, flush=None):
+        self.max_bytes = max_bytes
+        self.flush_to = flush
+        self.nbytes = 0
+        self.flushed = 0
+        self._parts = []
+
+    def __len__(self):
+        return len(self._parts)
+
+    def append(self, df: pandas.DataFrame):
+        if df is None:
+            return
+        self._parts.append(df)
+        self.nbytes += int(df.memory_usage(index=True, deep=True).sum())
+        if self.max_bytes is not None and self.flush_to is not None and self.nbytes >= self.max_bytes:
+            self.flush()
+
+    def concat(self) -> pandas.DataFrame:
+        """
+        All collected frames as one frame, the union of their columns in order of appearance. Categorical columns
+        stay categorical.
+        """
+        from scraper.schema import concat
+
+        return concat(self._parts)
+
+    def clear(self):
+        self._parts = []
+        self.nbytes = 0
+
+    def flush(self):
+        if not self._parts:
+            return
+        df = self.concat()
+        self.clear()
+        logger.info('Flushing %s collected rows', len(df.index))
+        self.flush_to(df)
+        self.flushed += 1
@@ -1,11 +1,15 @@
+import asyncio
 import uuid
-from datetime import date, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
 from io import StringIO
 import logging
 
 import pandas as pd
 
 from scraper import PipelineScraper
+from scraper.aio import AsyncHttpClient, AsyncPipelineScraper
+from scraper.backfill import BackfillEngine, backfill_dates
 
 logging.basicConfig(format='%(asctime)s - %(message)s', level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -35,8 +39,13 @@ class GasNom(PipelineScraper):
         'B1': 'Download'
     }
 
-    def __init__(self, job_id):
-        PipelineScraper.__init__(self, job_id, web_url=self.base_api_url, source=self.source)
+    # number of extensions requested at the same time
+    max_workers = 4
+
+    def __init__(self, job_id, max_workers: int = None, **kwargs):
+        PipelineScraper.__init__(self, job_id, web_url=self.base_api_url, source=self.source, **kwargs)
+        if max_workers is not None:
+            self.max_workers = max_workers
 
     def get_payload(self, post_date: date = None):
 
@@ -47,44 +56,96 @@ class GasNom(PipelineScraper):
             dates = {'frmEffectiveDt': post_date.strftime('%m/%d/%Y'),
                      'FRMENDDT': post_date.strftime('%m/%d/%Y')}
 
-        self.payload.update(dates)
+        payload = dict(self.payload)
+        payload.update(dates)
+
+        return payload
+
+    def parse_response(self, response):
+        response.raise_for_status()
 
-        return self.payload
+        html_text = response.text
+
+        csv_data = StringIO(html_text)
+        return pd.read_csv(csv_data, sep='\t')
+
+    def scrape_extension(self, extension, post_date: date = None):
+        logger.info('Scraping %s/%s pipeline gas for post date: %s', self.source, extension, post_date)
+        payload = self.get_payload(post_date)
+        # runs in a worker thread, which does not see the tags of start_scraping
+        with self.tags(extension=extension, post_date=post_date):
+            with self.immutable_scope(post_date), self.idempotent():
+                response = self.session.post(self.post_data_url.format(extension), data=payload,
+                                             headers=self.post_page_headers)
+            with self.measure('parse') as timing:
+                df_result = self.parse_response(response)
+                timing['rows'] = len(df_result.index)
+        logger.info('Dataframe created for: %s', extension)
+        return df_result
 
     def start_scraping(self, post_date: date = None):
         """
+        Requests up to `max_workers` extensions at the same time and concatenates their frames once.
+
         :param post_date:
         :return:
         """
-        main_df = pd.DataFrame()
-        for extension in self.source_extensions:
-            try:
-                logger.info('Scraping %s pipeline gas for post date: %s', self.source, post_date)
-                payload = self.get_payload(post_date)
-                response = self.session.post(self.post_data_url.format(extension), data=payload,
-                                             headers=self.post_page_headers)
-                response.raise_for_status()
+        max_workers = max(1, min(self.max_workers, len(self.source_extensions)))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor, self.tags(post_date=post_date), \
+                self.collect_result(post_date, local_file=True) as frames:
+            futures = [executor.submit(self.scrape_extension, extension, post_date)
+                       for extension in self.source_extensions]
+            for extension, future in zip(self.source_extensions, futures):
+                try:
+                    frames.append(future.result())
+                except Exception as ex:
+                    logger.error('%s: %s', extension, ex, exc_info=True)
+                    self.errors.append(ex)
 
-                html_text = response.text
+        return None
 
-                csv_data = StringIO(html_text)
-                df_result = pd.read_csv(csv_data, sep='\t')
-                main_df = pd.concat([main_df, df_result])
-                logger.info('Dataframe created for: %s', extension)
-            except Exception as ex:
-                logger.error(ex, exc_info=True)
 
-        self.save_result(main_df, post_date=post_date, local_file=True)
+class AsyncGasNom(GasNom, AsyncPipelineScraper):
+    """
+    GasNom with all source extensions requested at the same time.
+    """
+
+    def __init__(self, job_id, client: AsyncHttpClient = None, **kwargs):
+        AsyncPipelineScraper.__init__(self, job_id, web_url=self.base_api_url, source=self.source, client=client,
+                                      **kwargs)
+
+    async def scrape_extension(self, extension, post_date: date = None):
+        logger.info('Scraping %s/%s pipeline gas for post date: %s', self.source, extension, post_date)
+        with self.tags(extension=extension, post_date=post_date):
+            with self.immutable_scope(post_date), self.idempotent():
+                response = await self.client.post(self.post_data_url.format(extension),
+                                                  data=self.get_payload(post_date), headers=self.post_page_headers)
+            with self.measure('parse') as timing:
+                df_result = self.parse_response(response)
+                timing['rows'] = len(df_result.index)
+        logger.info('Dataframe created for: %s', extension)
+        return df_result
+
+    async def start_scraping(self, post_date: date = None):
+        results = await asyncio.gather(*(self.scrape_extension(extension, post_date)
+                                         for extension in self.source_extensions), return_exceptions=True)
+        frames = []
+        for extension, result in zip(self.source_extensions, results):
+            if isinstance(result, Exception):
+                logger.error('%s: %s', extension, result, exc_info=result)
+                self.errors.append(result)
+            else:
+                frames.append(result)
+
+        main_df = pd.concat(frames) if frames else pd.DataFrame()
+        await self.save_result_async(main_df, post_date=post_date, local_file=True)
 
         return None
 
 
 def back_fill_pipeline_date():
-    scraper = GasNom(job_id=str(uuid.uuid4()))
-    for i in range(90, -1, -1):
-        post_date = (date.today() - timedelta(days=i))
-        print(post_date)
-        scraper.start_scraping(post_date)
+    engine = BackfillEngine()
+    engine.run(engine.plan(GasNom, backfill_dates(90)))
 
 
 def main():
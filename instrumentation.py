@@ -0,0 +1,168 @@
+import atexit
+import json
+import logging
+import pathlib
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from scraper.context import current_context
+
+logger = logging.getLogger(__name__)
+
+# request context values that are not tags
+_UNTAGGED = ('immutable',)
+# numeric fields that are not added up in the summary
+_NOT_SUMMED = ('status', 'attempt')
+
+_connection_timing = threading.local()
+
+
+def connection_timing() -> dict:
+    """
+    Timings of the connections opened by the current thread since the last `reset_connection_timing`.
+    """
+    return getattr(_connection_timing, 'values', None) or {}
+
+
+def reset_connection_timing():
+    _connection_timing.values = {}
+
+
+def _add_connection_timing(name: str, seconds: float):
+    values = getattr(_connection_timing, 'values', None)
+    if values is None:
+        values = _connection_timing.values = {}
+    values[name] = values.get(name, 0.0) + seconds
+
+
+class _TimedConnectionMixin:
+    """
+    Records how long opening the socket (name resolution and TCP connect) and the TLS handshake take.
+    """
+
+    def _new_conn(self):
+        started = time.perf_counter()
+        try:
+            return super()._new_conn()
+        finally:
+            _add_connection_timing('connect', time.perf_counter() - started)
+
+    def connect(self):
+        started = time.perf_counter()
+        connect_before = connection_timing().get('connect', 0.0)
+        try:
+            return super().connect()
+        finally:
+            handshake = time.perf_counter() - started - (connection_timing().get('connect', 0.0) - connect_before)
+            if isinstance(self, HTTPSConnection):
+                _add_connection_timing('tls', handshake)
+
+
+class TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class TimedHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+    pass
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+TIMED_POOL_CLASSES = {'http': TimedHTTPConnectionPool, 'https': TimedHTTPSConnectionPool}
+
+
+class MetricsRecorder:
+    """
+    Records timing and throughput events (requests, parsing, saving, ...) tagged with the values of the request
+    context (source, extension, post date, cycle, ...). Every event is added to in-memory totals per source and
+    event, see `summary`, and written as a JSON line to `path` when one is given. The lines are buffered and
+    appended `buffer_events` at a time or every `flush_seconds`, and on `flush` and at exit.
+    """
+
+    def __init__(self, path: str = None, buffer_events: int = 1000, flush_seconds: float = 10.0):
+        self.path = path
+        self.buffer_events = buffer_events
+        self.flush_seconds = flush_seconds
+        self._lock = threading.Lock()
+        self._totals = defaultdict(lambda: defaultdict(int))
+        self._lines = []
+        self._flushed = time.monotonic()
+        if path is not None:
+            pathlib.Path(path).parent.mkdir(parents=True, exist_ok=True)
+            atexit.register(self.flush)
+
+    @staticmethod
+    def tags() -> dict:
+        return {name: value for name, value in current_context().items() if name not in _UNTAGGED}
+
+    def record(self, event: str, **fields):
+        """
+        Record an event. Fields set to None are left out, numeric fields (but the status and attempt of requests)
+        are summed up per source and event for the summary.
+        """
+        fields = {name: value for name, value in fields.items() if value is not None}
+        values = {'ts': datetime.now(timezone.utc).isoformat(timespec='milliseconds'), 'event': event,
+                  **self.tags(), **fields}
+        line = json.dumps(values, default=str) + '\n' if self.path is not None else None
+        with self._lock:
+            totals = self._totals[(values.get('source'), event)]
+            totals['count'] += 1
+            for name, value in fields.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool) and name not in _NOT_SUMMED:
+                    totals[name] += value
+            if line is None:
+                return
+            self._lines.append(line)
+            if len(self._lines) >= self.buffer_events or time.monotonic() - self._flushed >= self.flush_seconds:
+                self._flush()
+
+    def _flush(self):
+        if self._lines:
+            with open(self.path, 'a') as file:
+                file.writelines(self._lines)
+            self._lines = []
+        self._flushed = time.monotonic()
+
+    def flush(self):
+        """
+        Append the buffered events to the file.
+        """
+        if self.path is not None:
+            with self._lock:
+                self._flush()
+
+    @contextmanager
+    def timer(self, event: str, **fields):
+        """
+        Record an event with the `seconds` the block took and the CPU time of the current thread in it (`cpu`). The
+        block can add fields (e.g. `rows`) to the yielded dict. Nothing is recorded when the block raises.
+        """
+        started, cpu_started = time.perf_counter(), time.thread_time()
+        yield fields
+        self.record(event, seconds=round(time.perf_counter() - started, 6),
+                    cpu=round(time.thread_time() - cpu_started, 6), **fields)
+
+    def summary(self) -> dict:
+        """
+        Totals per `(source, event)`: count and the sums of the numeric fields, e.g. seconds, bytes and rows.
+        """
+        with self._lock:
+            return {key: dict(totals) for key, totals in self._totals.items()}
+
+    def log_summary(self):
+        for (source, event), totals in sorted(self.summary().items(), key=lambda item: str(item[0])):
+            logger.info('%s %s: %s', source, event, ', '.join(f'{name}={value:.3f}' if isinstance(value, float)
+                                                              else f'{name}={value}'
+                                                              for name, value in totals.items()))
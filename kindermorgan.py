@@ -1,16 +1,42 @@
+import io
 import uuid
 import logging
+import numpy
 import pandas as pd
-from bs4 import BeautifulSoup
-from datetime import date, timedelta
+from datetime import date
 
 from scraper import PipelineScraper
+from scraper.aspnet import FormStateCache
+from scraper.backfill import BackfillEngine, backfill_dates
+from scraper.schema import constant_column
 
 
 logging.basicConfig(format='%(asctime)s - %(message)s', level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+def read_sheet_read_only(content: bytes) -> pd.DataFrame:
+    """
+    First sheet of a workbook as a frame without header, streamed row by row with openpyxl in read-only mode
+    instead of loading the workbook object model.
+    """
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(io.BytesIO(content), read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        # the dimensions stored in generated workbooks are often wrong
+        sheet.reset_dimensions()
+        rows = list(sheet.iter_rows(values_only=True))
+    finally:
+        workbook.close()
+
+    while rows and all(value is None for value in rows[-1]):
+        rows.pop()
+    df = pd.DataFrame(rows)
+    return df.where(df.notna(), numpy.nan)
+
+
 class Kindermorgan(PipelineScraper):
     source = "pipeline2.kindermorgan"
     api_url = "https://pipeline2.kindermorgan.com/"
@@ -33,19 +59,26 @@ class Kindermorgan(PipelineScraper):
         'Upgrade-Insecure-Requests': '1'
     }
 
-    def __init__(self, job_id):
-        PipelineScraper.__init__(self, job_id, web_url=self.api_url, source=self.source)
+    # ddlCycleDD index of each NAESB cycle, used by the cycle scheduler
+    naesb_cycles = {'timely': 1, 'evening': 2, 'intraday 1': 3, 'intraday 2': 4, 'intraday 3': 5}
+
+    # workbook readers tried in order: calamine (python-calamine package), streaming openpyxl, full openpyxl
+    excel_engines = ('calamine', 'openpyxl-read-only', 'openpyxl')
+
+    def __init__(self, job_id, **kwargs):
+        PipelineScraper.__init__(self, job_id, web_url=self.api_url, source=self.source, **kwargs)
+        # the hidden form fields of OpAvailPoint.aspx are loaded once and reused for all locations and dates
+        self.form_state = FormStateCache(self.session)
 
     def get_payload(self, cycle: int, post_date=None):
         payload_post_date = post_date.strftime('%Y-%-m-%d')
-        response = self.session.get(self.get_url)
-        soup = BeautifulSoup(response.text, 'lxml')
+        form_state = self.form_state.get(self.get_url)
 
-        view_state = soup.find("input", {'id': '__VIEWSTATE'}).get('value')
-        event_argument = soup.find("input", {'id': '__EVENTARGUMENT'}).get('value')
-        event_target = soup.find("input", {'id': '__EVENTTARGET'}).get('value')
-        view_state_generator = soup.find("input", {'id': '__VIEWSTATEGENERATOR'}).get('value')
-        event_validation = soup.find("input", {'id': '__EVENTVALIDATION'}).get('value')
+        view_state = form_state['__VIEWSTATE']
+        event_argument = form_state['__EVENTARGUMENT']
+        event_target = form_state['__EVENTTARGET']
+        view_state_generator = form_state['__VIEWSTATEGENERATOR']
+        event_validation = form_state['__EVENTVALIDATION']
 
         payload = {
             'ctl00$WebSplitter1$tmpl1$ContentPlaceHolder1$HeaderBTN1$DownloadDDL': 'EXCEL',
@@ -62,46 +95,86 @@ class Kindermorgan(PipelineScraper):
         }
         return payload
 
+    @staticmethod
+    def is_rejected(response) -> bool:
+        # a postback with stale form state gets an error page instead of the workbook (xlsx files are zip archives)
+        return response.status_code >= 500 or not response.content.startswith(b'PK')
+
+    def is_cacheable_response(self, response) -> bool:
+        return response.status_code == 200 and not self.is_rejected(response)
+
+    def download_report(self, cycle, post_date: date, location: dict):
+        payload = self.get_payload(cycle, post_date)
+        payload.update(location)
+        with self.immutable_scope(post_date), self.idempotent():
+            response = self.session.post(self.post_data_url, data=payload, headers=self.post_page_headers)
+
+        if self.is_rejected(response):
+            logger.info('Form state of %s rejected, reloading it', self.get_url)
+            self.form_state.invalidate(self.get_url)
+            payload = self.get_payload(cycle, post_date)
+            payload.update(location)
+            with self.immutable_scope(post_date), self.idempotent():
+                response = self.session.post(self.post_data_url, data=payload, headers=self.post_page_headers)
+
+        response.raise_for_status()
+        return response.content
+
+    def read_workbook(self, content: bytes) -> pd.DataFrame:
+        """
+        First sheet of a downloaded workbook as a frame without header, read with the first of `excel_engines`
+        that is installed and can parse it.
+        """
+        error = None
+        for engine in self.excel_engines:
+            try:
+                if engine == 'openpyxl-read-only':
+                    return read_sheet_read_only(content)
+                return pd.read_excel(io.BytesIO(content), engine=engine, header=None)
+            except ImportError:
+                continue
+            except Exception as ex:
+                logger.warning('Excel engine %s failed, trying the next one: %s', engine, ex)
+                error = ex
+        raise error if error is not None else ImportError('No excel engine available: %s' % (self.excel_engines,))
+
     def start_scraping(self, cycle=None, post_date=None):
         post_date = post_date if post_date is not None else date.today()
         cycle = cycle if cycle is not None else '1'
         locations = [{'ctl00$WebSplitter1$tmpl1$ContentPlaceHolder1$location': 'rbDelivery'},
                      {'ctl00$WebSplitter1$tmpl1$ContentPlaceHolder1$location': 'rbReceipt'}]
 
-        main_df = pd.DataFrame()
         logger.info('Scraping %s pipeline gas for post date: %s', self.source, post_date)
-        for loc in locations:
-            try:
-                payload = self.get_payload(cycle, post_date)
-                payload.update(loc)
-                response = self.session.post(self.post_data_url, data=payload, headers=self.post_page_headers)
-                response.raise_for_status()
-                excel_file = response.content
-
-                df = pd.read_excel(excel_file, engine='openpyxl', header=None)
-                report = self.format_columns(df)
-                main_df = pd.concat([main_df, report])
+        with self.tags(post_date=post_date, cycle=cycle), \
+                self.collect_result(post_date, local_file=True, cycle=cycle) as frames:
+            for loc in locations:
+                try:
+                    excel_file = self.download_report(cycle, post_date, loc)
 
-            except Exception as ex:
-                logger.error(ex, exc_info=True)
+                    with self.measure('parse', bytes=len(excel_file)) as timing:
+                        df_result = self.format_columns(self.read_workbook(excel_file))
+                        timing['rows'] = len(df_result.index)
+                    frames.append(df_result)
 
-        self.save_result(main_df, post_date, local_file=True)
+                except Exception as ex:
+                    logger.error(ex, exc_info=True)
+                    self.errors.append(ex)
 
         return None
 
     def format_columns(self, df):
-        # get column names and values from row 3 and below
-        detail_columns = df.iloc[3].to_list()
-        detail_data = df.iloc[4:-4]
-        detail_data = detail_data.values.tolist()
-        detail_df = pd.DataFrame(detail_data, columns=detail_columns)
-
-        # get column names and values from rows 1-2 for the general info columns (i.e. TSP, TSP Name, etc.)
-        info_columns = df.iloc[0].to_list()
-        info_data = df.iloc[1].to_list()
-        dict_list = [{info_columns[i]: info_data[i] for i in range(len(info_columns)) if pd.isnull(info_columns[i]) == False}]
-        info_df = pd.DataFrame(dict_list)
-        info_df = pd.concat([info_df]*len(detail_df.index), ignore_index=True)
+        # column names from row 3, values from row 4 up to the 4 footer rows, sliced without copying to python lists
+        detail_df = df.iloc[4:-4].set_axis(df.iloc[3].to_list(), axis=1).reset_index(drop=True).infer_objects()
+
+        # general info columns (i.e. TSP, TSP Name, etc.) from rows 1-2, the same value on every row: broadcast as
+        # single-category columns holding one int8 code per row instead of a copy of the value per row
+        rows = len(detail_df.index)
+        info = {}
+        for column, value in zip(df.iloc[0].to_list(), df.iloc[1].to_list()):
+            if pd.isnull(column) == False:
+                info[column] = value
+        info_df = pd.DataFrame({column: constant_column(value, rows) for column, value in info.items()},
+                               index=detail_df.index)
 
         # combine all data
         final_df = pd.concat([info_df, detail_df], axis=1)
@@ -110,10 +183,8 @@ class Kindermorgan(PipelineScraper):
 
 
 def back_fill_pipeline_date():
-    scraper = Kindermorgan(job_id=str(uuid.uuid4()))
-    for i in range(90, -1, -1):
-        post_date = (date.today() - timedelta(days=i))
-        scraper.start_scraping(post_date)
+    engine = BackfillEngine()
+    engine.run(engine.plan(Kindermorgan, backfill_dates(90)))
 
 
 def main():
@@ -1,13 +1,17 @@
+import asyncio
 import uuid
 import json
 import logging
 import pandas as pd
-from bs4 import BeautifulSoup
-from datetime import date, datetime, timedelta
+from datetime import date, datetime
 
-from requests import HTTPError
 
 from scraper import PipelineScraper
+from scraper.aio import AsyncHttpClient, AsyncPipelineScraper
+from scraper.aspnet import extract_hidden_fields
+from scraper.backfill import BackfillEngine, backfill_dates
+from scraper.radgrid import read_radgrid
+from scraper.schema import constant_column
 
 logging.basicConfig(format='%(asctime)s - %(message)s', level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -20,34 +24,38 @@ class OneOK(PipelineScraper):
     post_url = 'https://www.oneok.com/{}/informational-postings/capacity/operationally-available'
     download_csv_url = 'https://www.oneok.com/{}/informational-postings/capacity/operationally-available'
 
-    html_header_css = ".rgHeaderDiv .rgMasterTable"
-    html_table_css = ".rgDataDiv > .rgMasterTable"
+    tsp_element_id = 'content_1_CompanyDUNS'
+    tsp_name_element_id = 'content_1_CompanyName'
     params = {}
 
-    def __init__(self, job_id):
-        PipelineScraper.__init__(self, job_id, web_url=self.api_url, source=self.source)
+    def __init__(self, job_id, **kwargs):
+        PipelineScraper.__init__(self, job_id, web_url=self.api_url, source=self.source, **kwargs)
 
-    def get_headers(self, soup: BeautifulSoup):
-        theads = soup.find_all("th", {"class": "rgHeader"})
-        headers = [th.findNext("a").text for th in theads]
-        return headers
+    def get_page_request(self, ext, params: dict, post_date: date = None):
+        with self.session.get(self.post_url.format(ext), stream=True) as response:
+            self.set_page_state(response, params)
 
-    def get_page_request(self, ext, post_date: date = None):
-        response = self.session.get(self.post_url.format(ext))
-        response.raise_for_status()
-        soup = BeautifulSoup(response.content, 'lxml')
+    def is_cacheable_response(self, response) -> bool:
+        # the report is the grid of an HTML page, pages without it or without rows are errors or not posted yet
+        return response.status_code == 200 and b'rgMasterTable' in response.content and \
+            b'rgNoRecords' not in response.content
 
-        view_state = soup.find("input", {'type': 'hidden', 'id': '__VIEWSTATE'}).get("value")
-        event_validation = soup.find("input", {"type": "hidden", "id": "__EVENTVALIDATION"}).get("value")
+    def set_page_state(self, response, params: dict):
+        response.raise_for_status()
+        state_fields = ('__VIEWSTATE', '__EVENTVALIDATION')
+        fields = extract_hidden_fields(response.iter_content(chunk_size=64 * 1024), state_fields,
+                                       encoding=response.encoding or 'utf-8')
+        missing = [field for field in state_fields if field not in fields]
+        if missing:
+            raise ValueError(f'Hidden fields {missing} not found on {response.url}')
 
-        self.params['__VIEWSTATE'] = view_state
-        self.params['__EVENTVALIDATION'] = event_validation
+        params.update(fields)
 
-    def set_params(self, post_date: date):
+    def set_params(self, params: dict, post_date: date):
         str_post_date = post_date.strftime("%Y-%m-%d")
-        self.params['content_1$dcDateControls$rdpStartDate'] = post_date.strftime("%Y-%m-%d")
+        params['content_1$dcDateControls$rdpStartDate'] = post_date.strftime("%Y-%m-%d")
 
-        self.params['content_1$dcDateControls$rdpStartDate$dateInput'] = post_date.strftime("%m/%d/%Y")
+        params['content_1$dcDateControls$rdpStartDate$dateInput'] = post_date.strftime("%m/%d/%Y")
 
         rdp_startdate_dateinput_clientstate = {
             "enabled": True,
@@ -59,58 +67,103 @@ class OneOK(PipelineScraper):
             "lastSetTextBoxValue": f"{post_date.strftime('%m/%d/%Y')}"
         }
 
-        self.params['content_1_dcDateControls_rdpStartDate_dateInput_ClientState'] = json.dumps(
+        params['content_1_dcDateControls_rdpStartDate_dateInput_ClientState'] = json.dumps(
             rdp_startdate_dateinput_clientstate)
 
-        self.params['content_1_dcDateControls_rdpEndDate_ClientState'] = json.dumps(
+        params['content_1_dcDateControls_rdpEndDate_ClientState'] = json.dumps(
             {"minDateStr": f"{str_post_date}-00-00-00",
              "maxDateStr": f"{str_post_date}-00-00-00"})
 
-        self.params['content_1$dcDateControls$btnRefresh'] = 'Refresh'
+        params['content_1$dcDateControls$btnRefresh'] = 'Refresh'
+        return params
+
+    def parse_report(self, response):
+        response.raise_for_status()
+
+        # header, grid cells and company labels are read in a single pass over the page
+        with self.measure('parse') as timing:
+            df_result, texts = read_radgrid(response.content,
+                                            element_ids=(self.tsp_element_id, self.tsp_name_element_id),
+                                            encoding=response.encoding)
+            timing['rows'] = len(df_result.index)
+        return self.add_columns(df_result, tsp=texts.get(self.tsp_element_id),
+                                tsp_name=texts.get(self.tsp_name_element_id))
 
     def start_scraping(self, post_date: date = None):
         post_date = post_date if post_date is not None else date.today()
 
-        main_df = pd.DataFrame()
-        for extension in self.source_extensions:
-            try:
-                logger.info('Scraping %s pipeline gas for post date: %s', self.source, post_date)
-                self.set_params(post_date=post_date)
-                self.get_page_request(extension, post_date=post_date)
+        with self.tags(post_date=post_date), self.collect_result(post_date, local_file=True) as frames:
+            for extension in self.source_extensions:
+                try:
+                    logger.info('Scraping %s pipeline gas for post date: %s', self.source, post_date)
+                    with self.tags(extension=extension, post_date=post_date):
+                        params = self.set_params(dict(self.params), post_date=post_date)
+                        self.get_page_request(extension, params, post_date=post_date)
 
-                response = self.session.post(self.download_csv_url.format(extension), data=self.params)
-                response.raise_for_status()
+                        with self.immutable_scope(post_date), self.idempotent():
+                            response = self.session.post(self.download_csv_url.format(extension), data=params)
+                        frames.append(self.parse_report(response))
 
-                soup = BeautifulSoup(response.content, 'lxml')
+                except Exception as ex:
+                    # a failed request or a page that does not parse, the other extensions are still scraped
+                    logger.error('%s: %s', extension, ex, exc_info=True)
+                    self.errors.append(ex)
 
-                headers = self.get_headers(soup)
+        return None
 
-                df_result = pd.read_html(str(soup.select_one(self.html_table_css)), na_values='')[0]
-                df_result.columns = headers
-                final_report = self.add_columns(soup=soup, df_result=df_result)
-                main_df = pd.concat([main_df, final_report])
+    def add_columns(self, df_result, tsp: str, tsp_name: str):
+        if tsp is None or tsp_name is None:
+            raise ValueError('Company DUNS / name not found on the page')
+        rows = len(df_result.index)
+        df_result.insert(0, 'TSP', constant_column(tsp, rows), True)
+        df_result.insert(1, 'TSP Name', constant_column(tsp_name, rows), True)
+        return df_result
 
-            except HTTPError as ex:
-                logger.error(ex, exc_info=True)
 
-        self.save_result(main_df, post_date=post_date, local_file=True)
+class AsyncOneOK(OneOK, AsyncPipelineScraper):
+    """
+    OneOK with the pages of all source extensions requested at the same time.
+    """
 
-        return None
+    def __init__(self, job_id, client: AsyncHttpClient = None, **kwargs):
+        AsyncPipelineScraper.__init__(self, job_id, web_url=self.api_url, source=self.source, client=client,
+                                      **kwargs)
 
-    def add_columns(self, soup, df_result):
-        tsp = soup.select_one("#content_1_CompanyDUNS").text
-        tsp_name = soup.select_one("#content_1_CompanyName").text
-        df_result.insert(0, 'TSP', tsp, True)
-        df_result.insert(1, 'TSP Name', tsp_name, True)
-        return df_result
+    async def scrape_extension(self, extension, post_date: date):
+        logger.info('Scraping %s pipeline gas for post date: %s', self.source, post_date)
+        with self.tags(extension=extension, post_date=post_date):
+            params = self.set_params(dict(self.params), post_date=post_date)
+            response = await self.client.get(self.post_url.format(extension))
+            self.set_page_state(response, params)
+
+            with self.immutable_scope(post_date), self.idempotent():
+                response = await self.client.post(self.download_csv_url.format(extension), data=params)
+            return await self.client.run(self.parse_report, response)
+
+    async def start_scraping(self, post_date: date = None):
+        post_date = post_date if post_date is not None else date.today()
+
+        results = await asyncio.gather(*(self.scrape_extension(extension, post_date)
+                                         for extension in self.source_extensions), return_exceptions=True)
+        frames = []
+        for extension, result in zip(self.source_extensions, results):
+            if isinstance(result, Exception):
+                logger.error('%s: %s', extension, result, exc_info=result)
+                self.errors.append(result)
+            elif isinstance(result, BaseException):
+                raise result
+            else:
+                frames.append(result)
+
+        main_df = pd.concat(frames) if frames else pd.DataFrame()
+        await self.save_result_async(main_df, post_date=post_date, local_file=True)
+
+        return None
 
 
 def back_fill_pipeline_date():
-    scraper = OneOK(job_id=str(uuid.uuid4()))
-    for i in range(90, -1, -1):
-        post_date = (date.today() - timedelta(days=i))
-        print(post_date)
-        scraper.start_scraping(post_date)
+    engine = BackfillEngine()
+    engine.run(engine.plan(OneOK, backfill_dates(90)))
 
 
 def main():
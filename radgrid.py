@@ -0,0 +1,155 @@
+import re
+
+import pandas
+from lxml import etree
+
+# cell texts read as missing values, as pd.read_html does
+NA_VALUES = frozenset(('', '#N/A', 'N/A', 'n/a', 'NA', '<NA>', 'NULL', 'null', 'NaN', 'nan', '-NaN', '-nan', 'None'))
+
+_WHITESPACE = re.compile(r'[\r\n\t\xa0]+')
+
+
+class _RadGridTarget:
+    """
+    lxml parser target collecting, in a single pass over the page:
+    the text of the `th.rgHeader` header cells (of their link when they have one, the sort link of RadGrid),
+    the text of the data cells of the `.rgDataDiv > .rgMasterTable` table, one buffer per column,
+    and the text of the elements with the requested ids.
+    """
+
+    def __init__(self, element_ids):
+        self.element_ids = set(element_ids)
+        self.found = False
+        self.headers = []
+        self.columns = []
+        self.rows = 0
+        self.texts = {}
+
+        self._stack = []
+        self._elements = []
+        self._header = None
+        self._link = None
+        self._in_link = False
+        # tables opened inside the data table, -1 outside of it
+        self._table_depth = -1
+        self._section = None
+        self._row = None
+        self._cell = None
+
+    def start(self, tag, attrib):
+        classes = attrib.get('class', '').split()
+        parent_classes = self._stack[-1] if self._stack else ()
+        self._stack.append(classes)
+
+        element_id = attrib.get('id')
+        if element_id in self.element_ids:
+            self._elements.append((element_id, len(self._stack), []))
+
+        if tag == 'th' and 'rgHeader' in classes:
+            self._header = []
+            self._link = None
+        elif tag == 'a' and self._header is not None and self._link is None:
+            self._link = []
+            self._in_link = True
+        elif tag == 'table':
+            if self._table_depth >= 0:
+                self._table_depth += 1
+            elif not self.found and 'rgMasterTable' in classes and 'rgDataDiv' in parent_classes:
+                self.found = True
+                self._table_depth = 0
+        elif self._table_depth == 0:
+            if tag in ('thead', 'tbody', 'tfoot'):
+                self._section = tag
+            elif tag == 'tr' and self._section not in ('thead', 'tfoot') and 'rgNoRecords' not in classes:
+                self._row = []
+            elif tag == 'td' and self._row is not None:
+                self._cell = []
+
+    def data(self, data):
+        if self._cell is not None:
+            self._cell.append(data)
+        if self._header is not None:
+            self._header.append(data)
+        if self._in_link:
+            self._link.append(data)
+        for _, _, text in self._elements:
+            text.append(data)
+
+    def end(self, tag):
+        if self._elements and self._elements[-1][1] == len(self._stack):
+            element_id, _, text = self._elements.pop()
+            self.texts.setdefault(element_id, ''.join(text))
+        if self._stack:
+            self._stack.pop()
+
+        if tag == 'th' and self._header is not None:
+            text = self._link if self._link is not None else self._header
+            self.headers.append(_WHITESPACE.sub(' ', ''.join(text)).strip())
+            self._header = self._link = None
+            self._in_link = False
+        elif tag == 'a':
+            self._in_link = False
+        elif tag == 'table' and self._table_depth >= 0:
+            self._table_depth -= 1
+        elif self._table_depth == 0:
+            if tag == 'td' and self._cell is not None:
+                self._row.append(_WHITESPACE.sub(' ', ''.join(self._cell)).strip())
+                self._cell = None
+            elif tag == 'tr' and self._row is not None:
+                if self._row:
+                    self._add_row(self._row)
+                self._row = None
+            elif tag in ('thead', 'tbody', 'tfoot'):
+                self._section = None
+
+    def _add_row(self, row):
+        for position, text in enumerate(row):
+            if position == len(self.columns):
+                self.columns.append([None] * self.rows)
+            self.columns[position].append(None if text in NA_VALUES else text)
+        for column in self.columns[len(row):]:
+            column.append(None)
+        self.rows += 1
+
+    def close(self):
+        return self
+
+
+def typed_column(values) -> pandas.Series:
+    """
+    Numbers (with ',' thousands separators) when every value is one, the text otherwise.
+    """
+    series = pandas.Series(values, dtype=object)
+    numbers = pandas.to_numeric(series.str.replace(',', '', regex=False), errors='coerce')
+    if numbers.notna().sum() == series.notna().sum() and series.notna().any():
+        return numbers
+    return series.infer_objects()
+
+
+def read_radgrid(content, element_ids=(), encoding: str = None):
+    """
+    Read the data grid of a page rendered by a Telerik RadGrid in a single pass, without building a DOM.
+
+    :param content: page as bytes or str
+    :param element_ids: ids of other elements whose text is returned as well, e.g. company name labels
+    :param encoding: encoding of the page when it is bytes, detected from the page when None
+    :return: `(frame, texts)`, the grid with the header texts as columns and typed values, and a dict of the
+        texts of the requested elements found
+    :raises ValueError: when the page has no grid, or the header does not match the data cells
+    """
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+        encoding = 'utf-8'
+    target = etree.fromstring(content, etree.HTMLParser(target=_RadGridTarget(element_ids), encoding=encoding))
+
+    if not target.found:
+        raise ValueError('No RadGrid data table (.rgDataDiv > .rgMasterTable) found')
+    if target.columns and len(target.columns) != len(target.headers):
+        raise ValueError(f'RadGrid header has {len(target.headers)} columns, the data rows have '
+                         f'{len(target.columns)}')
+
+    columns = target.columns or [[] for _ in target.headers]
+    df = pandas.DataFrame({position: typed_column(values) for position, values in enumerate(columns)},
+                          index=pandas.RangeIndex(target.rows))
+    df.columns = target.headers
+    return df, target.texts
@@ -0,0 +1,176 @@
+"""
+Run the scrapers of several sources at once, one process per core:
+
+    python -m scraper.runner                                  all sources, today
+    python -m scraper.runner gasnom oneok --date 2022-08-26
+    python -m scraper.runner --start 2022-08-01 --end 2022-08-31 --cycle timely
+    python -m scraper.runner --list
+"""
+import argparse
+import importlib
+import logging
+import os
+import time
+import uuid
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, timedelta
+
+from scraper.backfill import UnitOutcome, date_windows, scrape_unit
+from scraper.scheduler import NAESB_CYCLES
+
+logger = logging.getLogger(__name__)
+
+# source name -> `module:Class` of its scraper. The modules are imported by the processes running them only, so
+# the runner and every worker load the parser libraries of their own sources only.
+SCRAPERS = {
+    'gasnom': 'scraper.gasnom:GasNom',
+    'bhe': 'scraper.berkshire_hathaway_energy:BerkshireHathawayEnergy',
+    'big_sandy': 'scraper.big_sandy:BigSandy',
+    'kindermorgan': 'scraper.kindermorgan:Kindermorgan',
+    'oneok': 'scraper.one_ok:OneOK',
+    'tallgrass': 'scraper.tallgrass_energy:TallgrassEnergy',
+}
+
+# `scraper` is a name of SCRAPERS or a `module:Class` path, cycle a NAESB cycle name (see scheduler.NAESB_CYCLES)
+RunUnit = namedtuple('RunUnit', ['scraper', 'post_date', 'cycle', 'end_date'], defaults=(None, None))
+
+
+def register(name: str, path: str):
+    """
+    Add a scraper to the registry as `module:Class`. Register it at import time of a module the workers import as
+    well, or pass the path itself as the unit's scraper.
+    """
+    SCRAPERS[name] = path
+
+
+def load_scraper(name: str):
+    """
+    Scraper class of a registered source name or of a `module:Class` path, its module is imported on first use.
+    """
+    path = SCRAPERS.get(name, name)
+    if ':' not in path:
+        raise KeyError(f'Unknown scraper {name!r}, registered: {", ".join(SCRAPERS)}')
+    module, class_name = path.split(':')
+    return getattr(importlib.import_module(module), class_name)
+
+
+def plan(names, post_dates, cycles=None):
+    """
+    Run units of the sources for the dates, and the NAESB cycles for sources that have cycles. Sources accepting a
+    date range (a `range_window_days` attribute) get one unit per window of dates instead of one per date.
+    """
+    post_dates = sorted(post_dates)
+    units = []
+    for name in names:
+        scraper_cls = load_scraper(name) if cycles or len(post_dates) > 1 else None
+        scraper_cycles = (cycles if getattr(scraper_cls, 'naesb_cycles', None) else None) or [None]
+        window_days = getattr(scraper_cls, 'range_window_days', None)
+        if window_days and len(post_dates) > 1:
+            ranges = date_windows(post_dates[0], post_dates[-1], window_days)
+        else:
+            ranges = [(post_date, None) for post_date in post_dates]
+        units += [RunUnit(name, post_date, cycle, end_date) for post_date, end_date in ranges
+                  for cycle in scraper_cycles]
+    return units
+
+
+_worker = {}
+
+
+def _init_worker(job_id: str, scraper_kwargs: dict, log_level: int):
+    logging.basicConfig(format='%(asctime)s - %(processName)s - %(message)s', level=log_level)
+    _worker.update(job_id=job_id, scraper_kwargs=scraper_kwargs, scrapers={})
+
+
+def run_unit(unit: RunUnit) -> UnitOutcome:
+    """
+    Run one unit in the current process. The scraper of each source is created once per process, so its sessions
+    and caches are reused by the following units. Failures are returned as the outcome, with the error as text, as
+    are errors the scraper logged and went on after.
+    """
+    scrapers = _worker.setdefault('scrapers', {})
+    started = time.perf_counter()
+    try:
+        if unit.scraper not in scrapers:
+            scrapers[unit.scraper] = load_scraper(unit.scraper)(job_id=_worker.get('job_id', str(uuid.uuid4())),
+                                                               **_worker.get('scraper_kwargs', {}))
+        scraper = scrapers[unit.scraper]
+        cycle = scraper.naesb_cycles[unit.cycle] if unit.cycle is not None else None
+    except Exception as ex:
+        logger.error('Run failed: %s %s', unit.scraper, unit[1:], exc_info=True)
+        return UnitOutcome(unit, 'failed', 0, time.perf_counter() - started, repr(ex))
+
+    try:
+        outcome = scrape_unit(scraper, unit, unit.post_date, cycle, unit.end_date)
+    finally:
+        # pool processes end without running atexit handlers, write the buffered metrics events after every unit
+        if scraper.metrics is not None:
+            scraper.metrics.flush()
+    # the outcome goes back to the runner process, errors may not be picklable
+    return outcome if outcome.error is None else outcome._replace(error=repr(outcome.error))
+
+
+def run(units, max_workers: int = None, job_id: str = None, scraper_kwargs: dict = None, progress=None):
+    """
+    Run the units on a pool of `max_workers` processes (one per core by default) and return their outcomes in
+    completion order.
+
+    :param scraper_kwargs: keyword arguments for the scrapers, they must be picklable
+    :param progress: optional callable(done, total, outcome) invoked after every unit
+    """
+    units = list(units)
+    max_workers = max(1, min(max_workers or os.cpu_count() or 1, len(units) or 1))
+    job_id = job_id if job_id is not None else str(uuid.uuid4())
+    outcomes = []
+    started = time.perf_counter()
+    logger.info('Run started: %s units, %s processes', len(units), max_workers)
+
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                             initargs=(job_id, scraper_kwargs or {}, logging.getLogger().getEffectiveLevel())) \
+            as executor:
+        futures = [executor.submit(run_unit, unit) for unit in units]
+        for future in as_completed(futures):
+            outcome = future.result()
+            outcomes.append(outcome)
+            logger.info('Run progress %s/%s: %s %s %s -> %s (%s rows, %.1fs)', len(outcomes), len(units),
+                        outcome.unit.scraper, outcome.unit.post_date, outcome.unit.cycle or '', outcome.status,
+                        outcome.rows, outcome.elapsed)
+            if progress is not None:
+                progress(len(outcomes), len(units), outcome)
+
+    statuses = [outcome.status for outcome in outcomes]
+    logger.info('Run finished in %.1fs: %s ok, %s already ingested, %s empty, %s failed',
+                time.perf_counter() - started, statuses.count('ok'), statuses.count('ingested'),
+                statuses.count('empty'), statuses.count('failed'))
+    return outcomes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the scrapers of several sources on a process pool')
+    parser.add_argument('sources', nargs='*', help='registered sources or module:Class paths, all by default')
+    parser.add_argument('--date', type=date.fromisoformat, help='gas day to scrape, today by default')
+    parser.add_argument('--start', type=date.fromisoformat, help='first gas day of a range')
+    parser.add_argument('--end', type=date.fromisoformat, help='last gas day of a range, today by default')
+    parser.add_argument('--cycle', action='append', choices=[cycle.name for cycle in NAESB_CYCLES],
+                        help='NAESB cycle, for the sources with cycles, repeatable')
+    parser.add_argument('--workers', type=int, help='worker processes, one per core by default')
+    parser.add_argument('--list', action='store_true', help='list the registered sources and exit')
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for name, path in SCRAPERS.items():
+            print(f'{name:<16}{path}')
+        return []
+
+    if args.start is not None:
+        end = args.end or date.today()
+        post_dates = [args.start + timedelta(days=i) for i in range((end - args.start).days + 1)]
+    else:
+        post_dates = [args.date or date.today()]
+    return run(plan(args.sources or list(SCRAPERS), post_dates, cycles=args.cycle), max_workers=args.workers)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(format='%(asctime)s - %(message)s', level=logging.INFO)
+    main()
@@ -0,0 +1,192 @@
+import logging
+import threading
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, time as clock_time, timedelta
+from zoneinfo import ZoneInfo
+
+from scraper.backfill import BackfillEngine, WorkUnit
+
+logger = logging.getLogger(__name__)
+
+# NAESB nomination cycles run on Central Clock Time
+CENTRAL_TIME = ZoneInfo('America/Chicago')
+
+NaesbCycle = namedtuple('NaesbCycle', ['name', 'day_offset', 'posted_at'])
+
+# when the scheduled quantities of each cycle are posted, relative to the gas day
+NAESB_CYCLES = (
+    NaesbCycle('timely', -1, clock_time(17, 0)),
+    NaesbCycle('evening', -1, clock_time(22, 0)),
+    NaesbCycle('intraday 1', 0, clock_time(14, 0)),
+    NaesbCycle('intraday 2', 0, clock_time(18, 0)),
+    NaesbCycle('intraday 3', 0, clock_time(23, 0)),
+)
+
+# cycle name of the polls of scrapers posting once a day, see `CycleScheduler`
+DAILY = 'daily'
+
+
+class Poll:
+    """
+    Polling state of one scraper class, gas day and cycle.
+    """
+
+    def __init__(self, scraper_cls, gas_day, naesb_cycle: NaesbCycle, cycle, posted_at: datetime):
+        self.scraper_cls = scraper_cls
+        self.gas_day = gas_day
+        self.naesb_cycle = naesb_cycle
+        self.cycle = cycle
+        self.posted_at = posted_at
+        self.due_at = posted_at
+        self.attempts = 0
+
+    @property
+    def key(self):
+        return self.scraper_cls, self.gas_day, self.naesb_cycle.name
+
+    def __str__(self):
+        return f'{self.scraper_cls.source} {self.gas_day} {self.naesb_cycle.name}'
+
+
+class CycleScheduler:
+    """
+    Long-running scheduler polling every pipeline when a NAESB cycle is due to be posted.
+
+    Scrapers map the NAESB cycle names to their own cycle argument in a `naesb_cycles` class attribute. Scrapers
+    without cycles are polled once per gas day from their `daily_posting_time` (Central Clock Time, the day before
+    the gas day), or without a cycle once per NAESB cycle when it is None. A source is polled from the posting time
+    with exponential backoff until a poll saves rows or finds all of its postings already ingested (a restarted
+    scheduler), and given up `give_up_after` after the posting time.
+
+    The polls run on a BackfillEngine, so the scrapers of all sources share one bounded thread pool and the
+    per-host limits.
+    """
+
+    def __init__(self, scraper_classes, engine: BackfillEngine = None, first_delay: int = 120,
+                 max_delay: int = 1800, give_up_after: timedelta = timedelta(hours=6), cycles=NAESB_CYCLES):
+        """
+        :param scraper_classes: PipelineScraper subclasses to poll
+        :param engine: engine running the polls, a default BackfillEngine when None
+        :param first_delay: seconds before polling again when a posting is not there yet, doubled on every retry
+        :param max_delay: maximum seconds between two polls of the same posting
+        :param give_up_after: time after the posting time after which a missing posting is given up
+        :param cycles: NAESB cycles to poll
+        """
+        self.scraper_classes = list(scraper_classes)
+        self.engine = engine if engine is not None else BackfillEngine()
+        self.first_delay = first_delay
+        self.max_delay = max_delay
+        self.give_up_after = give_up_after
+        self.cycles = cycles
+        self._polls = {}
+        self._finished = set()
+        self._stop = threading.Event()
+
+    @staticmethod
+    def now() -> datetime:
+        return datetime.now(CENTRAL_TIME)
+
+    def posting_time(self, gas_day, naesb_cycle: NaesbCycle) -> datetime:
+        return datetime.combine(gas_day + timedelta(days=naesb_cycle.day_offset), naesb_cycle.posted_at,
+                                tzinfo=CENTRAL_TIME)
+
+    def scraper_cycles(self, scraper_cls):
+        """
+        `(NaesbCycle, cycle argument)` pairs polled for a scraper class.
+        """
+        cycles = getattr(scraper_cls, 'naesb_cycles', None)
+        if cycles is not None:
+            return [(naesb_cycle, cycles[naesb_cycle.name]) for naesb_cycle in self.cycles
+                    if naesb_cycle.name in cycles]
+        if scraper_cls.daily_posting_time is not None:
+            return [(NaesbCycle(DAILY, -1, scraper_cls.daily_posting_time), None)]
+        return [(naesb_cycle, None) for naesb_cycle in self.cycles]
+
+    def add_due_polls(self, now: datetime):
+        """
+        Start polling the cycles whose posting time has come and that are not finished or given up.
+        """
+        today = now.date()
+        for gas_day in (today - timedelta(days=1), today, today + timedelta(days=1)):
+            for scraper_cls in self.scraper_classes:
+                for naesb_cycle, cycle in self.scraper_cycles(scraper_cls):
+                    posted_at = self.posting_time(gas_day, naesb_cycle)
+                    if not posted_at <= now < posted_at + self.give_up_after:
+                        continue
+                    poll = Poll(scraper_cls, gas_day, naesb_cycle, cycle, posted_at)
+                    if poll.key not in self._polls and poll.key not in self._finished:
+                        self._polls[poll.key] = poll
+
+        # forget finished polls of gas days out of the window
+        self._finished = {key for key in self._finished if key[1] >= today - timedelta(days=1)}
+
+    def retry_delay(self, attempts: int) -> float:
+        return min(self.first_delay * 2 ** (attempts - 1), self.max_delay)
+
+    def finish(self, poll: Poll, outcome):
+        poll.attempts += 1
+        now = self.now()
+        if outcome.status == 'ok':
+            logger.info('Cycle posted: %s, %s rows after %s polls', poll, outcome.rows, poll.attempts)
+        elif outcome.status == 'ingested':
+            # saved by an earlier run (before a restart), the watermark store skipped all of its postings
+            logger.info('Cycle already ingested: %s', poll)
+        elif now + timedelta(seconds=self.retry_delay(poll.attempts)) >= poll.posted_at + self.give_up_after:
+            logger.warning('Giving up on cycle %s after %s polls', poll, poll.attempts)
+        else:
+            poll.due_at = now + timedelta(seconds=self.retry_delay(poll.attempts))
+            logger.info('Cycle %s not posted yet (%s), polling again at %s', poll, outcome.status,
+                        poll.due_at.strftime('%H:%M:%S'))
+            return
+        del self._polls[poll.key]
+        self._finished.add(poll.key)
+
+    def stop(self):
+        self._stop.set()
+
+    def run(self, tick: int = 60):
+        """
+        Poll until `stop` is called.
+
+        :param tick: maximum seconds between two checks for due cycles
+        """
+        logger.info('Cycle scheduler started for: %s', ', '.join(cls.source for cls in self.scraper_classes))
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.engine.max_workers) as executor:
+            while not self._stop.is_set():
+                now = self.now()
+                self.add_due_polls(now)
+                for poll in self._polls.values():
+                    if poll.due_at <= now and poll.key not in running.values():
+                        unit = WorkUnit(poll.scraper_cls, poll.gas_day, None, poll.cycle)
+                        running[executor.submit(self.engine.run_unit, unit)] = poll.key
+
+                next_due = min((poll.due_at for poll in self._polls.values() if poll.key not in running.values()),
+                               default=now + timedelta(seconds=tick))
+                timeout = min(max((next_due - now).total_seconds(), 1), tick)
+                if running:
+                    done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        self.finish(self._polls[running.pop(future)], future.result())
+                else:
+                    self._stop.wait(timeout)
+
+            for future in running:
+                future.cancel()
+        logger.info('Cycle scheduler stopped')
+
+
+def main():
+    from scraper.runner import SCRAPERS, load_scraper
+
+    scheduler = CycleScheduler([load_scraper(name) for name in SCRAPERS])
+    try:
+        scheduler.run()
+    except KeyboardInterrupt:
+        scheduler.stop()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(format='%(asctime)s - %(message)s', level=logging.INFO)
+    main()
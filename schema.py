@@ -0,0 +1,233 @@
+"""
+The operational capacity schema shared by all sources. `normalize` renames the columns of a source's report to the
+shared names, and stores them with the same dtypes in every frame: repeated text (TSP, locations, flow indicators,
+cycle) as categoricals, quantities as float64 and timestamps as datetime64[us] parsed once per distinct value. Frames
+of one result, chunks of a report or results of other sources, so always append to the same file schema.
+"""
+from __future__ import annotations
+
+import logging
+import re
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import pandas
+
+logger = logging.getLogger(__name__)
+
+# shared column -> (kind, names of the column in the sources' reports), in the order of the normalized frames. Names
+# are compared ignoring case and spacing. The source, gas day and cycle of a result are partition keys of the
+# Parquet sink and key columns of the database sink, the schema names differ from them.
+CAPACITY_SCHEMA = {
+    'tsp': ('category', ('TSP', 'TSP DUNS', 'TSP No')),
+    'tsp_name': ('category', ('TSP Name',)),
+    'posted_at': ('timestamp', ('Posting Date/Time', 'Post Date/Time', 'Posting Date', 'Post Date')),
+    'effective_at': ('timestamp', ('Eff Gas Day', 'Eff Gas Day/Time', 'Effective Gas Day', 'Gas Day', 'Gas Date')),
+    'nomination_cycle': ('category', ('Cycle', 'Cycle Desc', 'Cycle Description', 'Cycle Name')),
+    'measurement_basis': ('category', ('Meas Basis Desc', 'Meas Basic Desc', 'Measurement Basis')),
+    'location': ('category', ('Loc', 'Location', 'Loc Prop', 'Location ID', 'Loc ID', 'Point ID')),
+    'location_name': ('category', ('Loc Name', 'Location Name', 'Point Name')),
+    'location_purpose': ('category', ('Loc Purp Desc', 'Loc Purpose', 'Location Purpose')),
+    'location_qti': ('category', ('Loc/QTI', 'Loc QTI', 'Loc/QTI Desc')),
+    'flow_indicator': ('category', ('Flow Ind', 'Flow Ind Desc', 'Flow Indicator')),
+    'zone': ('category', ('Loc Zn', 'Loc Zone', 'Location Zone', 'Zone')),
+    'design_capacity': ('quantity', ('Design Capacity', 'Design Cap')),
+    'operating_capacity': ('quantity', ('Operating Capacity', 'Operating Cap')),
+    'scheduled_quantity': ('quantity', ('Total Scheduled Quantity', 'Total Sched Qty', 'Scheduled Quantity')),
+    'available_capacity': ('quantity', ('Operationally Available Capacity', 'Operationally Available Cap',
+                                        'Op Avail Cap')),
+    'it_indicator': ('category', ('IT', 'IT Indicator')),
+    'all_quantity_available': ('category', ('All Qty Avail', 'All Quantities Available')),
+    'quantity_reason': ('category', ('Qty Reason', 'Qty Reason Desc', 'Quantity Reason')),
+}
+
+
+def column_names(column: str) -> tuple:
+    """
+    Names of a shared column in the sources' reports, then its name in the shared schema.
+    """
+    return CAPACITY_SCHEMA[column][1] + (column,)
+
+
+# names of the gas day column, in the reports as they are saved without and with the shared schema
+GAS_DAY_COLUMNS = column_names('effective_at')
+
+# dtype of the timestamp and quantity columns, reported or not
+_DTYPES = {'timestamp': 'datetime64[us]', 'quantity': 'float64'}
+
+
+def _key(name) -> str:
+    return re.sub(r'\s+', ' ', str(name).strip().lower())
+
+
+_ALIASES = {_key(alias): column for column, (_, aliases) in CAPACITY_SCHEMA.items()
+            for alias in aliases + (column,)}
+
+
+def constant_column(value, rows: int) -> pandas.Categorical:
+    """
+    `value` on every one of `rows` rows as a single-category column, one int8 code per row instead of a reference to
+    the value per row. Missing values give an all-missing column.
+    """
+    import numpy
+    import pandas
+
+    missing = value is None or (not isinstance(value, str) and pandas.isnull(value))
+    return pandas.Categorical.from_codes(numpy.full(rows, -1 if missing else 0, dtype=numpy.int8),
+                                         categories=[] if missing else [value])
+
+
+def to_category(series: pandas.Series) -> pandas.Series:
+    """
+    The column as a categorical of text values, whatever type the source gave its values (location numbers read as
+    integers by one source are the same locations as the text codes of another).
+    """
+    import pandas
+
+    values = series if isinstance(series.dtype, pandas.CategoricalDtype) else series.astype('category')
+    categories = values.cat.categories
+    if categories.inferred_type in ('string', 'empty'):
+        return values
+    if pandas.api.types.is_float_dtype(categories.dtype) and (categories == categories.round()).all():
+        categories = categories.astype('int64')
+    text = categories.astype(str)
+    if text.is_unique:
+        return values.cat.rename_categories(text)
+    codes = values.cat.codes.to_numpy()
+    return pandas.Series(text.take(codes).where(codes >= 0), index=series.index, name=series.name).astype('category')
+
+
+def to_timestamp(series: pandas.Series) -> pandas.Series:
+    """
+    Timestamps of a text column, each distinct value is parsed once. Values that do not parse become NaT.
+    """
+    import pandas
+
+    if pandas.api.types.is_datetime64_any_dtype(series.dtype):
+        if getattr(series.dtype, 'tz', None) is not None:
+            series = series.dt.tz_convert('UTC').dt.tz_localize(None)
+        return series.astype(_DTYPES['timestamp'])
+    values = to_category(series)
+    categories = values.cat.categories
+    if not len(categories):
+        return pandas.Series(pandas.NaT, index=series.index, dtype=_DTYPES['timestamp'], name=series.name)
+    text = categories.astype(str)
+    parsed = pandas.to_datetime(text, errors='coerce')
+    if parsed.isna().any():
+        # the format of the first value does not fit all of them
+        parsed = pandas.to_datetime(text, errors='coerce', format='mixed')
+    if parsed.tz is not None:
+        # offsets of the sources as UTC, the same dtype whether a frame has offsets or not
+        parsed = parsed.tz_convert('UTC').tz_localize(None)
+    parsed = parsed.astype(_DTYPES['timestamp'])
+    codes = values.cat.codes.to_numpy()
+    timestamps = parsed.take(codes).where(codes >= 0)
+    return pandas.Series(timestamps, index=series.index, name=series.name)
+
+
+def to_quantity(series: pandas.Series) -> pandas.Series:
+    """
+    Numbers of a quantity column with thousands separators, as float64 whatever the values of the frame, so integer
+    and fractional quantities of different frames are stored alike. Text that is not a number becomes NaN.
+    """
+    import pandas
+
+    if pandas.api.types.is_numeric_dtype(series.dtype) and not pandas.api.types.is_bool_dtype(series.dtype):
+        return series.astype(_DTYPES['quantity'])
+    text = series.astype('string').str.strip().str.replace(',', '', regex=False)
+    text = text.mask(text == '')
+    try:
+        # a cast in one pass, much faster than to_numeric
+        return text.astype(_DTYPES['quantity'])
+    except (TypeError, ValueError):
+        numbers = pandas.to_numeric(text, errors='coerce').astype(_DTYPES['quantity'])
+        logger.warning('Column %s has %s values that are not numbers, stored as missing', series.name,
+                       int((numbers.isna() & text.notna()).sum()))
+        return numbers
+
+
+def normalize(df: pandas.DataFrame, cycle=None, aliases: dict = None) -> pandas.DataFrame:
+    """
+    The frame in the shared capacity schema: the CAPACITY_SCHEMA columns in their order, then the other columns
+    of the source, unchanged. Schema columns the source does not report are added without values.
+
+    :param cycle: NAESB name of the cycle ('Timely', 'Intraday 1'), value of the `nomination_cycle` column when the
+        report has none
+    :param aliases: source specific column name -> shared column, on top of the CAPACITY_SCHEMA names
+    """
+    import pandas
+
+    names = dict(_ALIASES)
+    names.update((_key(alias), column) for alias, column in (aliases or {}).items())
+
+    columns = {}
+    extra = {}
+    for name in df.columns:
+        column = names.get(_key(name))
+        if column is None or column in columns:
+            extra[name] = df[name]
+        else:
+            columns[column] = df[name]
+
+    rows = len(df.index)
+    if cycle is not None and ('nomination_cycle' not in columns or not columns['nomination_cycle'].notna().any()):
+        columns['nomination_cycle'] = constant_column(str(cycle), rows)
+
+    data = {}
+    for column, (kind, _) in CAPACITY_SCHEMA.items():
+        series = columns.get(column)
+        if series is None:
+            data[column] = constant_column(None, rows) if kind == 'category' \
+                else pandas.Series(None, index=df.index, dtype=_DTYPES[kind])
+            continue
+        if not isinstance(series, pandas.Series):
+            series = pandas.Series(series, index=df.index)
+        series = series.rename(column)
+        if kind == 'category':
+            data[column] = to_category(series)
+        elif kind == 'timestamp':
+            data[column] = to_timestamp(series)
+        else:
+            data[column] = to_quantity(series)
+    # the other columns keep their dtypes, a per frame choice of type would differ between chunks of a result
+    data.update(extra)
+    return pandas.DataFrame(data, index=df.index, copy=False)
+
+
+def concat(frames) -> pandas.DataFrame:
+    """
+    `pandas.concat` of the frames keeping categorical columns categorical: the categories of a column are merged
+    first, instead of the column falling back to object values when the frames have different categories.
+    """
+    import pandas
+
+    frames = [frame for frame in frames if frame is not None]
+    if not frames:
+        return pandas.DataFrame()
+    if len(frames) == 1:
+        return frames[0]
+
+    categories = {}
+    for frame in frames:
+        for column in frame.columns:
+            dtype = frame[column].dtype
+            if isinstance(dtype, pandas.CategoricalDtype):
+                if categories.get(column, ()) is not None:
+                    categories.setdefault(column, []).append(dtype.categories)
+            else:
+                categories[column] = None
+
+    merged = {}
+    for column, indexes in categories.items():
+        if indexes is None or len(indexes) < len(frames):
+            continue
+        union = indexes[0]
+        for index in indexes[1:]:
+            if not index.equals(union):
+                union = union.append(index.difference(union))
+        merged[column] = pandas.CategoricalDtype(union)
+
+    if merged:
+        frames = [frame.astype({column: dtype for column, dtype in merged.items()
+                                if not frame[column].dtype == dtype}) for frame in frames]
+    return pandas.concat(frames)
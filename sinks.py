@@ -0,0 +1,547 @@
+from __future__ import annotations
+
+import logging
+import pathlib
+import re
+import sqlite3
+from datetime import date, datetime
+from typing import TYPE_CHECKING
+
+from scraper.schema import GAS_DAY_COLUMNS, column_names
+
+if TYPE_CHECKING:
+    import pandas
+
+logger = logging.getLogger(__name__)
+
+# columns whose values are parsed as timestamps when the whole column converts
+_DATETIME_COLUMN = re.compile(r'(date|time|gas day)', re.IGNORECASE)
+
+
+def infer_types(df: pandas.DataFrame) -> pandas.DataFrame:
+    """
+    Give text columns a typed representation: numbers for columns whose values all parse as numbers, timestamps for
+    date/time columns whose values all parse as dates, and strings for the rest.
+    """
+    import pandas
+
+    converted = {}
+    for column in df.columns:
+        series = df[column]
+        if series.dtype != object and not pandas.api.types.is_string_dtype(series.dtype):
+            continue
+        values = series.dropna()
+        if values.empty:
+            converted[column] = series.astype('string')
+            continue
+
+        text = values.astype(str)
+        numbers = pandas.to_numeric(text.str.replace(',', '', regex=False), errors='coerce')
+        # codes with leading zeros (location numbers, DUNS) stay text
+        if numbers.notna().all() and not text.str.match(r'-?0\d').any():
+            converted[column] = pandas.to_numeric(series.astype('string').str.replace(',', '', regex=False))
+            continue
+
+        if _DATETIME_COLUMN.search(str(column)):
+            timestamps = pandas.to_datetime(values, errors='coerce')
+            if timestamps.notna().all():
+                converted[column] = pandas.to_datetime(series, errors='coerce')
+                continue
+
+        converted[column] = series.astype('string')
+
+    if not converted:
+        return df
+    df = df.copy(deep=False)
+    for column, values in converted.items():
+        df[column] = values
+    return df
+
+
+def _partition_value(value) -> str:
+    if value is None:
+        return 'all'
+    if isinstance(value, datetime):
+        value = value.date()
+    return re.sub(r'[^\w.-]', '_', str(value))
+
+
+class SinkWriter:
+    """
+    Receives the frames of one result (one source, gas day and cycle) one after another.
+    """
+
+    def write(self, df: pandas.DataFrame):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def abort(self):
+        """
+        Called instead of `close` when saving the result failed.
+        """
+        self.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class OutputSink:
+    """
+    Destination of scraped results. `writer` opens a SinkWriter for one result, `write` saves a whole frame at once.
+    """
+
+    def writer(self, source: str, post_date: date, cycle=None) -> SinkWriter:
+        raise NotImplementedError
+
+    def write(self, df: pandas.DataFrame, source: str, post_date: date, cycle=None):
+        with self.writer(source, post_date, cycle) as writer:
+            writer.write(df)
+        return writer
+
+
+class CsvSinkWriter(SinkWriter):
+    """
+    Missing values are written as empty fields, whatever their dtype (NaN, None, NA, NaT).
+    """
+
+    # rows formatted at a time
+    chunk_rows = 50000
+
+    def __init__(self, path: str):
+        self.path = path
+        self._header_written = False
+
+    def write(self, df: pandas.DataFrame):
+        # pandas formats float columns with numpy's float repr, the same values as Python floats format to the same
+        # text about 1.5x faster: they are boxed a chunk of rows at a time, the frame itself keeps its dtypes
+        floats = {column: object for column, dtype in df.dtypes.items() if dtype.kind == 'f'} \
+            if df.columns.is_unique else {}
+        for start in range(0, max(len(df.index), 1), self.chunk_rows):
+            chunk = df.iloc[start:start + self.chunk_rows]
+            if floats:
+                chunk = chunk.astype(floats)
+            if self._header_written:
+                chunk.to_csv(self.path, mode='a', header=False, index=False)
+            else:
+                chunk.to_csv(self.path, index=False)
+                self._header_written = True
+
+    def __str__(self):
+        return self.path
+
+
+class CsvSink(OutputSink):
+    """
+    One `{source}_data_{post_date}_{timestamp}.csv` file per result.
+    """
+
+    def __init__(self, folder: str):
+        self.folder = folder
+
+    def writer(self, source: str, post_date: date, cycle=None) -> CsvSinkWriter:
+        pathlib.Path(self.folder).mkdir(parents=True, exist_ok=True)
+        post_date = post_date if post_date is not None else date.today()
+        return CsvSinkWriter(f'{self.folder}/{source}_data_{post_date}_{datetime.now().timestamp()}.csv')
+
+
+def _uniform_dictionaries(table):
+    """
+    Categorical columns as dictionaries with int32 indices and string values, whatever the number and type of
+    categories of a frame, so the files of all sources and results read back as one dataset.
+    """
+    import pyarrow
+
+    fields = []
+    for field in table.schema:
+        if pyarrow.types.is_dictionary(field.type):
+            values = field.type.value_type
+            if pyarrow.types.is_null(values) or pyarrow.types.is_string(values) or \
+                    pyarrow.types.is_large_string(values):
+                values = pyarrow.string()
+            field = field.with_type(pyarrow.dictionary(pyarrow.int32(), values))
+        fields.append(field)
+    schema = pyarrow.schema(fields, metadata=table.schema.metadata)
+    return table if schema.equals(table.schema) else table.cast(schema)
+
+
+def _widen_type(current, new):
+    """
+    Type holding the values of both types: integers widen to floats and anything else that differs to strings.
+    """
+    import pyarrow
+    from pyarrow import types
+
+    if current.equals(new) or types.is_null(new):
+        return current
+    if types.is_null(current):
+        return new
+    if types.is_integer(current) and types.is_integer(new):
+        return pyarrow.int64()
+    if (types.is_integer(current) or types.is_floating(current)) and \
+            (types.is_integer(new) or types.is_floating(new)):
+        return pyarrow.float64()
+    if types.is_timestamp(current) and types.is_timestamp(new) and current.tz == new.tz:
+        return current
+    return pyarrow.string()
+
+
+def _cast_column(column, type_):
+    # integers to floats and nanoseconds to the timestamp unit of the file may lose precision, as intended
+    return column if column.type.equals(type_) else column.cast(type_, safe=False)
+
+
+class ParquetSinkWriter(SinkWriter):
+    """
+    The column types of the file are those of the first frame. A later frame whose types do not fit them (text in
+    a numeric column, fractions in an integer column) or that has new columns widens the file schema: the rows
+    already written are rewritten with the wider types.
+    """
+
+    def __init__(self, path: pathlib.Path):
+        self.path = path
+        self._writer = None
+        self._schema = None
+
+    def _open(self, schema):
+        import pyarrow.parquet
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._schema = schema
+        self._writer = pyarrow.parquet.ParquetWriter(str(self.path), schema, compression='zstd')
+
+    def _conform(self, table):
+        """
+        The table in the file schema, None when its types or columns do not fit the schema.
+        """
+        import pyarrow
+
+        if any(name not in self._schema.names for name in table.column_names):
+            return None
+        columns = []
+        for field in self._schema:
+            if field.name not in table.column_names:
+                columns.append(pyarrow.nulls(table.num_rows, field.type))
+                continue
+            column = table.column(field.name)
+            if not _widen_type(field.type, column.type).equals(field.type):
+                return None
+            columns.append(_cast_column(column, field.type))
+        return pyarrow.Table.from_arrays(columns, schema=self._schema)
+
+    def _widen(self, table):
+        import pyarrow
+        import pyarrow.parquet
+
+        types = {field.name: field.type for field in self._schema}
+        for field in table.schema:
+            types[field.name] = _widen_type(types[field.name], field.type) if field.name in types else field.type
+        # the pandas metadata of the first frame no longer describes the widened columns
+        schema = pyarrow.schema([pyarrow.field(name, type_) for name, type_ in types.items()])
+        logger.info('Widening the schema of %s to: %s', self.path, schema)
+
+        self._writer.close()
+        written = self.path.with_name(f'.{self.path.name}.widened')
+        self.path.replace(written)
+        self._open(schema)
+        for batch in pyarrow.parquet.ParquetFile(str(written)).iter_batches():
+            self._writer.write_table(self._conform(pyarrow.Table.from_batches([batch])))
+        written.unlink()
+
+    def write(self, df: pandas.DataFrame):
+        import pyarrow
+
+        table = _uniform_dictionaries(pyarrow.Table.from_pandas(infer_types(df), preserve_index=False))
+        if self._writer is None:
+            self._open(table.schema)
+            self._writer.write_table(table)
+            return
+        conformed = self._conform(table)
+        if conformed is None:
+            self._widen(table)
+            conformed = self._conform(table)
+        self._writer.write_table(conformed)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+    def __str__(self):
+        return str(self.path)
+
+
+class ParquetSink(OutputSink):
+    """
+    Typed Parquet files partitioned hive-style by source, gas day and cycle:
+    `{folder}/source=<source>/gas_day=<YYYY-MM-DD>/cycle=<cycle>/part-<timestamp>.parquet`.
+    Readers such as `pandas.read_parquet(folder, columns=[...], filters=[('gas_day', '=', ...)])` only load the
+    columns and partitions they ask for.
+
+    Needs the optional `pyarrow` package.
+    """
+
+    def __init__(self, folder: str):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError as ex:
+            raise ImportError('ParquetSink requires pyarrow, install it with `pip install pyarrow`') from ex
+        self.folder = pathlib.Path(folder)
+
+    def writer(self, source: str, post_date: date, cycle=None) -> ParquetSinkWriter:
+        post_date = post_date if post_date is not None else date.today()
+        partition = (self.folder / f'source={_partition_value(source)}' / f'gas_day={_partition_value(post_date)}'
+                     / f'cycle={_partition_value(cycle)}')
+        return ParquetSinkWriter(partition / f'part-{datetime.now().timestamp()}.parquet')
+
+
+class DatabaseSinkWriter(SinkWriter):
+    """
+    Upserts the frames of one result into `table` in batches, inside a single transaction committed on close.
+    """
+
+    def __init__(self, sink, table: str, source: str, post_date: date, cycle=None):
+        self.sink = sink
+        self.table = table
+        self.source = source
+        self.post_date = post_date if post_date is not None else date.today()
+        self.cycle = cycle
+        self.rows = 0
+        self._connection = None
+        self._columns = None
+        self._warned_content_keys = False
+
+    def _key_values(self, df: pandas.DataFrame) -> pandas.DataFrame:
+        import pandas
+
+        keys = pandas.DataFrame(index=df.index)
+        keys['_source'] = self.source
+        for key in self.sink.natural_key:
+            column = self.sink.find_column(df, self.sink.key_columns[key])
+            # the shared schema has every key column, empty when the source does not report it
+            if column is not None and not df[column].notna().any():
+                column = None
+            if column is not None:
+                values = df[column]
+                if key == 'gas_day':
+                    parsed = pandas.to_datetime(values, errors='coerce')
+                    values = parsed.dt.strftime('%Y-%m-%d').where(parsed.notna(), values.astype(str))
+                keys[f'_{key}'] = values.astype(str)
+            elif key == 'gas_day':
+                keys['_gas_day'] = str(self.post_date)
+            elif key == 'cycle':
+                keys['_cycle'] = '' if self.cycle is None else str(self.cycle)
+            elif key == 'location':
+                keys['_location'] = self._content_keys(df)
+            else:
+                keys[f'_{key}'] = ''
+        return keys
+
+    def _content_keys(self, df: pandas.DataFrame):
+        """
+        Hash of the values of every row, the location key of rows without a location column: the same rows get the
+        same key in every chunk and re-run, whatever their position.
+        """
+        import pandas
+
+        if not self._warned_content_keys:
+            logger.warning('No location column in %s data, keying rows by a hash of their values: re-runs insert '
+                           'changed rows instead of updating them', self.source)
+            self._warned_content_keys = True
+        hashes = pandas.util.hash_pandas_object(df.rename(columns=str), index=False)
+        return [f'row:{value:016x}' for value in hashes.to_numpy()]
+
+    def write(self, df: pandas.DataFrame):
+        if df.empty:
+            return
+        import pandas
+
+        frame = pandas.concat([self._key_values(df), df.rename(columns=str)], axis=1)
+        # several rows with the same natural key in one frame: the last one wins
+        frame = frame.drop_duplicates(subset=self.sink.key_names(), keep='last')
+
+        if self._connection is None:
+            self._connection = self.sink.connect()
+        cursor = self._connection.cursor()
+        if self._columns is None:
+            self._columns = self.sink.prepare_table(cursor, self.table, frame)
+        else:
+            self.sink.add_missing_columns(cursor, self.table, frame, self._columns)
+
+        statement = self.sink.upsert_statement(self.table, list(frame.columns))
+        for start in range(0, len(frame.index), self.sink.batch_size):
+            batch = frame.iloc[start:start + self.sink.batch_size]
+            cursor.executemany(statement, self.sink.to_rows(batch))
+        self.rows += len(frame.index)
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.commit()
+            self._connection.close()
+            self._connection = None
+
+    def abort(self):
+        if self._connection is not None:
+            self._connection.rollback()
+            self._connection.close()
+            self._connection = None
+
+    def __str__(self):
+        return f'{self.table} ({self.rows} rows)'
+
+
+class DatabaseSink(OutputSink):
+    """
+    Bulk loads results into a database table through any DB-API 2.0 driver. Rows are upserted on the natural key
+    (source, TSP, location, gas day, cycle), so re-runs and backfills update rows instead of duplicating them. Rows
+    of sources without a location column are keyed by a hash of their values instead.
+
+    The table is created on first use with one `_<key>` column per natural key part and the data columns of the
+    results, new data columns are added as they appear. The generated `INSERT ... ON CONFLICT DO UPDATE` works with
+    SQLite and PostgreSQL; override `upsert_statement` for other databases.
+
+    :param connect: callable returning a new DB-API connection
+    :param table: table used when the caller does not name one
+    :param paramstyle: the driver's paramstyle, `qmark` (sqlite3) or `format`/`pyformat` (psycopg2)
+    :param batch_size: rows per executemany call
+    """
+
+    natural_key = ('tsp', 'location', 'gas_day', 'cycle')
+    key_columns = {
+        'tsp': column_names('tsp'),
+        'location': column_names('location'),
+        'gas_day': GAS_DAY_COLUMNS,
+        'cycle': column_names('nomination_cycle'),
+    }
+
+    def __init__(self, connect, table: str = 'operational_capacity', paramstyle: str = 'qmark',
+                 batch_size: int = 10000):
+        self.connect = connect
+        self.table = table
+        self.paramstyle = paramstyle
+        self.batch_size = batch_size
+
+    @staticmethod
+    def find_column(df: pandas.DataFrame, names):
+        columns = {str(column).strip().lower(): column for column in df.columns}
+        for name in names:
+            if name.lower() in columns:
+                return columns[name.lower()]
+        return None
+
+    def key_names(self):
+        return ['_source'] + [f'_{key}' for key in self.natural_key]
+
+    @staticmethod
+    def quote(name: str) -> str:
+        return '"{}"'.format(name.replace('"', '""'))
+
+    @staticmethod
+    def column_type(dtype) -> str:
+        from pandas.api.types import is_bool_dtype, is_float_dtype, is_integer_dtype
+
+        if is_bool_dtype(dtype) or is_integer_dtype(dtype):
+            return 'INTEGER'
+        if is_float_dtype(dtype):
+            return 'REAL'
+        return 'TEXT'
+
+    def existing_columns(self, cursor, table: str):
+        """
+        Columns of `table` in order, None when it does not exist. Read from the catalog rather than by probing the
+        table, a failed query aborts the transaction on PostgreSQL. Override it for databases without
+        `information_schema` or `current_schema()`.
+        """
+        placeholder = self.placeholder('table_name')
+        cursor.execute('SELECT column_name FROM information_schema.columns WHERE table_schema = current_schema() '
+                       f'AND table_name = {placeholder} ORDER BY ordinal_position',
+                       {'table_name': table} if self.paramstyle in ('pyformat', 'named') else (table,))
+        return [row[0] for row in cursor.fetchall()] or None
+
+    def prepare_table(self, cursor, table: str, frame: pandas.DataFrame):
+        columns = self.existing_columns(cursor, table)
+        if columns is None:
+            keys = self.key_names()
+            definitions = [f'{self.quote(name)} TEXT NOT NULL' for name in keys]
+            definitions += [f'{self.quote(column)} {self.column_type(frame[column].dtype)}'
+                            for column in frame.columns if column not in keys]
+            definitions.append('UNIQUE ({})'.format(', '.join(self.quote(name) for name in keys)))
+            cursor.execute('CREATE TABLE {} ({})'.format(self.quote(table), ', '.join(definitions)))
+            logger.info('Created database table: %s', table)
+            return list(frame.columns)
+
+        self.add_missing_columns(cursor, table, frame, columns)
+        return columns
+
+    def add_missing_columns(self, cursor, table: str, frame: pandas.DataFrame, columns: list):
+        known = {column.lower() for column in columns}
+        for column in frame.columns:
+            if column.lower() not in known:
+                cursor.execute('ALTER TABLE {} ADD COLUMN {} {}'.format(
+                    self.quote(table), self.quote(column), self.column_type(frame[column].dtype)))
+                columns.append(column)
+                known.add(column.lower())
+
+    def placeholder(self, column: str) -> str:
+        return {'qmark': '?', 'format': '%s', 'pyformat': f'%({column})s', 'named': f':{column}',
+                'numeric': '?'}[self.paramstyle]
+
+    def upsert_statement(self, table: str, columns: list) -> str:
+        keys = self.key_names()
+        updates = [column for column in columns if column not in keys]
+        statement = 'INSERT INTO {} ({}) VALUES ({}) ON CONFLICT ({}) DO '.format(
+            self.quote(table), ', '.join(self.quote(column) for column in columns),
+            ', '.join(self.placeholder(column) for column in columns),
+            ', '.join(self.quote(key) for key in keys))
+        if not updates:
+            return statement + 'NOTHING'
+        return statement + 'UPDATE SET ' + ', '.join(
+            '{0} = excluded.{0}'.format(self.quote(column)) for column in updates)
+
+    def to_rows(self, batch: pandas.DataFrame):
+        import numpy
+        from pandas.api.types import is_datetime64_any_dtype
+
+        values = batch.astype(object).where(batch.notna(), None)
+        for column in values.columns:
+            if is_datetime64_any_dtype(batch[column].dtype):
+                values[column] = [value.isoformat() if value is not None else None for value in values[column]]
+        rows = values.itertuples(index=False, name=None)
+        rows = ([value.item() if isinstance(value, numpy.generic) else value for value in row] for row in rows)
+        if self.paramstyle in ('pyformat', 'named'):
+            return [dict(zip(values.columns, row)) for row in rows]
+        return [tuple(row) for row in rows]
+
+    def writer(self, source: str, post_date: date, cycle=None, table: str = None) -> DatabaseSinkWriter:
+        return DatabaseSinkWriter(self, table or self.table, source, post_date, cycle)
+
+    def write(self, df: pandas.DataFrame, source: str, post_date: date, cycle=None, table: str = None):
+        with self.writer(source, post_date, cycle, table=table) as writer:
+            writer.write(df)
+        return writer
+
+
+class SQLiteSink(DatabaseSink):
+    """
+    DatabaseSink on a local SQLite file, the stand-in for the production database.
+    """
+
+    def __init__(self, path: str, table: str = 'operational_capacity', batch_size: int = 10000):
+        pathlib.Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        super().__init__(self._connect, table=table, paramstyle='qmark', batch_size=batch_size)
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=60)
+        connection.execute('PRAGMA journal_mode=WAL')
+        return connection
+
+    def existing_columns(self, cursor, table: str):
+        cursor.execute(f'PRAGMA table_info({self.quote(table)})')
+        return [row[1] for row in cursor.fetchall()] or None
@@ -1,15 +1,82 @@
+import contextvars
 import uuid
 import logging
-import xmltodict
+import re
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
-from datetime import date, timedelta, datetime
+from datetime import date, datetime
+from lxml import etree
 from nested_lookup import nested_lookup
 
 from scraper import PipelineScraper
+from scraper.backfill import BackfillEngine, backfill_dates, date_windows
+from scraper.schema import constant_column
 
 logging.basicConfig(format='%(asctime)s - %(message)s', level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+_NO_ROWS = re.compile(rb'"rows"\s*:\s*\[\s*\]')
+
+
+class _RowsTarget:
+    """
+    lxml parser target appending the text of every `<cell>` to the buffer of its column as the parser reads it.
+    No element objects are created.
+    """
+
+    def __init__(self):
+        self.buffers = []
+        self.rows = 0
+        self._position = -1
+        self._text = None
+
+    def start(self, tag, attrib):
+        if tag == 'row':
+            self._position = -1
+        elif tag == 'cell':
+            self._position += 1
+            self._text = []
+
+    def data(self, data):
+        if self._text is not None:
+            self._text.append(data)
+
+    def end(self, tag):
+        if tag == 'cell':
+            if self._position == len(self.buffers):
+                self.buffers.append([None] * self.rows)
+            text = ''.join(self._text).strip()
+            self.buffers[self._position].append(text or None)
+            self._text = None
+        elif tag == 'row':
+            for buffer in self.buffers[self._position + 1:]:
+                buffer.append(None)
+            self.rows += 1
+
+    def close(self):
+        return self.buffers, self.rows
+
+
+def parse_rows_xml(xml_data: str, columns) -> pd.DataFrame:
+    """
+    Frame of a `<rows><row><cell>...</cell>...</row>...</rows>` report. The cells are streamed straight into one
+    buffer per column by a parser target, no document, element or row objects are built. Empty cells are None,
+    rows with fewer cells are padded with None.
+    """
+    if xml_data.startswith('<?xml'):
+        # the text is already decoded, an encoding declaration would make the parser decode it again
+        xml_data = xml_data[xml_data.index('?>') + 2:]
+
+    buffers, rows = etree.fromstring(xml_data, etree.XMLParser(target=_RowsTarget()))
+
+    columns = list(columns)
+    if buffers and len(buffers) != len(columns):
+        raise ValueError(f'{len(columns)} columns passed, report rows have {len(buffers)} cells')
+    buffers += [[None] * rows for _ in range(len(columns) - len(buffers))]
+    df = pd.DataFrame(dict(enumerate(buffers)), index=pd.RangeIndex(rows))
+    df.columns = columns
+    return df
+
 
 class TallgrassEnergy(PipelineScraper):
     tsp = None
@@ -32,21 +99,52 @@ class TallgrassEnergy(PipelineScraper):
         ('page', '1')
     ]
 
-    def __init__(self, job_id):
-        PipelineScraper.__init__(self, job_id, web_url=self.api_url, source=self.source)
+    # gas days requested per posting query in range mode
+    range_window_days = 30
+    # cycleId of each NAESB cycle, used by the cycle scheduler
+    naesb_cycles = {'timely': 10301, 'evening': 10302, 'intraday 1': 10303, 'intraday 2': 10304, 'intraday 3': 10305}
+
+    # number of postings downloaded at the same time
+    max_workers = 8
+
+    def __init__(self, job_id, max_workers: int = None, **kwargs):
+        PipelineScraper.__init__(self, job_id, web_url=self.api_url, source=self.source, **kwargs)
+        if max_workers is not None:
+            self.max_workers = max_workers
+
+    def is_cacheable_response(self, response) -> bool:
+        # a posting query without postings is a gas day or cycle not posted yet
+        return super().is_cacheable_response(response) and _NO_ROWS.search(response.content) is None
+
+    def download_report(self, req_id, end_date: date) -> pd.DataFrame:
+        query_params_payload = [
+            ('infoPostDataId', req_id)
+        ]
+
+        with self.immutable_scope(end_date), self.idempotent():
+            response = self.session.post(url=self.download_csv_url, params=query_params_payload)
+        response.raise_for_status()
+
+        with self.measure('parse', posting=req_id) as timing:
+            data_json = response.json()
+            columns = [column['content'] for column in data_json['columnNames']]
+            df_result = parse_rows_xml(data_json['xmlData'], columns)
+            timing['rows'] = len(df_result.index)
+        return self.add_columns(df_data=df_result, data_json=data_json)
 
     def add_columns(self, df_data, data_json):
         tsp, tsp_name, post_datetime, effective_gas_datetime, measurement_basis_description = self.get_tsp_info(
             data_json=data_json)
-        df_data.insert(0, "TSP", tsp, True)
-        df_data.insert(1, "TSP Name", tsp_name, True)
-        df_data.insert(2, 'Posting Date/Time', post_datetime, True)
-        df_data.insert(3, 'Eff Gas Day', effective_gas_datetime, True)
-        df_data.insert(4, 'Meas Basic Desc', measurement_basis_description, True)
+        # the same value on every row, as single-category columns
+        rows = len(df_data.index)
+        df_data.insert(0, "TSP", constant_column(tsp, rows), True)
+        df_data.insert(1, "TSP Name", constant_column(tsp_name, rows), True)
+        df_data.insert(2, 'Posting Date/Time', constant_column(post_datetime, rows), True)
+        df_data.insert(3, 'Eff Gas Day', constant_column(effective_gas_datetime, rows), True)
+        df_data.insert(4, 'Meas Basic Desc', constant_column(measurement_basis_description, rows), True)
         return df_data
 
     def get_tsp_info(self, data_json):
-        print(data_json)
         columns = nested_lookup(key='name', document=data_json)
         data = nested_lookup('content', data_json['dictionaryKvpairs'])
 
@@ -71,53 +169,83 @@ class TallgrassEnergy(PipelineScraper):
         measurement_basis_description = df['Meas Basis Desc'].iat[0]
         return tsp, tsp_name, post_datetime, effective_gas_datetime, measurement_basis_description
 
-    def start_scraping(self, post_date: date = None, cycle: int = None):
+    def start_scraping(self, post_date: date = None, cycle: int = None, end_date: date = None):
+        """
+        :param post_date: gas day, or first gas day of a range
+        :param cycle:
+        :param end_date: last gas day of a range, the postings are then saved under their own gas day
+        :return:
+        """
         post_date = post_date if post_date is not None else date.today()
         cycle = cycle if cycle is not None else 10301
-        try:
-            logger.info('Scraping %s pipeline gas for post date: %s', self.source, post_date)
-
-            self.query_params_payload.append(tuple(('startDate', post_date.strftime("%m/%d/%Y"))))
-            self.query_params_payload.append(tuple(('endDate', post_date.strftime("%m/%d/%Y"))))
-            self.query_params_payload.append(tuple(('cycleId', cycle)))
-
-            response = self.session.post(self.post_url, params=self.query_params_payload)
-            response.raise_for_status()
-            response_json = response.json()
-            print(response.request.url)
-            print(response_json)
-
-            if len(response_json['rows']) == 0:
-                raise SystemExit("NO DATA FOUND")
-            request_ids = [x['id'] for x in response_json['rows']]
-
-            for req_id in request_ids:
-                query_params_payload = [
-                    ('infoPostDataId', req_id)
+        end_date = end_date if end_date is not None else post_date
+        with self.tags(post_date=post_date, cycle=cycle, end_date=end_date):
+            try:
+                logger.info('Scraping %s pipeline gas for post date: %s - %s', self.source, post_date, end_date)
+
+                query_params_payload = self.query_params_payload + [
+                    ('startDate', post_date.strftime("%m/%d/%Y")),
+                    ('endDate', end_date.strftime("%m/%d/%Y")),
+                    ('cycleId', cycle)
                 ]
 
-                response = self.session.post(url=self.download_csv_url, params=query_params_payload)
+                with self.immutable_scope(end_date), self.idempotent():
+                    response = self.session.post(self.post_url, params=query_params_payload)
+                response.raise_for_status()
+                response_json = response.json()
+                logger.debug('%s postings: %s', response.request.url, response_json)
+
+                if len(response_json['rows']) == 0:
+                    logger.info('No postings of %s for post date: %s - %s', self.source, post_date, end_date)
+                    return None
+                request_ids = self.new_postings([x['id'] for x in response_json['rows']], post_date, cycle,
+                                                end_day=end_date)
+                if not request_ids:
+                    logger.info('No new postings of %s for post date: %s - %s', self.source, post_date, end_date)
+                    return None
 
-                data_json = response.json()
-                columns = [column['content'] for column in data_json['columnNames']]
-                xml_json = xmltodict.parse(data_json['xmlData'])
-                df_data = [cell['cell'] for cell in xml_json['rows']['row']]
+                # download the postings concurrently, keep them in listing order
+                reports = []
+                max_workers = max(1, min(self.max_workers, len(request_ids)))
+                with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                    # the workers do not inherit the request context, run every download in a copy of it
+                    futures = [executor.submit(contextvars.copy_context().run, self.download_report, req_id, end_date)
+                               for req_id in request_ids]
+                    for req_id, future in zip(request_ids, futures):
+                        try:
+                            reports.append((req_id, future.result()))
+                        except Exception as ex:
+                            logger.error('Posting %s: %s', req_id, ex, exc_info=True)
+                            self.errors.append(ex)
+                if not reports:
+                    return None
 
-                df_result = pd.DataFrame(data=df_data, columns=columns)
-                final_report = self.add_columns(df_data=df_result, data_json=data_json)
-                self.save_result(final_report, post_date=post_date, local_file=True)
+                # one batched write per run, per gas day for ranges. The gas days are read before saving anything, so
+                # a range without readable gas days fails with nothing saved, and every posting is marked ingested
+                # under the gas days its rows are saved under
+                main_df = pd.concat([report for _, report in reports], keys=[req_id for req_id, _ in reports])
+                parts = [(post_date, main_df)] if end_date == post_date else self.split_by_gas_day(main_df, post_date)
+                for gas_day, part in parts:
+                    self.save_result(part.droplevel(0), post_date=gas_day, local_file=True, cycle=cycle)
+                for gas_day, part in parts:
+                    self.mark_ingested(part.index.unique(level=0).tolist(), gas_day, cycle)
                 logger.info('File saved. end of scraping: %s', self.source)
-        except Exception as ex:
-            logger.error(ex, exc_info=True)
+            except Exception as ex:
+                logger.error(ex, exc_info=True)
+                self.errors.append(ex)
         return None
 
+    def scrape_date_range(self, start_date: date, end_date: date, cycle: int = None, window_days: int = None):
+        """
+        Scrape every gas day from `start_date` to `end_date` with one posting query per window of `window_days` days.
+        """
+        for first, last in date_windows(start_date, end_date, window_days or self.range_window_days):
+            self.start_scraping(post_date=first, cycle=cycle, end_date=last)
+
 
 def back_fill_pipeline_date():
-    scraper = TallgrassEnergy(job_id=str(uuid.uuid4()))
-    for i in range(90, -1, -1):
-        post_date = (date.today() - timedelta(days=i))
-        print(post_date)
-        scraper.start_scraping(post_date)
+    engine = BackfillEngine()
+    engine.run(engine.plan(TallgrassEnergy, backfill_dates(90), window_days=TallgrassEnergy.range_window_days))
 
 
 def main():
@@ -0,0 +1,69 @@
+import requests
+from requests.adapters import BaseAdapter
+
+
+class StubAdapter(BaseAdapter):
+    """
+    Answers every request with a 200 of the given content type, and the body returned by `body(request)` or the
+    given bytes.
+    """
+
+    def __init__(self, content_type: str, body):
+        super().__init__()
+        self.content_type = content_type
+        self.body = body
+
+    def send(self, request, **kwargs):
+        response = requests.Response()
+        response.status_code = 200
+        response.headers['Content-Type'] = self.content_type
+        response._content = self.body(request) if callable(self.body) else self.body
+        response._content_consumed = True
+        response.encoding = 'utf-8'
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+class CountingServer:
+    """
+    Local HTTP server answering every GET and POST with `body`, counting the requests it gets.
+    """
+
+    def __init__(self, body: bytes, content_type: str = 'text/csv'):
+        import threading
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def reply(self):
+                server.requests.append((self.command, self.path, dict(self.headers)))
+                length = int(self.headers.get('Content-Length') or 0)
+                self.rfile.read(length)
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            do_GET = do_POST = reply
+
+            def log_message(self, *args):
+                pass
+
+        self.requests = []
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self._server.server_address[1]}'
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
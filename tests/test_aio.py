@@ -0,0 +1,40 @@
+import asyncio
+from datetime import date
+
+from scraper.aio import AsyncHttpClient, AsyncPipelineScraper
+from scraper.cache import ResponseCache
+from stubs import CountingServer
+
+
+class ReportScraper(AsyncPipelineScraper):
+
+    def __init__(self, job_id, url: str, source: str, **kwargs):
+        super().__init__(job_id, url, source, metrics=False, **kwargs)
+        self.url = url
+
+    async def fetch(self, gas_day: date) -> bytes:
+        with self.immutable_scope(gas_day):
+            response = await self.client.get(f'{self.url}/report?gas_day={gas_day}')
+        return response.content
+
+
+def test_scrapers_on_a_shared_client_keep_their_cache_and_headers(tmp_path):
+    async def scrape(server):
+        client = AsyncHttpClient()
+        try:
+            cached = ReportScraper('test', server.url, 'cached', client=client,
+                                   response_cache=ResponseCache(str(tmp_path)))
+            cached.session.headers['X-Source'] = 'cached'
+            other = ReportScraper('test', server.url, 'other', client=client, response_cache=False)
+            other.session.headers['X-Source'] = 'other'
+            return [await cached.fetch(date(2020, 1, 1)), await cached.fetch(date(2020, 1, 1)),
+                    await other.fetch(date(2020, 1, 1))]
+        finally:
+            client.close()
+
+    with CountingServer(b'Loc,Qty\n1,10\n') as server:
+        bodies = asyncio.run(scrape(server))
+
+    assert bodies == [b'Loc,Qty\n1,10\n'] * 3
+    # the second request of the historical gas day was served from the cache of the first scraper
+    assert [headers['X-Source'] for _, _, headers in server.requests] == ['cached', 'other']
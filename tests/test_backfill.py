@@ -0,0 +1,50 @@
+from datetime import date
+
+from requests import HTTPError
+
+from scraper import PipelineScraper
+from scraper.backfill import BackfillEngine, WorkUnit
+from scraper.watermarks import WatermarkStore
+
+
+class OneExtensionFails(PipelineScraper):
+    source = 'test_source'
+
+    def __init__(self, job_id, **kwargs):
+        super().__init__(job_id, 'http://localhost', self.source, **kwargs)
+
+    def start_scraping(self, post_date: date = None):
+        # as the scrapers do: log the failed extension and go on with the others, which have no rows here
+        if post_date.day % 2 == 0:
+            self.errors.append(HTTPError('500 Server Error'))
+
+
+class OnePosting(PipelineScraper):
+    source = 'test_source'
+
+    def __init__(self, job_id, **kwargs):
+        super().__init__(job_id, 'http://localhost', self.source, **kwargs)
+
+    def start_scraping(self, post_date: date = None):
+        if not self.new_postings(['posting'], post_date):
+            return
+        self.rows_saved += 1
+        self.mark_ingested(['posting'], post_date)
+
+
+def test_unit_with_a_logged_error_is_failed_not_empty():
+    engine = BackfillEngine(max_workers=1, scraper_kwargs={'response_cache': False, 'metrics': False})
+    outcome = engine.run_unit(WorkUnit(OneExtensionFails, date(2022, 8, 26), None, None))
+    assert outcome.status == 'failed'
+    assert isinstance(outcome.error, HTTPError)
+
+    # the next unit of the same scraper starts without the errors of the previous one
+    assert engine.run_unit(WorkUnit(OneExtensionFails, date(2022, 8, 27), None, None)).status == 'empty'
+
+
+def test_unit_of_postings_all_ingested_before_is_ingested_not_empty(tmp_path):
+    engine = BackfillEngine(max_workers=1, scraper_kwargs={
+        'response_cache': False, 'metrics': False, 'watermarks': WatermarkStore(str(tmp_path / 'watermarks.db'))})
+    assert engine.run_unit(WorkUnit(OnePosting, date(2022, 8, 26), None, None)).status == 'ok'
+    assert engine.run_unit(WorkUnit(OnePosting, date(2022, 8, 26), None, None)).status == 'ingested'
+    assert engine.run_unit(WorkUnit(OnePosting, date(2022, 8, 27), None, None)).status == 'ok'
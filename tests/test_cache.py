@@ -0,0 +1,30 @@
+import requests
+
+from scraper.cache import CachingAdapter, ResponseCache
+from scraper.context import request_context
+from stubs import StubAdapter
+
+
+def fetch(tmp_path, content_type: str, body: bytes, scoped: bool = True):
+    cache = ResponseCache(str(tmp_path))
+    session = requests.Session()
+    session.mount('http://', CachingAdapter(cache, adapter=StubAdapter(content_type, body)))
+    # the scrapers query the reports of a gas day inside `immutable_scope`
+    with request_context(immutable=False) if scoped else request_context():
+        request = session.post('http://localhost/report', data={'gas_day': '2022-08-26'}).request
+    return cache.get(cache.key(request))
+
+
+def test_error_pages_are_not_cached(tmp_path):
+    assert fetch(tmp_path, 'text/html; charset=utf-8', b'<html>Server Error in Application</html>') is None
+    assert fetch(tmp_path, 'text/csv', b'') is None
+
+
+def test_report_files_are_cached(tmp_path):
+    _, body = fetch(tmp_path, 'text/csv', b'Loc,Qty\n1,10\n')
+    assert body == b'Loc,Qty\n1,10\n'
+
+
+def test_posts_outside_of_an_immutable_scope_are_not_cached(tmp_path):
+    # e.g. BigSandy's StartFile / AddToFile / ZipFile calls, changing state on the server
+    assert fetch(tmp_path, 'application/json', b'{"fileName": "report"}', scoped=False) is None
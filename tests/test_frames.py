@@ -0,0 +1,38 @@
+from datetime import date
+
+import pandas
+
+from scraper import PipelineScraper
+from scraper.sinks import CsvSink
+
+
+def test_chunk_with_new_columns_starts_new_files_and_keeps_its_values(tmp_path):
+    scraper = PipelineScraper('test', 'http://localhost', 'test_source', response_cache=False, metrics=False,
+                              normalize_schema=False, output_sinks=[CsvSink(str(tmp_path))])
+    chunks = [pandas.DataFrame({'Loc': ['1'], 'Qty': [10]}),
+              pandas.DataFrame({'Loc': ['2'], 'Qty': [20], 'Note': ['x']}),
+              pandas.DataFrame({'Loc': ['3'], 'Note': ['y']})]
+    scraper.save_result_chunks(iter(chunks), date(2022, 8, 26), local_file=True)
+
+    # named after the time they were opened
+    files = sorted(tmp_path.glob('*.csv'))
+    assert len(files) == 2
+    first, second = (pandas.read_csv(path, dtype=str, keep_default_na=False) for path in files)
+    assert first.to_dict('list') == {'Loc': ['1'], 'Qty': ['10']}
+    assert second.to_dict('list') == {'Loc': ['2', '3'], 'Qty': ['20', ''], 'Note': ['x', 'y']}
+    assert scraper.rows_saved == 3
+
+
+def test_range_result_without_gas_days_is_not_saved_under_one_day(tmp_path):
+    import pytest
+
+    scraper = PipelineScraper('test', 'http://localhost', 'test_source', response_cache=False, metrics=False,
+                              output_sinks=[CsvSink(str(tmp_path))])
+    with pytest.raises(ValueError):
+        scraper.save_result_chunks(iter([pandas.DataFrame({'Loc': ['1', '2'], 'Qty': [10, 20]})]),
+                                   date(2022, 8, 26), local_file=True, split_gas_days=True)
+    assert not list(tmp_path.glob('*.csv'))
+
+    chunk = pandas.DataFrame({'Eff Gas Day': ['08/26/2022', '08/27/2022'], 'Loc': ['1', '2'], 'Qty': [10, 20]})
+    scraper.save_result_chunks(iter([chunk]), date(2022, 8, 26), local_file=True, split_gas_days=True)
+    assert sorted(path.name.split('_')[3] for path in tmp_path.glob('*.csv')) == ['2022-08-26', '2022-08-27']
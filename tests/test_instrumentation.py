@@ -0,0 +1,24 @@
+import json
+
+from scraper import PipelineScraper
+from scraper.instrumentation import MetricsRecorder
+
+
+def test_events_are_written_in_batches(tmp_path):
+    path = tmp_path / 'metrics.jsonl'
+    metrics = MetricsRecorder(str(path), buffer_events=3, flush_seconds=3600)
+    for rows in range(4):
+        metrics.record('parse', source='test_source', rows=rows)
+    assert [json.loads(line)['rows'] for line in path.read_text().splitlines()] == [0, 1, 2]
+
+    metrics.flush()
+    assert [json.loads(line)['rows'] for line in path.read_text().splitlines()] == [0, 1, 2, 3]
+    assert metrics.summary()[('test_source', 'parse')] == {'count': 4, 'rows': 6}
+
+
+def test_scraper_without_metrics_records_nothing():
+    scraper = PipelineScraper('test', 'http://localhost', 'test_source', response_cache=False, metrics=False)
+    assert scraper.metrics is None
+    with scraper.measure('parse', rows=1) as timing:
+        timing['rows'] = 2
+    assert timing == {'rows': 2}
@@ -0,0 +1,31 @@
+from datetime import date
+
+import pandas
+
+from scraper.one_ok import OneOK
+from scraper.sinks import CsvSink
+from stubs import StubAdapter
+
+GRID = ('<div class="rgHeaderDiv"><table class="rgMasterTable"><thead><tr><th class="rgHeader">Loc</th>'
+        '<th class="rgHeader">Total Scheduled Quantity</th></tr></thead></table></div>'
+        '<div class="rgDataDiv"><table class="rgMasterTable"><tbody><tr class="rgRow"><td>40001</td><td>1,000</td>'
+        '</tr></tbody></table></div>')
+COMPANY = '<span id="content_1_CompanyDUNS">006958581</span><span id="content_1_CompanyName">Viking</span>'
+
+
+def page(request) -> bytes:
+    # the mgt page has no company labels, add_columns raises a ValueError for it
+    labels = '' if '/mgt/' in request.url else COMPANY
+    return f'<html><body><form>{labels}{GRID}</form></body></html>'.encode('utf-8')
+
+
+def test_extension_whose_page_does_not_parse_does_not_stop_the_others(tmp_path):
+    scraper = OneOK(job_id='test', response_cache=False, metrics=False, output_sinks=[CsvSink(str(tmp_path))])
+    scraper.session.mount('https://', StubAdapter('text/html; charset=utf-8', page))
+    scraper.get_page_request = lambda extension, params, post_date=None: None
+
+    scraper.start_scraping(post_date=date(2022, 8, 26))
+
+    assert [type(error) for error in scraper.errors] == [ValueError]
+    df = pandas.concat(pandas.read_csv(path) for path in tmp_path.glob('*.csv'))
+    assert len(df.index) == 2
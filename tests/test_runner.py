@@ -0,0 +1,20 @@
+from datetime import date
+
+import pytest
+
+from scraper import runner
+
+
+def test_unit_with_a_logged_error_is_failed_with_the_error_as_text(monkeypatch):
+    monkeypatch.setitem(runner._worker, 'scraper_kwargs', {'response_cache': False, 'metrics': False})
+    monkeypatch.setitem(runner._worker, 'scrapers', {})
+    outcome = runner.run_unit(runner.RunUnit('test_backfill:OneExtensionFails', date(2022, 8, 26)))
+    assert outcome.status == 'failed'
+    assert outcome.error == "HTTPError('500 Server Error')"
+    assert runner.run_unit(runner.RunUnit('test_backfill:OneExtensionFails', date(2022, 8, 27))).status == 'empty'
+
+
+def test_unknown_cycle_is_a_usage_error(capsys):
+    with pytest.raises(SystemExit):
+        runner.main(['gasnom', '--cycle', 'timly'])
+    assert "invalid choice: 'timly'" in capsys.readouterr().err
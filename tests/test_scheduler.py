@@ -0,0 +1,31 @@
+from datetime import date, datetime
+
+from scraper.backfill import UnitOutcome
+
+from scraper.big_sandy import BigSandy
+from scraper.gasnom import GasNom
+from scraper.kindermorgan import Kindermorgan
+from scraper.one_ok import OneOK
+from scraper.scheduler import CENTRAL_TIME, CycleScheduler
+
+
+def due_polls(now: datetime, gas_day: date):
+    scheduler = CycleScheduler([GasNom, BigSandy, OneOK, Kindermorgan])
+    scheduler.add_due_polls(now)
+    return sorted((poll.scraper_cls.__name__, poll.naesb_cycle.name) for poll in scheduler._polls.values()
+                  if poll.gas_day == gas_day)
+
+
+def test_scrapers_without_cycles_are_polled_once_a_day_from_their_posting_time():
+    gas_day = date(2022, 8, 26)
+    assert due_polls(datetime(2022, 8, 25, 16, 30, tzinfo=CENTRAL_TIME), gas_day) == []
+    assert due_polls(datetime(2022, 8, 25, 17, 30, tzinfo=CENTRAL_TIME), gas_day) == [
+        ('BigSandy', 'daily'), ('GasNom', 'daily'), ('Kindermorgan', 'timely'), ('OneOK', 'daily')]
+
+
+def test_cycle_already_ingested_is_not_polled_again():
+    scheduler = CycleScheduler([GasNom])
+    scheduler.add_due_polls(datetime(2022, 8, 25, 17, 30, tzinfo=CENTRAL_TIME))
+    poll, = [poll for poll in scheduler._polls.values() if poll.gas_day == date(2022, 8, 26)]
+    scheduler.finish(poll, UnitOutcome(None, 'ingested', 0, 0.1, None))
+    assert poll.key in scheduler._finished and poll.key not in scheduler._polls
@@ -0,0 +1,43 @@
+import logging
+from datetime import date
+
+import pandas
+
+from scraper import PipelineScraper, schema
+from scraper.sinks import ParquetSink
+
+
+def report(quantities, gas_day='08/26/2022'):
+    return pandas.DataFrame({'Eff Gas Day': [gas_day] * len(quantities),
+                             'Loc': [str(i) for i in range(len(quantities))], 'Total Sched Qty': quantities})
+
+
+def test_normalized_chunks_have_the_same_dtypes():
+    chunks = [report(['1,000', '2,000']), report(['1.5', '']), report([70000000000, 1]),
+              report(['10', 'n/a'], gas_day='2022-08-26T09:00:00-05:00')]
+    dtypes = [schema.normalize(chunk, cycle='Timely').dtypes for chunk in chunks]
+    for other in dtypes[1:]:
+        pandas.testing.assert_series_equal(dtypes[0], other)
+    assert dtypes[0]['scheduled_quantity'] == 'float64'
+    assert dtypes[0]['effective_at'] == 'datetime64[us]'
+
+
+def test_chunked_parquet_result_keeps_the_file_schema(tmp_path, caplog):
+    scraper = PipelineScraper('test', 'http://localhost', 'test_source', response_cache=False, metrics=False,
+                              output_sinks=[ParquetSink(str(tmp_path))])
+    chunks = [report(['1,000', '2,000']), report(['1.5']), report([])]
+    with caplog.at_level(logging.INFO, logger='scraper.sinks'):
+        scraper.save_result_chunks(iter(chunks), date(2022, 8, 26), local_file=True, cycle='Timely')
+    assert 'Widening' not in caplog.text
+    df = pandas.read_parquet(tmp_path)
+    assert list(df['scheduled_quantity']) == [1000.0, 2000.0, 1.5]
+
+
+def test_nomination_cycle_is_the_naesb_name_of_the_cycle_argument():
+    from scraper.tallgrass_energy import TallgrassEnergy
+
+    scraper = TallgrassEnergy(job_id='test', response_cache=False, metrics=False)
+    assert list(scraper.normalize_result(report(['1']), 10303)['nomination_cycle']) == ['Intraday 1']
+    assert scraper.normalize_result(report(['1']), 99)['nomination_cycle'].isna().all()
+    base = PipelineScraper('test', 'http://localhost', 'test_source', response_cache=False, metrics=False)
+    assert base.normalize_result(report(['1']), '1')['nomination_cycle'].isna().all()
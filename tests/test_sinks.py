@@ -0,0 +1,57 @@
+import sqlite3
+from datetime import date
+
+import pandas
+
+from scraper import PipelineScraper
+from scraper.sinks import SQLiteSink
+
+
+def make_scraper(tmp_path, **kwargs):
+    return PipelineScraper('test', 'http://localhost', 'test_source', response_cache=False, metrics=False,
+                           database=SQLiteSink(str(tmp_path / 'scraper.db')), **kwargs)
+
+
+def count_rows(tmp_path, table: str) -> int:
+    with sqlite3.connect(str(tmp_path / 'scraper.db')) as connection:
+        return connection.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+
+
+def test_chunks_without_location_column_keep_all_rows(tmp_path):
+    chunks = [
+        pandas.DataFrame({'Eff Gas Day': ['08/26/2022', '08/26/2022'], 'Point Name': ['A', 'B'], 'Qty': [1, 2]}),
+        pandas.DataFrame({'Eff Gas Day': ['08/26/2022', '08/26/2022'], 'Point Name': ['C', 'D'], 'Qty': [3, 4]}),
+    ]
+    scraper = make_scraper(tmp_path)
+    scraper.save_result_chunks(iter(chunks), date(2022, 8, 26), db_table_name='capacity')
+    assert count_rows(tmp_path, 'capacity') == 4
+
+    # a re-run updates the same rows
+    scraper.save_result_chunks(iter(chunks), date(2022, 8, 26), db_table_name='capacity')
+    assert count_rows(tmp_path, 'capacity') == 4
+
+
+def write_parquet_chunks(tmp_path, chunks):
+    from scraper.sinks import ParquetSinkWriter
+
+    path = tmp_path / 'part-0.parquet'
+    writer = ParquetSinkWriter(path)
+    for chunk in chunks:
+        writer.write(chunk)
+    writer.close()
+    return pandas.read_parquet(path)
+
+
+def test_parquet_chunks_with_text_after_numbers_keep_all_values(tmp_path):
+    chunks = [pandas.DataFrame({'Qty': ['10', '20']}), pandas.DataFrame({'Qty': ['x']})]
+    df = write_parquet_chunks(tmp_path, chunks)
+    assert list(df['Qty']) == ['10', '20', 'x']
+
+
+def test_parquet_chunks_with_fractions_after_integers_widen_to_floats(tmp_path):
+    chunks = [pandas.DataFrame({'Qty': [1, 2]}), pandas.DataFrame({'Qty': ['1.5']}),
+              pandas.DataFrame({'Qty': [3], 'Note': ['new']})]
+    df = write_parquet_chunks(tmp_path, chunks)
+    assert list(df['Qty']) == [1.0, 2.0, 1.5, 3.0]
+    assert list(df['Note'].fillna('')) == ['', '', '', 'new']
+    assert [path.name for path in tmp_path.iterdir()] == ['part-0.parquet']
@@ -0,0 +1,44 @@
+from datetime import date
+
+import pandas
+
+from scraper.sinks import CsvSink
+from scraper.tallgrass_energy import TallgrassEnergy
+from scraper.watermarks import WatermarkStore
+from stubs import StubAdapter
+
+LISTING = b'{"rows": [{"id": 1}, {"id": 2}]}'
+
+
+def scraper_with_reports(tmp_path, reports: dict) -> TallgrassEnergy:
+    scraper = TallgrassEnergy(job_id='test', response_cache=False, metrics=False, max_workers=1,
+                              output_sinks=[CsvSink(str(tmp_path))],
+                              watermarks=WatermarkStore(str(tmp_path / 'watermarks.db')))
+    scraper.session.mount('https://', StubAdapter('application/json', LISTING))
+    scraper.download_report = lambda req_id, end_date: reports[req_id].copy()
+    return scraper
+
+
+def test_postings_are_marked_under_the_gas_days_their_rows_are_saved_under(tmp_path):
+    scraper = scraper_with_reports(tmp_path, {
+        1: pandas.DataFrame({'Eff Gas Day': ['08/26/2022', '08/27/2022'], 'Loc': [1, 2]}),
+        2: pandas.DataFrame({'Eff Gas Day': ['08/27/2022'], 'Loc': [3]}),
+    })
+    scraper.start_scraping(post_date=date(2022, 8, 26), end_date=date(2022, 8, 27))
+
+    assert scraper.errors == [] and scraper.rows_saved == 3
+    assert scraper.watermarks.ingested(scraper.source, None, date(2022, 8, 26), 10301) == {'1'}
+    assert scraper.watermarks.ingested(scraper.source, None, date(2022, 8, 27), 10301) == {'1', '2'}
+
+
+def test_range_without_readable_gas_days_saves_and_marks_nothing(tmp_path):
+    scraper = scraper_with_reports(tmp_path, {
+        1: pandas.DataFrame({'Eff Gas Day': ['n/a'], 'Loc': [1]}),
+        2: pandas.DataFrame({'Eff Gas Day': ['n/a'], 'Loc': [2]}),
+    })
+    scraper.start_scraping(post_date=date(2022, 8, 26), end_date=date(2022, 8, 27))
+
+    assert [type(error) for error in scraper.errors] == [ValueError]
+    assert scraper.rows_saved == 0 and list(tmp_path.rglob('*.csv')) == []
+    assert scraper.watermarks.ingested(scraper.source, None, date(2022, 8, 26), 10301,
+                                       end_day=date(2022, 8, 27)) == set()
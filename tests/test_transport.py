@@ -0,0 +1,40 @@
+import requests
+
+from scraper.context import request_context
+from scraper.transport import DEFAULT_TIMEOUT, RetryPolicy, TransportAdapter
+
+
+class RecordingAdapter(TransportAdapter):
+    """
+    Answers every attempt with a 503 without a network call.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(retry=RetryPolicy(total=2, backoff_factor=0), **kwargs)
+        self.attempts = []
+
+    def send_once(self, request, attempt: int, **kwargs):
+        self.attempts.append((request.method, kwargs.get('timeout')))
+        response = requests.Response()
+        response.status_code = 503
+        response._content, response._content_consumed = b'', True
+        return response
+
+
+def send(method: str, **kwargs):
+    adapter = RecordingAdapter()
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.request(method, 'http://localhost/report', **kwargs)
+    return adapter.attempts
+
+
+def test_posts_are_sent_once_unless_marked_idempotent():
+    assert send('GET') == [('GET', DEFAULT_TIMEOUT)] * 3
+    assert send('POST') == [('POST', DEFAULT_TIMEOUT)]
+    with request_context(idempotent=True):
+        assert len(send('POST')) == 3
+
+
+def test_requests_keep_their_own_timeout():
+    assert send('POST', timeout=5) == [('POST', 5)]
@@ -0,0 +1,241 @@
+import email.utils
+import logging
+import random
+import threading
+import time
+from urllib.parse import urlparse
+
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ChunkedEncodingError, ConnectionError, Timeout
+
+from scraper.context import current_context
+from scraper.instrumentation import TIMED_POOL_CLASSES, connection_timing, reset_connection_timing
+
+logger = logging.getLogger(__name__)
+
+# (connect, read) seconds of requests sent without a timeout of their own
+DEFAULT_TIMEOUT = (10, 60)
+
+
+class RetryPolicy:
+    """
+    When and how long to wait before sending a request again: on connection errors, timeouts and the
+    `status_forcelist` statuses, up to `total` retries, waiting `backoff_factor * 2 ** retry` seconds (with jitter,
+    at most `max_backoff`) or what the server asks for in a Retry-After header.
+
+    Only idempotent `methods` are retried. Other requests are retried when they are sent inside a
+    `request_context(idempotent=True)` block, such as the ASP.NET form POSTs that only query a report; POSTs that
+    change state on the server (building a file) are never sent twice.
+    """
+
+    def __init__(self, total: int = 3, backoff_factor: float = 1.0, max_backoff: float = 60.0,
+                 status_forcelist=(429, 500, 502, 503, 504), methods=('GET', 'HEAD', 'OPTIONS'),
+                 jitter: float = 0.25):
+        self.total = total
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.status_forcelist = frozenset(status_forcelist)
+        self.methods = frozenset(method.upper() for method in methods)
+        self.jitter = jitter
+
+    def is_retryable(self, method: str, idempotent: bool = False) -> bool:
+        return self.total > 0 and (idempotent or method.upper() in self.methods)
+
+    def is_retry_status(self, status_code: int) -> bool:
+        return status_code in self.status_forcelist
+
+    @staticmethod
+    def retry_after(response):
+        value = response.headers.get('Retry-After') if response is not None else None
+        if not value:
+            return None
+        if value.isdigit():
+            return float(value)
+        try:
+            retry_at = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        return max(retry_at.timestamp() - time.time(), 0.0)
+
+    def delay(self, retry: int, response=None) -> float:
+        """
+        Seconds to wait before retry number `retry` (0 for the first one).
+        """
+        retry_after = self.retry_after(response)
+        if retry_after is not None:
+            return min(retry_after, self.max_backoff)
+        delay = min(self.backoff_factor * 2 ** retry, self.max_backoff)
+        return delay * (1 + random.uniform(-self.jitter, self.jitter))
+
+
+class TokenBucket:
+    """
+    Allows `rate` requests per second on average and bursts of up to `burst` requests.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Take a token, waiting for one when the bucket is empty.
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class HostRateLimiter:
+    """
+    One token bucket per host. Share one instance between all scrapers of a process, so requests to the same
+    host from different scrapers and threads count against the same limit.
+    """
+
+    def __init__(self, default_rate: float = None, default_burst: int = 1):
+        """
+        :param default_rate: requests per second for hosts without their own rate, None for no limit
+        :param default_burst: burst size for those hosts
+        """
+        self.default_rate = default_rate
+        self.default_burst = default_burst
+        self._rates = {}
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def configure(self, host: str, rate: float, burst: int = 1, replace: bool = True):
+        """
+        Set the rate of `host` (requests per second, None for no limit).
+
+        :param replace: False keeps the rate already configured for the host
+        """
+        with self._lock:
+            if not replace and host in self._rates:
+                return
+            self._rates[host] = (rate, burst)
+            self._buckets.pop(host, None)
+
+    def for_host(self, host: str):
+        with self._lock:
+            if host not in self._buckets:
+                rate, burst = self._rates.get(host, (self.default_rate, self.default_burst))
+                self._buckets[host] = TokenBucket(rate, burst) if rate else None
+            return self._buckets[host]
+
+    def acquire(self, url: str):
+        bucket = self.for_host(urlparse(url).netloc)
+        if bucket is not None:
+            bucket.acquire()
+
+
+class TransportAdapter(HTTPAdapter):
+    """
+    HTTPAdapter sending every attempt through the host's rate limit and retrying failed requests according to a
+    RetryPolicy. Responses still failing after the last retry are returned as they are, callers check them with
+    `raise_for_status`. Requests sent without a timeout get the adapter's `timeout`, a server that stops answering
+    does not block a scraper forever.
+
+    With a MetricsRecorder every attempt is recorded as a `request` event with the connect (name resolution and
+    TCP) and TLS times of new connections, the time to the response headers (ttfb), the time to read the body
+    (transfer, not for streamed responses) and its size.
+    """
+
+    def __init__(self, retry: RetryPolicy = None, rate_limiter: HostRateLimiter = None, metrics=None,
+                 source: str = None, timeout=DEFAULT_TIMEOUT, pool_manager=None, **kwargs):
+        """
+        :param retry: retry policy, no retries when None
+        :param rate_limiter: per-host rate limits, no limit when None
+        :param metrics: MetricsRecorder for the request events, none recorded when None
+        :param source: source tag of the request events
+        :param timeout: seconds, or (connect, read) seconds, of requests sent without a timeout
+        :param pool_manager: connection pools of another adapter to send the requests over, closed by their owner
+        :param kwargs: HTTPAdapter arguments, e.g. `pool_connections` and `pool_maxsize`
+        """
+        self.metrics = metrics
+        self.source = source
+        self.timeout = timeout
+        super().__init__(**kwargs)
+        self.retry = retry
+        self.rate_limiter = rate_limiter
+        self.shared_pools = pool_manager is not None
+        if self.shared_pools:
+            self.poolmanager.clear()
+            self.poolmanager = pool_manager
+            if metrics is not None:
+                pool_manager.pool_classes_by_scheme = dict(TIMED_POOL_CLASSES)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        if self.metrics is not None:
+            self.poolmanager.pool_classes_by_scheme = dict(TIMED_POOL_CLASSES)
+
+    def close(self):
+        if self.shared_pools:
+            for proxy in self.proxy_manager.values():
+                proxy.clear()
+        else:
+            super().close()
+
+    def send_once(self, request, attempt: int, **kwargs):
+        stream = kwargs.get('stream', False)
+        reset_connection_timing()
+        started = time.perf_counter()
+        response = super().send(request, **kwargs)
+        ttfb = time.perf_counter() - started
+
+        transfer = None
+        if stream:
+            size = int(response.headers['Content-Length']) if response.headers.get('Content-Length', '').isdigit() \
+                else None
+        else:
+            # the session reads the body right after this anyway, read it here to time it and retry it
+            started = time.perf_counter()
+            size = len(response.content)
+            transfer = time.perf_counter() - started
+
+        if self.metrics is not None:
+            url = urlparse(request.url)
+            self.metrics.record('request', source=self.source, method=request.method, host=url.netloc,
+                                path=url.path, status=response.status_code, attempt=attempt, ttfb=round(ttfb, 6),
+                                transfer=round(transfer, 6) if transfer is not None else None, bytes=size,
+                                **{name: round(seconds, 6) for name, seconds in connection_timing().items()})
+        return response
+
+    def send(self, request, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+        idempotent = current_context().get('idempotent', False)
+        retries = self.retry.total if self.retry is not None and self.retry.is_retryable(request.method, idempotent) \
+            else 0
+        for attempt in range(retries + 1):
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire(request.url)
+            try:
+                response = self.send_once(request, attempt, **kwargs)
+            except (ConnectionError, Timeout, ChunkedEncodingError) as ex:
+                if self.metrics is not None:
+                    self.metrics.record('request', source=self.source, method=request.method,
+                                        host=urlparse(request.url).netloc, attempt=attempt, error=repr(ex))
+                if attempt == retries:
+                    raise
+                delay = self.retry.delay(attempt)
+                logger.warning('%s %s failed (%s), retry %s/%s in %.1fs', request.method, request.url, ex,
+                               attempt + 1, retries, delay)
+            else:
+                if attempt == retries or not self.retry.is_retry_status(response.status_code):
+                    return response
+                delay = self.retry.delay(attempt, response)
+                logger.warning('%s %s returned %s, retry %s/%s in %.1fs', request.method, request.url,
+                               response.status_code, attempt + 1, retries, delay)
+                response.close()
+            time.sleep(delay)
@@ -0,0 +1,100 @@
+import logging
+import pathlib
+import sqlite3
+import threading
+from datetime import date, datetime
+
+logger = logging.getLogger(__name__)
+
+
+def _day(value) -> str:
+    if isinstance(value, datetime):
+        value = value.date()
+    return value.isoformat() if isinstance(value, date) else str(value)
+
+
+class WatermarkStore:
+    """
+    Persistent record of the postings already ingested, keyed by source, extension, gas day and cycle. A posting
+    is identified by the id the source gives it (sequence number, revision, info post id, ...). Scrapers check the
+    store before downloading a posting and record it once its rows are saved, so repeated runs over the same gas
+    day and cycle only download new postings.
+
+    Backed by a SQLite file, safe to share between threads and processes.
+    """
+
+    def __init__(self, path: str):
+        pathlib.Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        connection = self._connect()
+        try:
+            with connection:
+                connection.execute('CREATE TABLE IF NOT EXISTS watermarks ('
+                                   'source TEXT NOT NULL, extension TEXT NOT NULL, gas_day TEXT NOT NULL, '
+                                   'cycle TEXT NOT NULL, posting_id TEXT NOT NULL, '
+                                   'ingested_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP, '
+                                   'PRIMARY KEY (source, extension, gas_day, cycle, posting_id))')
+        finally:
+            connection.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=60)
+
+    def ingested(self, source: str, extension, gas_day, cycle, end_day=None) -> set:
+        """
+        Ids of the postings ingested for a gas day, or for the gas days from `gas_day` to `end_day` (inclusive).
+        """
+        end_day = end_day if end_day is not None else gas_day
+        with self._lock:
+            connection = self._connect()
+            try:
+                rows = connection.execute(
+                    'SELECT posting_id FROM watermarks WHERE source = ? AND extension = ? AND cycle = ? '
+                    'AND gas_day BETWEEN ? AND ?',
+                    (source, extension or '', str(cycle or ''), _day(gas_day), _day(end_day))).fetchall()
+            finally:
+                connection.close()
+        return {row[0] for row in rows}
+
+    def is_ingested(self, source: str, extension, gas_day, cycle, posting_id) -> bool:
+        return str(posting_id) in self.ingested(source, extension, gas_day, cycle)
+
+    def record(self, source: str, extension, gas_day, cycle, posting_ids):
+        """
+        Mark postings as ingested, call it after their rows are saved.
+
+        :param posting_ids: a posting id or an iterable of them
+        """
+        if isinstance(posting_ids, (str, int)):
+            posting_ids = [posting_ids]
+        rows = [(source, extension or '', _day(gas_day), str(cycle or ''), str(posting_id))
+                for posting_id in posting_ids]
+        with self._lock:
+            connection = self._connect()
+            try:
+                with connection:
+                    connection.executemany('INSERT OR IGNORE INTO watermarks '
+                                           '(source, extension, gas_day, cycle, posting_id) VALUES (?, ?, ?, ?, ?)',
+                                           rows)
+            finally:
+                connection.close()
+        logger.debug('Recorded %s postings of %s/%s for %s cycle %s', len(rows), source, extension or '', gas_day,
+                     cycle)
+
+    def forget(self, source: str, extension=None, gas_day=None, cycle=None):
+        """
+        Drop watermarks so the matching postings are downloaded again, e.g. before re-loading a gas day.
+        """
+        clauses, params = ['source = ?'], [source]
+        for column, value in (('extension', extension), ('gas_day', gas_day), ('cycle', cycle)):
+            if value is not None:
+                clauses.append(f'{column} = ?')
+                params.append(_day(value) if column == 'gas_day' else str(value))
+        with self._lock:
+            connection = self._connect()
+            try:
+                with connection:
+                    connection.execute('DELETE FROM watermarks WHERE ' + ' AND '.join(clauses), params)
+            finally:
+                connection.close()